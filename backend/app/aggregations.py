@@ -0,0 +1,240 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from . import models
+
+# SQL-side aggregations over Movimientos.
+# Every helper returns plain tuples/dicts so the analytics endpoints never
+# hydrate Movimiento ORM objects just to sum them in Python.
+# sede_ids=None means every sede; an explicit list scopes to those sedes.
+#
+# Whole days inside the window are read from the VentasDiarias rollup;
+# only a partial first/last day falls back to raw Movimientos rows, so
+# results match a scan of Movimientos exactly.
+
+_MOV_COLUMNS = {
+    "producto_id": models.Movimiento.producto_id,
+    "sede_id": models.Movimiento.sede_id,
+    "tipo": models.Movimiento.tipo,
+}
+_ROLLUP_COLUMNS = {
+    "producto_id": models.VentaDiaria.producto_id,
+    "sede_id": models.VentaDiaria.sede_id,
+    "tipo": models.VentaDiaria.tipo,
+}
+
+def _midnight(value: datetime) -> datetime:
+    return datetime.combine(value.date(), time.min)
+
+def _split_window(
+    start: Optional[datetime],
+    end: Optional[datetime]
+) -> Tuple[List[Tuple[Optional[datetime], Optional[datetime]]], Optional[Tuple[Optional[date], Optional[date]]]]:
+    """Split [start, end) into raw datetime ranges and a [first_day, last_day) rollup range"""
+    if start is not None and start.tzinfo is not None:
+        start = start.replace(tzinfo=None)
+    if end is not None and end.tzinfo is not None:
+        end = end.replace(tzinfo=None)
+
+    if start is not None and end is not None and _midnight(start) == _midnight(end) and start != _midnight(start):
+        return [(start, end)], None
+
+    raw = []
+    first_day = None
+    if start is not None:
+        if start == _midnight(start):
+            first_day = start.date()
+        else:
+            next_day = _midnight(start) + timedelta(days=1)
+            raw.append((start, next_day))
+            first_day = next_day.date()
+
+    last_day = None
+    if end is not None:
+        last_day = end.date()
+        if end != _midnight(end):
+            raw.append((_midnight(end), end))
+
+    if first_day is not None and last_day is not None and first_day >= last_day:
+        return raw, None
+    return raw, (first_day, last_day)
+
+def _grouped(
+    db: Session,
+    keys: List[str],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime] = None,
+    sede_ids: Optional[List[int]] = None,
+    tipo: Optional[str] = None,
+    producto_id: Optional[int] = None
+) -> Dict[tuple, List[float]]:
+    """{key tuple: [quantity, revenue, transactions]} for the window"""
+    raw_ranges, rollup_range = _split_window(start_date, end_date)
+    result: Dict[tuple, List[float]] = {}
+
+    def merge(rows):
+        for row in rows:
+            *key, quantity, revenue, transactions = row
+            acc = result.setdefault(tuple(key), [0.0, 0.0, 0])
+            acc[0] += quantity or 0
+            acc[1] += revenue or 0
+            acc[2] += transactions or 0
+
+    mov = models.Movimiento
+    for raw_start, raw_end in raw_ranges:
+        columns = [_MOV_COLUMNS[k] for k in keys]
+        query = db.query(
+            *columns,
+            func.sum(mov.Cantidad),
+            func.sum(mov.Cantidad * mov.Precio),
+            func.count(mov.idMovimientos)
+        ).filter(mov.fecha >= raw_start, mov.fecha < raw_end)
+        if tipo is not None:
+            query = query.filter(mov.tipo == tipo)
+        if sede_ids is not None:
+            query = query.filter(mov.sede_id.in_(sede_ids))
+        if producto_id is not None:
+            query = query.filter(mov.producto_id == producto_id)
+        if columns:
+            query = query.group_by(*columns)
+        merge(query.all())
+
+    if rollup_range is not None:
+        first_day, last_day = rollup_range
+        rollup = models.VentaDiaria
+        columns = [_ROLLUP_COLUMNS[k] for k in keys]
+        query = db.query(
+            *columns,
+            func.sum(rollup.cantidad),
+            func.sum(rollup.ingresos),
+            func.sum(rollup.transacciones)
+        )
+        if first_day is not None:
+            query = query.filter(rollup.fecha_dia >= first_day)
+        if last_day is not None:
+            query = query.filter(rollup.fecha_dia < last_day)
+        if tipo is not None:
+            query = query.filter(rollup.tipo == tipo)
+        if sede_ids is not None:
+            query = query.filter(rollup.sede_id.in_(sede_ids))
+        if producto_id is not None:
+            query = query.filter(rollup.producto_id == producto_id)
+        if columns:
+            query = query.group_by(*columns)
+        merge(query.all())
+
+    # Rollup rows emptied by deletes can linger with zero movements
+    return {key: acc for key, acc in result.items() if acc[2] > 0}
+
+def _names(db: Session, model, id_col, ids) -> Dict[int, Optional[str]]:
+    ids = [i for i in ids if i is not None]
+    if not ids:
+        return {}
+    return dict(db.query(id_col, model.Nombre).filter(id_col.in_(ids)).all())
+
+def sales_totals(
+    db: Session,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime] = None,
+    sede_ids: Optional[List[int]] = None,
+    producto_id: Optional[int] = None
+) -> Tuple[float, int, float]:
+    """Total revenue, number of sales and units sold in the window"""
+    totals = _grouped(db, [], start_date, end_date, sede_ids, tipo="venta", producto_id=producto_id)
+    quantity, revenue, transactions = totals.get((), [0.0, 0.0, 0])
+    return float(revenue), int(transactions), float(quantity)
+
+def product_sales(
+    db: Session,
+    start_date: Optional[datetime],
+    limit: int = 10,
+    end_date: Optional[datetime] = None,
+    sede_ids: Optional[List[int]] = None
+) -> List[Tuple]:
+    """Top products by sales revenue: (producto_id, nombre, categoria, quantity, revenue)"""
+    grouped = _grouped(db, ["producto_id"], start_date, end_date, sede_ids, tipo="venta")
+    top = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+
+    ids = [producto_id for (producto_id,), _ in top if producto_id is not None]
+    info = {}
+    if ids:
+        info = {
+            pid: (nombre, categoria) for pid, nombre, categoria in db.query(
+                models.Producto.idProductos, models.Producto.Nombre, models.Producto.Categoria
+            ).filter(models.Producto.idProductos.in_(ids)).all()
+        }
+    return [
+        (producto_id, *info.get(producto_id, (None, None)), quantity, revenue)
+        for (producto_id,), (quantity, revenue, _) in top
+    ]
+
+def product_sede_sales(
+    db: Session,
+    start_date: Optional[datetime],
+    limit: int = 5,
+    end_date: Optional[datetime] = None,
+    sede_ids: Optional[List[int]] = None
+) -> List[Tuple]:
+    """Best sellers by units per (product, sede): (producto_id, nombre, sede_id, sede_nombre, quantity, revenue)"""
+    grouped = _grouped(db, ["producto_id", "sede_id"], start_date, end_date, sede_ids, tipo="venta")
+    top = sorted(grouped.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+    productos = _names(db, models.Producto, models.Producto.idProductos, [k[0] for k, _ in top])
+    sedes = _names(db, models.Sede, models.Sede.idSedes, [k[1] for k, _ in top])
+    return [
+        (producto_id, productos.get(producto_id), sede_id, sedes.get(sede_id), quantity, revenue)
+        for (producto_id, sede_id), (quantity, revenue, _) in top
+    ]
+
+def sede_sales(
+    db: Session,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime] = None,
+    sede_ids: Optional[List[int]] = None
+) -> List[Tuple]:
+    """Sales performance per sede: (sede_id, nombre, revenue, transactions)"""
+    grouped = _grouped(db, ["sede_id"], start_date, end_date, sede_ids, tipo="venta")
+    sedes = _names(db, models.Sede, models.Sede.idSedes, [k[0] for k in grouped])
+    rows = sorted(grouped.items(), key=lambda item: (item[0][0] is None, item[0][0] or 0))
+    return [
+        (sede_id, sedes.get(sede_id), revenue, int(transactions))
+        for (sede_id,), (_, revenue, transactions) in rows
+    ]
+
+def first_sale_order(
+    db: Session,
+    sede_ids: List[Optional[int]],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime] = None
+) -> List[Optional[int]]:
+    """sede_ids ordered by their first sale in the window (fecha, then id)
+
+    One indexed seek per sede on ix_movimientos_sede_fecha, so it stays
+    cheap however many movements the window holds.
+    """
+    mov = models.Movimiento
+    first = {}
+    for sede_id in sede_ids:
+        query = db.query(mov.fecha, mov.idMovimientos).filter(
+            mov.sede_id.is_(None) if sede_id is None else mov.sede_id == sede_id,
+            mov.tipo == "venta"
+        )
+        if start_date is not None:
+            query = query.filter(mov.fecha >= start_date)
+        if end_date is not None:
+            query = query.filter(mov.fecha < end_date)
+        row = query.order_by(mov.fecha, mov.idMovimientos).first()
+        first[sede_id] = (row[0] or datetime.min, row[1]) if row else (datetime.max, 0)
+    return sorted(sede_ids, key=lambda sede_id: first[sede_id])
+
+def movement_type_counts(
+    db: Session,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime] = None,
+    sede_ids: Optional[List[int]] = None,
+    producto_id: Optional[int] = None
+) -> Dict[str, int]:
+    """Number of movements per tipo in the window"""
+    grouped = _grouped(db, ["tipo"], start_date, end_date, sede_ids, producto_id=producto_id)
+    return {tipo: int(transactions) for (tipo,), (_, _, transactions) in grouped.items()}
@@ -0,0 +1,177 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import Config
+from .intents import normalize
+
+# Persistent cache of LLM answers (RespuestasCache), so the questions staff
+# repeat all day ("ventas de hoy", "stock bajo en Centro") cost one paid
+# call per change in the data instead of one per question.
+#
+# An entry is keyed on the normalized question (accents folded, stopwords
+# dropped, word order ignored) plus a fingerprint of the data the answer
+# was built from; once sales, stock or readings change, the fingerprint
+# changes and old entries stop matching. Voice answers are built from a
+# prompt that names the user and their role, so the fingerprint includes
+# the user too. Questions that differ by a word or two match by token
+# overlap (ANSWER_CACHE_SIMILARITY), as long as they name the same sedes,
+# products and numbers. Entries expire after ANSWER_CACHE_TTL and the least
+# recently used are evicted past ANSWER_CACHE_MAX_ENTRIES.
+
+_STOPWORDS = {
+    "a", "al", "con", "cual", "cuales", "cuanto", "cuanta", "cuantos", "cuantas", "de", "del",
+    "dime", "el", "en", "es", "esta", "estan", "favor", "hay", "la", "las", "le", "les", "lo",
+    "los", "me", "mi", "muestrame", "nos", "o", "oye", "para", "podrias", "por", "puedes",
+    "que", "quiero", "saber", "se", "son", "su", "sus", "tenemos", "tiene", "tienen", "un",
+    "una", "unas", "unos", "y", "hola", "como"
+}
+_SIMILAR_CANDIDATES = 200
+
+def question_tokens(question: str) -> list[str]:
+    """Sorted content words, plural -s dropped: "¿Cuáles son las ventas de hoy?" -> ["hoy", "venta"]"""
+    tokens = set()
+    for word in normalize(question).split():
+        if word in _STOPWORDS:
+            continue
+        tokens.add(word[:-1] if len(word) > 4 and word.endswith("s") else word)
+    return sorted(tokens)
+
+def _now() -> datetime:
+    return models.get_lima_time().replace(tzinfo=None)
+
+def _key(ambito: str, huella: str, pregunta: str) -> str:
+    return hashlib.sha256(f"{ambito}|{huella}|{pregunta}".encode()).hexdigest()
+
+def data_fingerprint(db: Session, query_type: str, user_id: int) -> str:
+    """Hash of the user and business data behind a voice answer
+
+    A handful of aggregate queries: sales come from the VentasDiarias rollup
+    (kept in step with every movement write), stock from Productos. Sensor
+    readings arrive every few seconds, so they only count for environmental
+    and general questions. The Lima date is included because "hoy" and the
+    7-day window move at midnight.
+    """
+    rol = db.query(models.Usuario.rol).filter(models.Usuario.idUsuarios == user_id).scalar()
+    ventas = db.query(
+        func.count(models.VentaDiaria.idVentaDiaria),
+        func.sum(models.VentaDiaria.cantidad),
+        func.sum(models.VentaDiaria.ingresos),
+        func.sum(models.VentaDiaria.transacciones)
+    ).one()
+    productos = db.query(
+        func.count(models.Producto.idProductos),
+        func.max(models.Producto.idProductos),
+        func.sum(models.Producto.Stock),
+        func.sum(models.Producto.idProductos * models.Producto.Stock),
+        func.max(models.Producto.Fecha_Actualiazacion)
+    ).one()
+    sedes = db.query(func.count(models.Sede.idSedes), func.max(models.Sede.idSedes)).one()
+    parts = [user_id, rol, _now().date(), tuple(ventas), tuple(productos), tuple(sedes)]
+    if query_type in ("environmental", "general"):
+        parts.append(db.query(func.max(models.Temperatura.idTemperatura)).scalar())
+        parts.append(db.query(func.max(models.Humedad.idHumedad)).scalar())
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+def _similarity(a: list[str], b: list[str]) -> float:
+    sa, sb = set(a), set(b)
+    return len(sa & sb) / len(sa | sb) if sa or sb else 1.0
+
+def _entity_tokens(db: Session) -> set[str]:
+    """Tokens of sede and product names, in question_tokens form"""
+    names = db.query(models.Sede.Nombre).union(db.query(models.Producto.Nombre)).all()
+    return {token for (nombre,) in names for token in question_tokens(nombre or "")}
+
+def _entities(tokens: list[str], vocabulary: set[str]) -> set[str]:
+    # "stock de pan en Centro" and "stock de pan en Miraflores" overlap a
+    # lot but are different questions
+    return {t for t in tokens if t in vocabulary or any(c.isdigit() for c in t)}
+
+def lookup(db: Session, ambito: str, question: str, huella: str, similar: bool = True) -> Optional[Tuple[str, Optional[str]]]:
+    """(respuesta, query_type) of a fresh entry for this question and data, or None"""
+    if Config.ANSWER_CACHE_MAX_ENTRIES <= 0:
+        return None
+    tokens = question_tokens(question)
+    pregunta = " ".join(tokens)
+    cutoff = _now() - timedelta(seconds=Config.ANSWER_CACHE_TTL)
+    fresh = db.query(models.RespuestaCache).filter(models.RespuestaCache.creado >= cutoff)
+
+    entry = fresh.filter(models.RespuestaCache.clave == _key(ambito, huella, pregunta)).first()
+    if entry is None and similar and Config.ANSWER_CACHE_SIMILARITY < 1:
+        # Same data, a question worded slightly differently
+        candidates = fresh.filter(
+            models.RespuestaCache.ambito == ambito,
+            models.RespuestaCache.huella == huella
+        ).order_by(models.RespuestaCache.ultimo_uso.desc()).limit(_SIMILAR_CANDIDATES).all()
+        vocabulary = _entity_tokens(db) if candidates else set()
+        wanted = _entities(tokens, vocabulary)
+        scored = [
+            (_similarity(tokens, c_tokens), c)
+            for c, c_tokens in ((c, (c.pregunta or "").split()) for c in candidates)
+            if _entities(c_tokens, vocabulary) == wanted
+        ]
+        scored = [(score, c) for score, c in scored if score >= Config.ANSWER_CACHE_SIMILARITY]
+        if scored:
+            entry = max(scored, key=lambda pair: pair[0])[1]
+    if entry is None:
+        return None
+
+    entry.ultimo_uso = _now()
+    entry.usos = (entry.usos or 0) + 1
+    db.commit()
+    return entry.respuesta, entry.query_type
+
+def store(db: Session, ambito: str, question: str, huella: str, respuesta: str, query_type: Optional[str] = None) -> None:
+    """Save an answer, then evict expired and least recently used entries
+
+    Best effort: the answer was already given, so a failed cache write is
+    logged and rolled back instead of failing the request.
+    """
+    if Config.ANSWER_CACHE_MAX_ENTRIES <= 0 or not respuesta:
+        return
+    try:
+        _store(db, ambito, question, huella, respuesta, query_type)
+    except IntegrityError:
+        # A concurrent request stored the same question first
+        db.rollback()
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Error guardando respuesta en caché: {e}")
+
+def _store(db: Session, ambito: str, question: str, huella: str, respuesta: str, query_type: Optional[str]) -> None:
+    pregunta = " ".join(question_tokens(question))
+    clave = _key(ambito, huella, pregunta)
+    now = _now()
+    entry = db.query(models.RespuestaCache).filter(models.RespuestaCache.clave == clave).first()
+    if entry is None:
+        entry = models.RespuestaCache(ambito=ambito, clave=clave, pregunta=pregunta[:1000], huella=huella, usos=0)
+        db.add(entry)
+    entry.respuesta = respuesta
+    entry.query_type = query_type
+    entry.creado = now
+    entry.ultimo_uso = now
+    db.flush()
+
+    db.query(models.RespuestaCache).filter(
+        models.RespuestaCache.creado < now - timedelta(seconds=Config.ANSWER_CACHE_TTL)
+    ).delete(synchronize_session=False)
+    overflow = db.query(models.RespuestaCache.idRespuestaCache).order_by(
+        models.RespuestaCache.ultimo_uso.desc(), models.RespuestaCache.idRespuestaCache.desc()
+    ).offset(Config.ANSWER_CACHE_MAX_ENTRIES).all()
+    if overflow:
+        db.query(models.RespuestaCache).filter(
+            models.RespuestaCache.idRespuestaCache.in_([i for (i,) in overflow])
+        ).delete(synchronize_session=False)
+    db.commit()
+
+def stats(db: Session) -> dict:
+    entries, uses = db.query(
+        func.count(models.RespuestaCache.idRespuestaCache), func.sum(models.RespuestaCache.usos)
+    ).one()
+    return {"entries": entries, "hits": int(uses or 0), "max_entries": Config.ANSWER_CACHE_MAX_ENTRIES}
@@ -0,0 +1,135 @@
+import os
+import struct
+from typing import BinaryIO, Optional
+
+# Audio duration read from the container, without decoding. Covers what the
+# tablets record (WebM/Opus from MediaRecorder) plus WAV and Ogg; any other
+# format reports None instead of a guess.
+
+def audio_duration(fileobj: BinaryIO) -> Optional[float]:
+    """Seconds of audio in a seekable file, or None if unknown"""
+    try:
+        fileobj.seek(0)
+        magic = fileobj.read(4)
+        fileobj.seek(0)
+        if magic == b"RIFF":
+            seconds = _wav_duration(fileobj)
+        elif magic == b"\x1a\x45\xdf\xa3":
+            seconds = _webm_duration(fileobj)
+        elif magic == b"OggS":
+            seconds = _ogg_duration(fileobj)
+        else:
+            seconds = None
+    except (EOFError, IndexError, ValueError, struct.error):
+        seconds = None
+    finally:
+        fileobj.seek(0)
+    return round(seconds, 2) if seconds is not None else None
+
+def file_size(fileobj: BinaryIO) -> int:
+    """Size of a seekable file, keeping its position"""
+    position = fileobj.tell()
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(position)
+    return size
+
+def _wav_duration(f: BinaryIO) -> Optional[float]:
+    # RIFF chunks: byte rate from "fmt ", length from "data". Recorders that
+    # stream WAV leave the data size unset, so it is capped by the file size
+    total = file_size(f)
+    f.seek(12)
+    byte_rate = None
+    while f.tell() + 8 <= total:
+        chunk_id, size = struct.unpack("<4sI", f.read(8))
+        start = f.tell()
+        if chunk_id == b"fmt ":
+            byte_rate = struct.unpack("<HHII", f.read(12))[3]
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None
+            return min(size, total - start) / byte_rate
+        f.seek(start + size + (size & 1))
+    return None
+
+def _ogg_duration(f: BinaryIO) -> Optional[float]:
+    # Granule position of the last page; Opus counts 48 kHz samples after a
+    # pre-skip, Vorbis counts samples at the stream's own rate
+    header = f.read(27)
+    segments = f.read(header[26])
+    packet = f.read(sum(segments))
+    if packet.startswith(b"OpusHead"):
+        rate, skip = 48000, struct.unpack("<H", packet[10:12])[0]
+    elif packet.startswith(b"\x01vorbis"):
+        rate, skip = struct.unpack("<I", packet[12:16])[0], 0
+    else:
+        return None
+    total = file_size(f)
+    f.seek(max(0, total - 65536))
+    tail = f.read()
+    last = tail.rfind(b"OggS")
+    if last < 0 or last + 14 > len(tail):
+        return None
+    granule = struct.unpack("<q", tail[last + 6:last + 14])[0]
+    return max(granule - skip, 0) / rate
+
+# Matroska/WebM element ids
+_SEGMENT = 0x18538067
+_INFO = 0x1549A966
+_CLUSTER = 0x1F43B675
+_BLOCK_GROUP = 0xA0
+_TIMECODE_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+_CLUSTER_TIMECODE = 0xE7
+_SIMPLE_BLOCK = 0xA3
+_BLOCK = 0xA1
+_CONTAINERS = {_SEGMENT, _INFO, _CLUSTER, _BLOCK_GROUP}
+
+def _read_vint(f: BinaryIO, keep_marker: bool) -> tuple[int, bool]:
+    """EBML variable-length int; returns (value, is the 'unknown size' marker)"""
+    first = f.read(1)
+    if not first:
+        raise EOFError
+    length, mask = 1, 0x80
+    while length <= 8 and not first[0] & mask:
+        length, mask = length + 1, mask >> 1
+    if length > 8:
+        raise ValueError("EBML inválido")
+    rest = f.read(length - 1)
+    if len(rest) < length - 1:
+        raise EOFError
+    value = first[0] if keep_marker else first[0] & (mask - 1)
+    for byte in rest:
+        value = (value << 8) | byte
+    return value, not keep_marker and value == (1 << (7 * length)) - 1
+
+def _webm_duration(f: BinaryIO) -> Optional[float]:
+    # Info/Duration when the muxer wrote it; MediaRecorder streams leave it
+    # out (and use unknown-size Segment/Cluster), so fall back to the
+    # timecode of the last block. Container elements are walked into, all
+    # other payloads are skipped with a seek
+    total = file_size(f)
+    scale, duration, cluster, last = 1_000_000, None, 0, None
+    try:
+        while f.tell() < total:
+            element, _ = _read_vint(f, keep_marker=True)
+            size, unknown = _read_vint(f, keep_marker=False)
+            if element in _CONTAINERS:
+                continue
+            if unknown:
+                break
+            start = f.tell()
+            if element == _TIMECODE_SCALE:
+                scale = int.from_bytes(f.read(size), "big")
+            elif element == _DURATION:
+                duration = struct.unpack(">f" if size == 4 else ">d", f.read(size))[0]
+            elif element == _CLUSTER_TIMECODE:
+                cluster = int.from_bytes(f.read(size), "big")
+            elif element in (_SIMPLE_BLOCK, _BLOCK):
+                _read_vint(f, keep_marker=False)  # Track number
+                timecode = cluster + struct.unpack(">h", f.read(2))[0]
+                last = timecode if last is None else max(last, timecode)
+            f.seek(start + size)
+    except (EOFError, struct.error):
+        pass  # Truncated upload: use what was read
+    ticks = duration if duration else last
+    return ticks * scale / 1e9 if ticks is not None else None
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+import threading
+import time
+
+from .config import Config
+
+class TTLCache:
+    """Small thread-safe in-process LRU cache with per-entry time-to-live"""
+
+    def __init__(self, ttl: float, maxsize: int = 256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """Return (value, age_seconds) for a fresh entry, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0], now - entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.lookup(key)
+        return entry[0] if entry is not None else default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """Drop one entry, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+# Database context handed to GPT by /voice/query, keyed by (days_back, user_id)
+business_context_cache = TTLCache(ttl=Config.CONTEXT_CACHE_TTL)
+
+# Claude completions for /ai endpoints, keyed by a hash of prompt and data
+claude_response_cache = TTLCache(ttl=Config.CLAUDE_CACHE_TTL)
+
+# Per-user scope for user_id filters: {"sede_ids": [...], "sensor_ids": [...]}
+scope_cache = TTLCache(ttl=Config.SCOPE_CACHE_TTL, maxsize=1024)
+
+def invalidate_business_data() -> None:
+    """Call after any write to Movimientos or Productos"""
+    business_context_cache.invalidate()
+
+def invalidate_user_scope(user_id: Optional[int] = None) -> None:
+    """Call after changing a user's sedes (user_id) or any Sede/Sensor (everyone)"""
+    scope_cache.invalidate(user_id)
@@ -5,10 +5,69 @@ class Config:
     # Database configuration
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./panaderias.db")
     
+    # Database engine tuning (pool sizes default per backend when unset)
+    DB_POOL_SIZE = os.getenv("DB_POOL_SIZE")
+    DB_MAX_OVERFLOW = os.getenv("DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    
+    # Optional async engine for hot read paths (needs aiosqlite/asyncpg/aiomysql)
+    DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+    
+    # SQLite pragmas applied on every new connection
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    
     # Server configuration
     HOST = os.getenv("HOST", "127.0.0.1")
     PORT = int(os.getenv("PORT", "8000"))
     
+    # OpenAI (voice chat) client configuration
+    OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+    OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+    # Largest audio upload accepted by /voice/transcribe (Whisper's limit is 25 MB)
+    VOICE_MAX_UPLOAD_MB = float(os.getenv("VOICE_MAX_UPLOAD_MB", "25"))
+    
+    # Speech-to-text backend: "openai" (whisper-1) or "local" (faster-whisper
+    # on CPU, loaded once per worker process at startup)
+    STT_BACKEND = os.getenv("STT_BACKEND", "openai").lower()
+    LOCAL_STT_MODEL = os.getenv("LOCAL_STT_MODEL", "small")
+    LOCAL_STT_COMPUTE_TYPE = os.getenv("LOCAL_STT_COMPUTE_TYPE", "int8")
+    LOCAL_STT_WORKERS = int(os.getenv("LOCAL_STT_WORKERS", "1"))
+    LOCAL_STT_THREADS = int(os.getenv("LOCAL_STT_THREADS", "4"))
+    
+    # Claude (AI analytics) client configuration
+    CLAUDE_API_URL = os.getenv("CLAUDE_API_URL", "https://api.anthropic.com/v1/messages")
+    CLAUDE_TIMEOUT = float(os.getenv("CLAUDE_TIMEOUT", "30"))
+    CLAUDE_CACHE_TTL = float(os.getenv("CLAUDE_CACHE_TTL", "300"))
+    
+    # Answer templated voice questions from SQL without calling the LLM
+    VOICE_FAST_PATH = os.getenv("VOICE_FAST_PATH", "true").lower() in ("1", "true", "yes")
+    
+    # Persistent answer cache for repeated questions: max age in seconds,
+    # entry limit (0 disables) and token overlap for reworded questions (1 = exact)
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.8"))
+    
+    # Seconds a voice-chat business context stays cached
+    CONTEXT_CACHE_TTL = float(os.getenv("CONTEXT_CACHE_TTL", "60"))
+    
+    # Seconds a user's sede/sensor scope stays cached
+    SCOPE_CACHE_TTL = float(os.getenv("SCOPE_CACHE_TTL", "300"))
+    
+    # Sensor rollups: compaction period (0 disables the background task),
+    # minutes re-read for late readings, and retention (0 keeps forever)
+    SENSOR_COMPACTION_INTERVAL = float(os.getenv("SENSOR_COMPACTION_INTERVAL", "300"))
+    SENSOR_COMPACTION_LOOKBACK_MINUTES = int(os.getenv("SENSOR_COMPACTION_LOOKBACK_MINUTES", "60"))
+    SENSOR_RAW_RETENTION_DAYS = int(os.getenv("SENSOR_RAW_RETENTION_DAYS", "30"))
+    SENSOR_MINUTE_RETENTION_DAYS = int(os.getenv("SENSOR_MINUTE_RETENTION_DAYS", "90"))
+
     # CORS configuration
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",")
     
@@ -23,4 +82,35 @@ class Config:
                 project_root = Path(__file__).parent.parent
                 db_path = project_root / db_path
             return f"sqlite:///{db_path}"
-        return cls.DATABASE_URL
\ No newline at end of file
+        return cls.DATABASE_URL
+    
+    @classmethod
+    def get_async_database_url(cls):
+        """Database URL with the asyncio driver for the configured backend"""
+        url = cls.get_database_url()
+        scheme, rest = url.split("://", 1)
+        backend = scheme.split("+", 1)[0]
+        driver = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}.get(backend)
+        return f"{backend}+{driver}://{rest}" if driver else url
+    
+    @classmethod
+    def get_engine_options(cls, database_url: str) -> dict:
+        """Pool settings for create_engine, sized for each database backend"""
+        if database_url.startswith("sqlite"):
+            # WAL allows concurrent readers, but SQLite still has a single
+            # writer, so a modest pool is enough
+            pool_size, max_overflow = 10, 10
+            options = {"connect_args": {"timeout": cls.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        elif database_url.startswith("mysql"):
+            # MySQL drops idle connections after wait_timeout
+            pool_size, max_overflow = 10, 20
+            options = {"pool_pre_ping": True, "pool_recycle": cls.DB_POOL_RECYCLE}
+        else:
+            pool_size, max_overflow = 10, 20
+            options = {"pool_pre_ping": True}
+        
+        if ":memory:" not in database_url and database_url != "sqlite://":
+            options["pool_size"] = int(cls.DB_POOL_SIZE) if cls.DB_POOL_SIZE else pool_size
+            options["max_overflow"] = int(cls.DB_MAX_OVERFLOW) if cls.DB_MAX_OVERFLOW else max_overflow
+            options["pool_timeout"] = cls.DB_POOL_TIMEOUT
+        return options
\ No newline at end of file
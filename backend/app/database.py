@@ -1,10 +1,138 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from contextvars import ContextVar
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from typing import Any, Callable, Optional
+import time
 from .config import Config
 
 DATABASE_URL = Config.get_database_url()
 
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **Config.get_engine_options(DATABASE_URL))
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Production profile: WAL so ESP32 writes don't block dashboard reads"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={Config.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={Config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={Config.SQLITE_MMAP_SIZE}")
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{Config.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA temp_store={Config.SQLITE_TEMP_STORE}")
+    cursor.close()
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+# Optional async engine (DB_ASYNC=true). Hot read paths take get_read_db
+# and run their queries through run_db, which uses the async driver when
+# it is enabled and the regular engine on the thread pool otherwise.
+async_engine = None
+AsyncSessionLocal = None
+
+if Config.DB_ASYNC:
+    try:
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+        ASYNC_DATABASE_URL = Config.get_async_database_url()
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, **Config.get_engine_options(ASYNC_DATABASE_URL))
+        if async_engine.dialect.name == "sqlite":
+            event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    except ImportError as e:
+        print(f"DB_ASYNC desactivado, falta el driver async: {e}")
+
+def _open_session() -> Session:
+    # Check out the connection up front so pool waits show up in
+    # db_pool_checkout_wait_seconds instead of inside the first query
+    from .metrics import db_pool_checkout_wait
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    db.connection()
+    db_pool_checkout_wait.observe(time.perf_counter() - start)
+    return db
+
+def get_db():
+    """Session dependency shared by every router"""
+    db = _open_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_read_db():
+    """Async session when DB_ASYNC is on, otherwise a regular Session"""
+    if AsyncSessionLocal is None:
+        # Checkout and close may wait on the pool: keep them off the event loop
+        db = await run_in_threadpool(_open_session)
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+    else:
+        async with AsyncSessionLocal() as db:
+            yield db
+
+async def run_db(db, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Call fn(session, *args) without blocking the event loop
+
+    With the async engine fn runs on the async connection (no worker
+    thread); with a regular Session it runs on the thread pool.
+    """
+    if isinstance(db, Session):
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+    return await db.run_sync(fn, *args, **kwargs)
+
+async def dispose_async_engine():
+    if async_engine is not None:
+        await async_engine.dispose()
+
+# Per-request statement instrumentation. The metrics middleware opens a
+# QueryStats for each request; cursor events on both engines add every
+# statement executed while handling it (thread pool and run_sync included,
+# since both run in a copy of the request's context).
+class QueryStats:
+    __slots__ = ("count", "total", "slowest", "slowest_statement")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+
+    def record(self, duration: float, statement: str) -> None:
+        self.count += 1
+        self.total += duration
+        if duration > self.slowest:
+            self.slowest = duration
+            self.slowest_statement = statement
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+def begin_query_stats() -> QueryStats:
+    stats = QueryStats()
+    _query_stats.set(stats)
+    return stats
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_start")
+    if not started:
+        return
+    duration = time.perf_counter() - started.pop()
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record(duration, statement)
+
+for _engine in (engine, async_engine.sync_engine if async_engine is not None else None):
+    if _engine is not None:
+        event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
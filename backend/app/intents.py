@@ -0,0 +1,274 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import aggregations, models
+
+# Fast path for voice questions. The common templated questions ("¿cuál es
+# la temperatura?", "¿qué productos tienen poco stock?", "ventas de hoy") are
+# answered straight from SQL with a Spanish template in milliseconds; open-
+# ended or unrecognised questions return None and go to the LLM as before.
+# Answers use the same data as the LLM context (every sede unless the
+# question names one); questions about a single product or another period
+# ("la semana pasada") go to the LLM.
+
+LOW_STOCK_THRESHOLD = 10  # Same cut-off as the LLM context and /stats
+MAX_WORDS = 14  # Longer questions are rarely a plain lookup
+MAX_ITEMS = 10
+
+# Questions that ask for reasoning rather than a number
+_OPEN_ENDED = re.compile(
+    r"\b(por que|porque|recomiend|recomendacion|deberia|conviene|compar|analiz|analisis|"
+    r"estrategia|mejorar|predic|pronostic|consejo|sugier|sugerencia|explica|tendencia|"
+    r"como (puedo|podemos|hago|hacemos))"
+)
+# Periods the "current value" answers don't cover
+_HISTORICAL = re.compile(r"\b(ayer|semana|mes|ano|promedio|maxim|minim|historial|grafic|ultim[oa]s)\b")
+# Periods other than today and the last 7 days the sales answers cover:
+# "la semana pasada", "el mes anterior", "el lunes", "el 3 de mayo", "15/06"
+_OTHER_PERIOD = re.compile(
+    r"\b(pasad[oa]s?|anterior(es)?|ayer|anteayer|antier|mes|meses|ano|anos|semanas|trimestre|"
+    r"lunes|martes|miercoles|jueves|viernes|sabado|domingo|enero|febrero|marzo|abril|mayo|junio|"
+    r"julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre|"
+    r"ultim[oa]s (?!7 dias)\d+|\d{1,4} \d{1,2}( \d{1,4})?)\b"
+)
+_SEDE_GENERIC_WORDS = {"panaderia", "sede", "tienda", "sucursal", "la", "el", "de", "del"}
+
+def normalize(text: str) -> str:
+    """Lowercase, accents folded, punctuation dropped"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^a-z0-9ñ]+", " ", text).split())
+
+def time_ago(date_time: datetime) -> str:
+    """Helper function to get human-readable time difference"""
+    if not date_time:
+        return "fecha desconocida"
+
+    # Stored fecha values are naive Lima time
+    now = datetime.now(date_time.tzinfo) if date_time.tzinfo else models.get_lima_time().replace(tzinfo=None)
+    diff = now - date_time
+
+    if diff.days > 0:
+        return f"{diff.days} día{'s' if diff.days > 1 else ''}"
+    elif diff.seconds > 3600:
+        hours = diff.seconds // 3600
+        return f"{hours} hora{'s' if hours > 1 else ''}"
+    elif diff.seconds > 60:
+        minutes = diff.seconds // 60
+        return f"{minutes} minuto{'s' if minutes > 1 else ''}"
+    else:
+        return "ahora mismo"
+
+def _ago(fecha: datetime) -> str:
+    elapsed = time_ago(fecha)
+    return elapsed if elapsed == "ahora mismo" else f"hace {elapsed}"
+
+def _soles(amount: float) -> str:
+    return f"S/. {amount:,.2f}"
+
+def _units(quantity: float) -> str:
+    return f"{quantity:g}"
+
+def _today_start() -> datetime:
+    # Lima midnight, naive like the stored fecha values
+    return models.get_lima_time().replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+def _named_sede(db: Session, query: str) -> Optional[Tuple[int, str]]:
+    """Sede mentioned in the question, e.g. "stock bajo en Centro" """
+    words = set(query.split())
+    for sede_id, nombre in db.query(models.Sede.idSedes, models.Sede.Nombre).all():
+        tokens = [t for t in normalize(nombre or "").split() if t not in _SEDE_GENERIC_WORDS]
+        if tokens and all(t in words for t in tokens):
+            return sede_id, nombre
+    return None
+
+def _named_product(db: Session, query: str) -> Optional[str]:
+    """Product mentioned in the question, e.g. "¿cuánto pan francés vendimos hoy?" """
+    words = set(query.split())
+    words |= {w[:-1] for w in words if w.endswith("s")} | {w[:-2] for w in words if w.endswith("es")}
+    for (nombre,) in db.query(models.Producto.Nombre).distinct().all():
+        tokens = [t for t in normalize(nombre or "").split() if t not in _SEDE_GENERIC_WORDS]
+        if tokens and all(t in words for t in tokens):
+            return nombre
+    return None
+
+def _listing(items: List[str]) -> str:
+    shown = "; ".join(items[:MAX_ITEMS])
+    if len(items) > MAX_ITEMS:
+        shown += f"; y {len(items) - MAX_ITEMS} más"
+    return shown
+
+def _latest_readings(db: Session, model, value_col, sede_id: Optional[int]) -> list:
+    """Most recent reading of every sensor: (value, fecha, sensor, sede)"""
+    latest = db.query(
+        model.Sensor_id.label("sensor_id"), func.max(model.fecha).label("fecha")
+    ).group_by(model.Sensor_id).subquery()
+    query = db.query(
+        model.Sensor_id, value_col, model.fecha, models.Sensor.nombre, models.Sede.Nombre
+    ).join(
+        latest, (model.Sensor_id == latest.c.sensor_id) & (model.fecha == latest.c.fecha)
+    ).outerjoin(
+        models.Sensor, models.Sensor.idSensores == model.Sensor_id
+    ).outerjoin(
+        models.Sede, models.Sede.idSedes == models.Sensor.sede_id
+    )
+    if sede_id is not None:
+        query = query.filter(models.Sensor.sede_id == sede_id)
+    # Two readings with the same timestamp: keep one per sensor
+    rows = {row[0]: row[1:] for row in query.order_by(models.Sede.Nombre, model.Sensor_id).all()}
+    return list(rows.values())
+
+def _reading_text(db: Session, query: str, model, value_col, label: str, unit: str) -> str:
+    sede = _named_sede(db, query)
+    readings = _latest_readings(db, model, value_col, sede[0] if sede else None)
+    if not readings:
+        where = f" en {sede[1]}" if sede else ""
+        return f"No hay lecturas de {label}{where} registradas."
+    items = [
+        f"{value:.1f}{unit} en {sede_nombre or 'sede no especificada'} "
+        f"(sensor {sensor or 'sin nombre'}, {_ago(fecha)})"
+        for value, fecha, sensor, sede_nombre in readings
+    ]
+    return f"{label.capitalize()} actual: {_listing(items)}."
+
+def _answer_temperature(db: Session, query: str) -> str:
+    return _reading_text(db, query, models.Temperatura, models.Temperatura.Temperatura, "temperatura", "°C")
+
+def _answer_humidity(db: Session, query: str) -> str:
+    return _reading_text(db, query, models.Humedad, models.Humedad.Humedad, "humedad", "%")
+
+def _answer_environment(db: Session, query: str) -> str:
+    return f"{_answer_temperature(db, query)} {_answer_humidity(db, query)}"
+
+def _answer_low_stock(db: Session, query: str) -> str:
+    sede = _named_sede(db, query)
+    rows = db.query(models.Producto.Nombre, models.Producto.Stock, models.Sede.Nombre).outerjoin(
+        models.Sede, models.Sede.idSedes == models.Producto.Sede_id
+    ).filter(models.Producto.Stock < LOW_STOCK_THRESHOLD)
+    if sede:
+        rows = rows.filter(models.Producto.Sede_id == sede[0])
+    rows = rows.order_by(models.Producto.Stock, models.Producto.Nombre).all()
+    where = f" en {sede[1]}" if sede else ""
+    if not rows:
+        return f"Todos los productos{where} tienen stock adecuado ({LOW_STOCK_THRESHOLD} unidades o más)."
+    # Always with the sede, as the LLM prompt requires for low stock
+    items = [
+        f"{nombre}: {_units(stock)} unidades en {sede_nombre or 'sede no especificada'}"
+        for nombre, stock, sede_nombre in rows
+    ]
+    return f"Productos con stock bajo{where} (menos de {LOW_STOCK_THRESHOLD} unidades): {_listing(items)}."
+
+def _sales_text(db: Session, query: str, start: datetime, periodo: str) -> str:
+    sede = _named_sede(db, query)
+    revenue, transactions, quantity = aggregations.sales_totals(
+        db, start, sede_ids=[sede[0]] if sede else None
+    )
+    where = f" en {sede[1]}" if sede else ""
+    if not transactions:
+        return f"No hay ventas registradas {periodo}{where}."
+    return (
+        f"Ventas {periodo}{where}: {_soles(revenue)} en {transactions} "
+        f"transacci{'ones' if transactions != 1 else 'ón'} ({_units(round(quantity, 2))} unidades, "
+        f"promedio {_soles(revenue / transactions)} por transacción)."
+    )
+
+def _answer_sales_today(db: Session, query: str) -> str:
+    return _sales_text(db, query, _today_start(), "de hoy")
+
+def _answer_sales_week(db: Session, query: str) -> str:
+    return _sales_text(db, query, _today_start() - timedelta(days=6), "de los últimos 7 días")
+
+def _answer_top_products(db: Session, query: str) -> str:
+    today = re.search(r"\bhoy\b", query) is not None
+    start = _today_start() if today else _today_start() - timedelta(days=6)
+    periodo = "hoy" if today else "en los últimos 7 días"
+    sede = _named_sede(db, query)
+    top = aggregations.product_sales(db, start, limit=5, sede_ids=[sede[0]] if sede else None)
+    where = f" en {sede[1]}" if sede else ""
+    if not top:
+        return f"No hay ventas registradas {periodo}{where}."
+    items = [
+        f"{nombre or 'Producto ' + str(producto_id)} ({_units(quantity)} unidades, {_soles(revenue)})"
+        for producto_id, nombre, _, quantity, revenue in top
+    ]
+    return f"Productos más vendidos {periodo}{where}: {_listing(items)}."
+
+def _answer_sedes(db: Session, query: str) -> str:
+    nombres = [nombre for (nombre,) in db.query(models.Sede.Nombre).order_by(models.Sede.Nombre).all()]
+    if not nombres:
+        return "No hay sedes registradas."
+    return f"Hay {len(nombres)} sede{'s' if len(nombres) != 1 else ''}: {', '.join(n or 'sin nombre' for n in nombres)}."
+
+@dataclass
+class Intent:
+    name: str
+    query_type: str  # Same buckets as classify_query_type
+    pattern: re.Pattern
+    answer: Callable[[Session, str], str]
+    exclude: Optional[re.Pattern] = None
+
+_SALES = r"(venta|ventas|vendido|vendimos|vendio|vendi|ingreso|ingresos|facturado|facturamos)"
+
+# First match wins, so the combined environment intent precedes its parts
+INTENTS = [
+    Intent(
+        "ambiente", "environmental",
+        re.compile(r"temperatura.*humedad|humedad.*temperatura|\bambiente\b|\bclima\b|condiciones ambientales"),
+        _answer_environment, _HISTORICAL
+    ),
+    Intent("temperatura", "environmental", re.compile(r"\btemperatura\b|\bcalor\b|\bfrio\b"), _answer_temperature, _HISTORICAL),
+    Intent("humedad", "environmental", re.compile(r"\bhumedad\b"), _answer_humidity, _HISTORICAL),
+    Intent(
+        "stock_bajo", "inventory",
+        re.compile(
+            r"(stock|inventario) bajo|bajo stock|poco stock|poco inventario|falta stock|sin stock|"
+            r"por agotar|se (estan )?(acaban|agotan|acabando|agotando)|reabastecer|"
+            r"productos? (con|tienen|tiene|hay) (poco|bajo|menos)"
+        ),
+        _answer_low_stock
+    ),
+    Intent(
+        "mas_vendidos", "sales",
+        re.compile(r"mas vendid|se vende mas|mejor(es)? vendid|top (de )?(productos|ventas)"),
+        _answer_top_products, _OTHER_PERIOD
+    ),
+    Intent("ventas_hoy", "sales", re.compile(rf"\b{_SALES}\b.*\bhoy\b|\bhoy\b.*\b{_SALES}\b"), _answer_sales_today, _OTHER_PERIOD),
+    Intent(
+        "ventas_semana", "sales",
+        re.compile(rf"\b{_SALES}\b.*\b(semana|ultimos 7 dias)\b|\b(semana|ultimos 7 dias)\b.*\b{_SALES}\b"),
+        _answer_sales_week, _OTHER_PERIOD
+    ),
+    Intent(
+        "sedes", "locations",
+        re.compile(r"\b(cuantas|que|cuales) (son las )?(sedes|tiendas|sucursales)\b|lista(do)? de (sedes|tiendas|sucursales)"),
+        _answer_sedes
+    ),
+]
+
+def match_intent(query: str) -> Optional[Intent]:
+    """Intent for a question, or None when it should go to the LLM"""
+    normalized = normalize(query)
+    if not normalized or len(normalized.split()) > MAX_WORDS or _OPEN_ENDED.search(normalized):
+        return None
+    for intent in INTENTS:
+        if intent.pattern.search(normalized) and not (intent.exclude and intent.exclude.search(normalized)):
+            return intent
+    return None
+
+def answer(db: Session, query: str) -> Optional[Tuple[Intent, str]]:
+    """(intent, templated answer), or None to fall back to the LLM"""
+    intent = match_intent(query)
+    if intent is None:
+        return None
+    normalized = normalize(query)
+    # Sales and stock answers are totals over every product; a question
+    # about one product needs the LLM
+    if intent.query_type in ("sales", "inventory") and _named_product(db, normalized):
+        return None
+    return intent, intent.answer(db, normalized)
@@ -0,0 +1,23 @@
+import io
+
+# Worker side of the local speech-to-text backend (STT_BACKEND=local). These
+# functions run inside the process pool owned by routes/voice_chat.py; each
+# worker loads the quantized Whisper model once in load_model() and reuses it
+# for every clip. Kept free of app imports so spawned workers start light.
+
+_model = None
+
+def load_model(model_name: str, compute_type: str, cpu_threads: int) -> None:
+    """Pool initializer: load faster-whisper on the CPU"""
+    global _model
+    from faster_whisper import WhisperModel
+
+    _model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+def ready() -> bool:
+    return _model is not None
+
+def transcribe(audio: bytes, language: str) -> str:
+    # Greedy decoding and VAD keep short voice queries well under a second
+    segments, _ = _model.transcribe(io.BytesIO(audio), language=language, beam_size=1, vad_filter=True)
+    return "".join(segment.text for segment in segments).strip()
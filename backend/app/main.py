@@ -1,12 +1,27 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
-from .database import engine, Base
-from .routes import productos, sedes, movimientos, usuarios, sensores, temperatura, humedad, ai_analytics, voice_chat
+from .database import engine, Base, dispose_async_engine
+from .migrations import run_migrations
+from .routes import productos, sedes, movimientos, usuarios, sensores, temperatura, humedad, ai_analytics, voice_chat, stats
 from .config import Config
+from .sensor_rollups import compaction_loop
+from .metrics import metrics_middleware, db_metrics, render
+from .uploads import FORM_OVERHEAD, UploadLimitMiddleware
 
 app = FastAPI()
 
+# ✔ Límite de tamaño de audio mientras se recibe (413 antes de guardar el archivo)
+app.add_middleware(
+    UploadLimitMiddleware,
+    paths={"/voice/transcribe", "/voice/chat"},
+    max_bytes=int(Config.VOICE_MAX_UPLOAD_MB * 1024 * 1024) + FORM_OVERHEAD,
+    detail=f"Audio supera el máximo de {Config.VOICE_MAX_UPLOAD_MB:g} MB",
+)
+
 # CORS Middleware with configurable origins
 app.add_middleware(
     CORSMiddleware,
@@ -16,9 +31,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✔ Latencia, consultas SQL y peticiones en curso (Server-Timing, /metrics)
+app.middleware("http")(metrics_middleware)
+
 # ✔ Crea las tablas si no existen
 Base.metadata.create_all(bind=engine)
 
+# ✔ Aplica migraciones pendientes (índices) a bases de datos existentes
+run_migrations(engine)
+
 # ✔ Rutas
 app.include_router(productos.router)
 app.include_router(sedes.router)
@@ -29,8 +50,41 @@ app.include_router(temperatura.router)
 app.include_router(humedad.router)
 app.include_router(ai_analytics.router)
 app.include_router(voice_chat.router)
+app.include_router(stats.router)
+
+# ✔ Compacta lecturas de sensores en segundo plano
+@app.on_event("startup")
+async def start_sensor_compaction():
+    if Config.SENSOR_COMPACTION_INTERVAL > 0:
+        app.state.sensor_compaction = asyncio.create_task(compaction_loop())
+
+# ✔ Carga el modelo de transcripción local (STT_BACKEND=local) al iniciar
+@app.on_event("startup")
+async def start_transcription():
+    await voice_chat.start_transcription_backend()
+
+# ✔ Cierra clientes HTTP compartidos al apagar
+@app.on_event("shutdown")
+async def shutdown_clients():
+    task = getattr(app.state, "sensor_compaction", None)
+    if task:
+        task.cancel()
+    await voice_chat.close_openai_client()
+    await voice_chat.close_transcription_backend()
+    await ai_analytics.close_claude_client()
+    await dispose_async_engine()
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "Bakery API is running"}
+
+# Prometheus scrape target: route latency histograms, DB pool, AI calls, ingest
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+# Database load per endpoint (query count, DB time, slowest statement)
+@app.get("/metrics/db")
+async def metrics_db():
+    return db_metrics()
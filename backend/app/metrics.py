@@ -0,0 +1,227 @@
+from contextlib import contextmanager
+from fastapi import Request
+from typing import Dict, Iterable, Tuple
+import threading
+import time
+
+from . import database
+
+# In-process metrics in the Prometheus text format (GET /metrics) plus the
+# per-endpoint database breakdown (GET /metrics/db). Collectors are plain
+# dicts behind a lock, cheap enough to stay on in production.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name + _labels(self.labels, k), v) for k, v in self._values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append((self.name + "_bucket" + _labels(self.labels, key, f'le="{bound}"'), cumulative))
+                lines.append((self.name + "_bucket" + _labels(self.labels, key, 'le="+Inf"'), count))
+                lines.append((self.name + "_sum" + _labels(self.labels, key), total))
+                lines.append((self.name + "_count" + _labels(self.labels, key), count))
+        return lines
+
+REGISTRY = []
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route")
+)
+http_requests = Counter(
+    "http_requests_total", "Requests by route template and status", ("method", "route", "status")
+)
+http_in_flight = Gauge("http_requests_in_flight", "Requests being handled")
+db_pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time waiting for a pooled connection in get_db",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+ai_call_duration = Histogram(
+    "ai_call_duration_seconds", "External AI API call latency", ("service", "operation")
+)
+ai_call_errors = Counter(
+    "ai_call_errors_total", "Failed external AI API calls", ("service", "operation")
+)
+sensor_readings_ingested = Counter(
+    "sensor_readings_ingested_total", "Sensor readings stored", ("metric", "sensor_id")
+)
+
+def observe_ai_call(service: str, operation: str, seconds: float, ok: bool = True) -> None:
+    ai_call_duration.observe(seconds, service, operation)
+    if not ok:
+        ai_call_errors.inc(service, operation)
+
+@contextmanager
+def track_ai_call(service: str, operation: str):
+    """Time an AI API call; an exception counts as an error"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        observe_ai_call(service, operation, time.perf_counter() - start, ok=False)
+        raise
+    observe_ai_call(service, operation, time.perf_counter() - start)
+
+def _pool_samples():
+    pool = database.engine.pool
+    samples = []
+    for name, attr in (("checked_out", "checkedout"), ("size", "size"), ("overflow", "overflow")):
+        getter = getattr(pool, attr, None)
+        if callable(getter):
+            samples.append((f"db_pool_{name}", getter()))
+    return samples
+
+def render() -> str:
+    """All collectors in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name} {value}" for name, value in metric.samples())
+    for name, value in _pool_samples():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    with _lock:
+        db_rows = list(_endpoints.items())
+    lines.append("# HELP db_queries_total SQL statements by route template")
+    lines.append("# TYPE db_queries_total counter")
+    lines.extend(f'db_queries_total{{route="{_escape(key)}"}} {e["queries"]}' for key, e in db_rows)
+    lines.append("# HELP db_query_seconds_total Time spent in SQL by route template")
+    lines.append("# TYPE db_query_seconds_total counter")
+    lines.extend(f'db_query_seconds_total{{route="{_escape(key)}"}} {e["db_time"]}' for key, e in db_rows)
+    return "\n".join(lines) + "\n"
+
+# Database load per endpoint. The middleware opens a QueryStats for every
+# request, reports it in a Server-Timing header and folds it into these
+# totals, served by GET /metrics/db.
+
+_lock = threading.Lock()
+_endpoints: Dict[str, dict] = {}
+_started = time.time()
+
+def _route_template(request: Request) -> str:
+    # Route template, so /productos/1 and /productos/2 share a row
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "sin_ruta"
+
+def _record(key: str, stats: database.QueryStats, elapsed: float) -> None:
+    with _lock:
+        entry = _endpoints.get(key)
+        if entry is None:
+            entry = _endpoints[key] = {
+                "requests": 0, "queries": 0, "db_time": 0.0, "time": 0.0,
+                "max_queries": 0, "slowest": 0.0, "slowest_statement": None
+            }
+        entry["requests"] += 1
+        entry["queries"] += stats.count
+        entry["db_time"] += stats.total
+        entry["time"] += elapsed
+        entry["max_queries"] = max(entry["max_queries"], stats.count)
+        if stats.slowest > entry["slowest"]:
+            entry["slowest"] = stats.slowest
+            entry["slowest_statement"] = stats.slowest_statement
+
+def server_timing(stats: database.QueryStats, elapsed: float) -> str:
+    return (
+        f'db;dur={stats.total * 1000:.1f};desc="{stats.count} queries", '
+        f"db-slowest;dur={stats.slowest * 1000:.1f}, "
+        f"app;dur={elapsed * 1000:.1f}"
+    )
+
+async def metrics_middleware(request: Request, call_next):
+    stats = database.begin_query_stats()
+    start = time.perf_counter()
+    status = 500
+    http_in_flight.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        http_in_flight.dec()
+        elapsed = time.perf_counter() - start
+        route = _route_template(request)
+        http_request_duration.observe(elapsed, request.method, route)
+        http_requests.inc(request.method, route, str(status))
+        _record(f"{request.method} {route}", stats, elapsed)
+    response.headers["Server-Timing"] = server_timing(stats, elapsed)
+    # Lets the dashboard (another origin) read the timings in devtools
+    response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+def db_metrics() -> dict:
+    """Per-endpoint DB totals, endpoints with the most DB time first"""
+    with _lock:
+        rows = [
+            {
+                "endpoint": key,
+                "requests": e["requests"],
+                "queries": e["queries"],
+                "queries_per_request": round(e["queries"] / e["requests"], 2),
+                "max_queries": e["max_queries"],
+                "db_ms": round(e["db_time"] * 1000, 1),
+                "db_ms_per_request": round(e["db_time"] * 1000 / e["requests"], 2),
+                "ms_per_request": round(e["time"] * 1000 / e["requests"], 2),
+                "slowest_ms": round(e["slowest"] * 1000, 2),
+                "slowest_statement": (e["slowest_statement"] or "")[:300] or None
+            }
+            for key, e in _endpoints.items()
+        ]
+    rows.sort(key=lambda r: r["db_ms"], reverse=True)
+    return {"uptime_seconds": int(time.time() - _started), "endpoints": rows}
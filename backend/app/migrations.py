@@ -0,0 +1,81 @@
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.engine import Engine
+
+from .database import Base
+from .rollups import backfill_ventas_diarias, rollup_is_empty
+from .stock import signed_cantidad
+from . import models  # noqa: F401 - registers every table on Base.metadata
+
+# Lightweight, idempotent schema upgrades for existing databases.
+# Base.metadata.create_all() skips tables that already exist, so indexes
+# added to models after a panaderias.db was created are never built by it.
+
+def ensure_indexes(engine: Engine) -> list[str]:
+    """Create any model index missing from the database, return created names"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            index.create(bind=engine, checkfirst=True)
+            created.append(index.name)
+
+    return created
+
+def ensure_columns(engine: Engine) -> list[str]:
+    """Add nullable model columns missing from existing tables, return created names"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable or column.primary_key:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            # Quoted for the dialect: "x" on SQLite/Postgres, `x` on MySQL
+            quote = engine.dialect.identifier_preparer.quote
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+            created.append(f"{table.name}.{column.name}")
+
+    return created
+
+def backfill_stock_inicial(engine: Engine) -> None:
+    """Set Stock_Inicial on products from before the ledger existed
+
+    Their stored Stock is taken as correct, so the starting stock is
+    Stock minus the deltas of the movements already recorded; otherwise
+    reconcile_stock would count those movements a second time.
+    """
+    ledger = select(func.sum(signed_cantidad())).where(
+        models.Movimiento.producto_id == models.Producto.idProductos
+    ).scalar_subquery()
+    with engine.begin() as conn:
+        conn.execute(
+            update(models.Producto)
+            .where(models.Producto.Stock_Inicial.is_(None))
+            .values(
+                Stock_Inicial=func.coalesce(models.Producto.Stock, 0) - func.coalesce(ledger, 0),
+                # Not an edit of the product: keep its onupdate timestamp
+                Fecha_Actualiazacion=models.Producto.Fecha_Actualiazacion
+            )
+        )
+
+def run_migrations(engine: Engine) -> None:
+    """Bring an existing database up to date with the current models"""
+    ensure_columns(engine)
+    ensure_indexes(engine)
+    backfill_stock_inicial(engine)
+    # First start with the rollup table: build it from existing movements
+    if rollup_is_empty(engine):
+        backfill_ventas_diarias(engine)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, String, Text, Float, Date, DateTime, ForeignKey, Enum, Boolean, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from .database import Base
 from datetime import datetime
@@ -23,12 +23,17 @@ class Producto(Base):
     Descripcion = Column(String(50))
     Precio = Column(Float)
     Stock = Column(Float)
+    Stock_Inicial = Column(Float)  # Base for the movement ledger (see stock.py)
     Unidad = Column(String(45))
     Categoria = Column(String(100))
     Fecha_Creacion = Column(DateTime, default=func.now())
     Fecha_Actualiazacion = Column(DateTime, default=func.now(), onupdate=func.now())
     Sede_id = Column(Integer, ForeignKey("Sedes.idSedes"))
 
+    __table_args__ = (
+        Index("ix_productos_sede", "Sede_id"),
+    )
+
 class Movimiento(Base):
     __tablename__ = "Movimientos"
     idMovimientos = Column(Integer, primary_key=True, index=True)
@@ -40,6 +45,33 @@ class Movimiento(Base):
     Usuario_id = Column(Integer, ForeignKey("Usuarios.idUsuarios"))
     sede_id = Column(Integer, ForeignKey("Sedes.idSedes"))
 
+    # Time-series indexes: every listing/analytics query filters by one of
+    # these columns and a fecha range, or orders by fecha
+    __table_args__ = (
+        Index("ix_movimientos_fecha", "fecha"),
+        Index("ix_movimientos_sede_fecha", "sede_id", "fecha"),
+        Index("ix_movimientos_producto_fecha", "producto_id", "fecha"),
+        Index("ix_movimientos_tipo_fecha", "tipo", "fecha"),
+    )
+
+# Daily rollup of Movimientos, maintained on write (see rollups.py)
+class VentaDiaria(Base):
+    __tablename__ = "VentasDiarias"
+    idVentaDiaria = Column(Integer, primary_key=True, index=True)
+    fecha_dia = Column(Date, nullable=False)
+    sede_id = Column(Integer, ForeignKey("Sedes.idSedes"))
+    producto_id = Column(Integer, ForeignKey("Productos.idProductos"))
+    tipo = Column(String(20))
+    cantidad = Column(Float, default=0)
+    ingresos = Column(Float, default=0)
+    transacciones = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("fecha_dia", "sede_id", "producto_id", "tipo", name="uq_ventasdiarias_clave"),
+        Index("ix_ventasdiarias_sede_fecha", "sede_id", "fecha_dia"),
+        Index("ix_ventasdiarias_producto_fecha", "producto_id", "fecha_dia"),
+    )
+
 class Usuario(Base):
     __tablename__ = "Usuarios"
     idUsuarios = Column(Integer, primary_key=True, index=True)
@@ -53,6 +85,10 @@ class UsuarioSede(Base):
     usuario_id = Column(Integer, ForeignKey("Usuarios.idUsuarios"))
     sede_id = Column(Integer, ForeignKey("Sedes.idSedes"))
 
+    __table_args__ = (
+        Index("ix_usuariosedes_usuario", "usuario_id"),
+    )
+
 class Sensor(Base):
     __tablename__ = "Sensores"
     idSensores = Column(Integer, primary_key=True, index=True)
@@ -60,6 +96,10 @@ class Sensor(Base):
     descripcion = Column(String(45))
     sede_id = Column(Integer, ForeignKey("Sedes.idSedes"))
 
+    __table_args__ = (
+        Index("ix_sensores_sede", "sede_id"),
+    )
+
 class Temperatura(Base):
     __tablename__ = "Temperatura"
     idTemperatura = Column(Integer, primary_key=True, index=True)
@@ -67,6 +107,11 @@ class Temperatura(Base):
     Sensor_id = Column(Integer, ForeignKey("Sensores.idSensores"))
     fecha = Column(DateTime, default=get_lima_time)
 
+    __table_args__ = (
+        Index("ix_temperatura_fecha", "fecha"),
+        Index("ix_temperatura_sensor_fecha", "Sensor_id", "fecha"),
+    )
+
 class Humedad(Base):
     __tablename__ = "Humedad"
     idHumedad = Column(Integer, primary_key=True, index=True)
@@ -74,6 +119,29 @@ class Humedad(Base):
     Sensor_id = Column(Integer, ForeignKey("Sensores.idSensores"))
     fecha = Column(DateTime, default=get_lima_time)
 
+    __table_args__ = (
+        Index("ix_humedad_fecha", "fecha"),
+        Index("ix_humedad_sensor_fecha", "Sensor_id", "fecha"),
+    )
+
+# Downsampled sensor readings per metric, resolution and bucket (see sensor_rollups.py)
+class LecturaAgregada(Base):
+    __tablename__ = "LecturasAgregadas"
+    idLecturaAgregada = Column(Integer, primary_key=True, index=True)
+    metrica = Column(String(30), nullable=False)  # "temperatura", "humedad"
+    resolucion = Column(String(5), nullable=False)  # "1m", "1h", "1d"
+    Sensor_id = Column(Integer, ForeignKey("Sensores.idSensores"))
+    bucket = Column(DateTime, nullable=False)  # Start of the bucket, Lima time
+    minimo = Column(Float)
+    maximo = Column(Float)
+    suma = Column(Float)
+    conteo = Column(Integer)
+
+    __table_args__ = (
+        UniqueConstraint("metrica", "resolucion", "Sensor_id", "bucket", name="uq_lecturasagregadas_clave"),
+        Index("ix_lecturasagregadas_tier_bucket", "metrica", "resolucion", "bucket"),
+    )
+
 class ChatSession(Base):
     __tablename__ = "ChatSessions"
     idChatSession = Column(Integer, primary_key=True, index=True)
@@ -95,4 +163,25 @@ class VoiceQuery(Base):
     execution_time_ms = Column(Integer)  # Response time in milliseconds
     success = Column(Boolean, default=True)
     error_message = Column(String(500), nullable=True)
+    served_by = Column(String(30), nullable=True)  # "llm", "cache" or "intent:<name>" (see intents.py)
     fecha = Column(DateTime, default=get_lima_time)
+
+# Persistent answer cache for voice and AI questions (see answer_cache.py)
+class RespuestaCache(Base):
+    __tablename__ = "RespuestasCache"
+    idRespuestaCache = Column(Integer, primary_key=True, index=True)
+    ambito = Column(String(20), nullable=False)  # "voz", "claude"
+    clave = Column(String(64), nullable=False)  # sha256 of ambito, huella and pregunta
+    pregunta = Column(String(1000))  # Normalized question tokens
+    huella = Column(String(64), nullable=False)  # Fingerprint of the data behind the answer
+    respuesta = Column(Text)
+    query_type = Column(String(50))
+    creado = Column(DateTime, default=get_lima_time)
+    ultimo_uso = Column(DateTime, default=get_lima_time)
+    usos = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("clave", name="uq_respuestascache_clave"),
+        Index("ix_respuestascache_ambito_huella", "ambito", "huella"),
+        Index("ix_respuestascache_ultimo_uso", "ultimo_uso"),
+    )
@@ -0,0 +1,86 @@
+from fastapi import HTTPException
+from sqlalchemy import or_
+from sqlalchemy.orm import Query
+from datetime import datetime
+from typing import Optional
+import base64
+
+# Keyset (cursor) pagination over (fecha, id), newest first.
+# A cursor encodes the last row of a page, so the next page is a range
+# seek on the (…, fecha) indexes instead of an OFFSET scan.
+# Rows without a fecha (legacy data) come after every dated row, newest id
+# first; they are read as a separate segment because `fecha < x` never
+# matches NULL and dialects disagree on where NULLs sort.
+
+def encode_cursor(fecha: Optional[datetime], row_id: int) -> str:
+    raw = f"{fecha.isoformat() if fecha is not None else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[Optional[datetime], int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        fecha, row_id = raw.rsplit("|", 1)
+        return (datetime.fromisoformat(fecha) if fecha else None), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def paginate(
+    query: Query,
+    fecha_col,
+    id_col,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None
+) -> dict:
+    """Return one page of query ordered by (fecha, id) desc, NULL fecha last
+
+    With a cursor, offset is ignored and the page starts right after the
+    row the cursor points to. include_total defaults to counting only on
+    the first page (no cursor), so following cursors never runs COUNT(*).
+    """
+    if include_total is None:
+        include_total = cursor is None
+    total = query.count() if include_total else None
+
+    dated = query.filter(fecha_col.isnot(None)).order_by(fecha_col.desc(), id_col.desc())
+    undated = query.filter(fecha_col.is_(None)).order_by(id_col.desc())
+    if cursor:
+        fecha, row_id = decode_cursor(cursor)
+        if fecha is None:
+            dated = None
+            undated = undated.filter(id_col < row_id)
+        else:
+            # Same as (fecha < x OR fecha = x AND id < y), written so the
+            # fecha bound is a plain index range and no sort is needed
+            dated = dated.filter(
+                fecha_col <= fecha,
+                or_(fecha_col < fecha, id_col < row_id)
+            )
+    elif offset:
+        dated = dated.offset(offset)
+
+    # Fetch one extra row to know whether another page exists
+    rows = dated.limit(limit + 1).all() if dated is not None else []
+    if len(rows) <= limit:
+        if offset and not cursor and not rows:
+            # The offset runs past the dated rows into the undated ones
+            undated = undated.offset(offset - query.filter(fecha_col.isnot(None)).count())
+        rows += undated.limit(limit + 1 - len(rows)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            getattr(last, fecha_col.key),
+            getattr(last, id_col.key)
+        )
+
+    return {
+        "items": rows,
+        "total": total,
+        "has_more": has_more,
+        "next_cursor": next_cursor
+    }
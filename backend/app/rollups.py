@@ -0,0 +1,133 @@
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+from typing import Iterable
+
+from . import models
+
+# VentasDiarias keeps one row per (fecha_dia, sede_id, producto_id, tipo)
+# with the summed quantity, revenue and number of movements, so analytics
+# over months read hundreds of rollup rows instead of every Movimiento.
+# Writers call add_movements/remove_movements inside their own transaction.
+
+_KEY = ("fecha_dia", "sede_id", "producto_id", "tipo")
+
+def _day(fecha) -> date:
+    if isinstance(fecha, datetime):
+        return fecha.date()
+    if isinstance(fecha, date):
+        return fecha
+    return datetime.fromisoformat(str(fecha)).date()
+
+def _collect(rows: Iterable[dict], sign: int) -> dict:
+    deltas = {}
+    for row in rows:
+        key = (_day(row["fecha"]), row["sede_id"], row["producto_id"], row["tipo"])
+        cantidad = row["Cantidad"] or 0
+        precio = row["Precio"] or 0
+        acc = deltas.setdefault(key, [0.0, 0.0, 0])
+        acc[0] += sign * cantidad
+        acc[1] += sign * cantidad * precio
+        acc[2] += sign
+    return deltas
+
+def _upsert(db: Session, deltas: dict) -> None:
+    if not deltas:
+        return
+    table = models.VentaDiaria.__table__
+    rows = [
+        dict(zip(_KEY, key), cantidad=c, ingresos=i, transacciones=t)
+        for key, (c, i, t) in deltas.items()
+    ]
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(_KEY),
+            set_={
+                "cantidad": table.c.cantidad + stmt.excluded.cantidad,
+                "ingresos": table.c.ingresos + stmt.excluded.ingresos,
+                "transacciones": table.c.transacciones + stmt.excluded.transacciones,
+            }
+        )
+        db.execute(stmt, rows)
+    elif dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            cantidad=table.c.cantidad + stmt.inserted.cantidad,
+            ingresos=table.c.ingresos + stmt.inserted.ingresos,
+            transacciones=table.c.transacciones + stmt.inserted.transacciones,
+        )
+        db.execute(stmt, rows)
+    else:
+        for row in rows:
+            result = db.execute(
+                update(table)
+                .where(*[table.c[k] == row[k] for k in _KEY])
+                .values(
+                    cantidad=table.c.cantidad + row["cantidad"],
+                    ingresos=table.c.ingresos + row["ingresos"],
+                    transacciones=table.c.transacciones + row["transacciones"],
+                )
+            )
+            if result.rowcount == 0:
+                db.execute(insert(table).values(**row))
+
+def add_movements(db: Session, rows: Iterable[dict]) -> None:
+    """Fold new movements (dicts with Movimiento column names) into the rollup"""
+    _upsert(db, _collect(rows, 1))
+
+def remove_movements(db: Session, rows: Iterable[dict]) -> None:
+    """Take deleted movements (or the old version of edited ones) back out"""
+    _upsert(db, _collect(rows, -1))
+
+def movement_row(mov: models.Movimiento) -> dict:
+    return {
+        "fecha": mov.fecha,
+        "sede_id": mov.sede_id,
+        "producto_id": mov.producto_id,
+        "tipo": mov.tipo,
+        "Cantidad": mov.Cantidad,
+        "Precio": mov.Precio,
+    }
+
+def backfill_ventas_diarias(engine: Engine) -> int:
+    """Rebuild VentasDiarias from Movimientos with one INSERT ... SELECT GROUP BY"""
+    mov = models.Movimiento
+    fecha_dia = func.date(mov.fecha)
+    source = select(
+        fecha_dia,
+        mov.sede_id,
+        mov.producto_id,
+        mov.tipo,
+        func.coalesce(func.sum(mov.Cantidad), 0.0),
+        func.coalesce(func.sum(mov.Cantidad * mov.Precio), 0.0),
+        func.count(mov.idMovimientos),
+    ).where(mov.fecha.isnot(None)).group_by(fecha_dia, mov.sede_id, mov.producto_id, mov.tipo)
+
+    table = models.VentaDiaria.__table__
+    with engine.begin() as conn:
+        conn.execute(table.delete())
+        conn.execute(table.insert().from_select(
+            ["fecha_dia", "sede_id", "producto_id", "tipo", "cantidad", "ingresos", "transacciones"],
+            source
+        ))
+        return conn.execute(select(func.count()).select_from(table)).scalar()
+
+def rollup_is_empty(engine: Engine) -> bool:
+    with engine.connect() as conn:
+        has_rollup = conn.execute(select(models.VentaDiaria.idVentaDiaria).limit(1)).first()
+        has_movements = conn.execute(select(models.Movimiento.idMovimientos).limit(1)).first()
+    return has_rollup is None and has_movements is not None
+
+if __name__ == "__main__":
+    # Manual rebuild: python -m app.rollups (from the backend directory)
+    from .database import engine
+    print(f"VentasDiarias reconstruida: {backfill_ventas_diarias(engine)} filas")
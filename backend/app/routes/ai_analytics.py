@@ -1,27 +1,52 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, func
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, Optional
+import asyncio
+import hashlib
 import json
 import httpx
 import re
+import time
 
-from .. import database, models
+from .. import answer_cache, database, models, aggregations
+from ..cache import claude_response_cache
+from ..config import Config
+from ..metrics import observe_ai_call
+from ..streaming import SSE_HEADERS, StreamRewriter, sse_event
 
 router = APIRouter(prefix="/ai", tags=["AI Analytics"])
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Claude API configuration
-CLAUDE_API_URL = "https://api.anthropic.com/v1/messages"
+CLAUDE_API_URL = Config.CLAUDE_API_URL
 CLAUDE_API_KEY = None  # Will be set via environment variable or config
 
+# Application-lifetime HTTP client so calls reuse keep-alive connections
+_claude_client: Optional[httpx.AsyncClient] = None
+
+# In-flight Claude calls by cache key; identical concurrent requests await the same task
+_claude_inflight: Dict[str, asyncio.Task] = {}
+
+def get_claude_client() -> httpx.AsyncClient:
+    """Get the shared Claude HTTP client, created on first use"""
+    global _claude_client
+    if _claude_client is None:
+        _claude_client = httpx.AsyncClient(
+            timeout=Config.CLAUDE_TIMEOUT,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+        )
+    return _claude_client
+
+async def close_claude_client():
+    """Close the shared Claude client on application shutdown"""
+    global _claude_client
+    if _claude_client is not None:
+        await _claude_client.aclose()
+        _claude_client = None
+
 def get_claude_api_key():
     """Get Claude API key from environment or return None"""
     import os
@@ -43,12 +68,62 @@ def fix_currency_to_soles(text: str) -> str:
     return text
 
 async def call_claude_api(prompt: str, data: Dict[str, Any]) -> str:
-    """Call Claude API with business data and analysis prompt"""
+    """Call Claude API with business data and analysis prompt
+
+    Successful answers are cached for CLAUDE_CACHE_TTL seconds, and
+    concurrent identical requests share a single in-flight call.
+    """
     
     api_key = get_claude_api_key()
     if not api_key:
         return "Claude API key no configurada. Agrega CLAUDE_API_KEY como variable de entorno."
     
+    key = _claude_cache_key(prompt, data)
+    
+    cached = claude_response_cache.get(key)
+    if cached is None:
+        cached = await run_in_threadpool(_load_claude_answer, prompt, key)
+    if cached is not None:
+        claude_response_cache.set(key, cached)
+        return cached
+    
+    task = _claude_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_claude(api_key, prompt, data, key))
+        _claude_inflight[key] = task
+        task.add_done_callback(lambda _: _claude_inflight.pop(key, None))
+    
+    # shield: a client disconnecting must not cancel the call for the others
+    return await asyncio.shield(task)
+
+async def _fetch_claude(api_key: str, prompt: str, data: Dict[str, Any], key: str) -> str:
+    """The in-flight call shared by identical requests; caches the answer once"""
+    text, ok = await _request_claude(api_key, prompt, data)
+    if ok:
+        claude_response_cache.set(key, text)
+        await run_in_threadpool(_save_claude_answer, prompt, key, text)
+    return text
+
+# Answers are also kept in the persistent answer cache (RespuestasCache),
+# keyed on the exact prompt and data, so they survive restarts
+
+def _load_claude_answer(prompt: str, key: str) -> Optional[str]:
+    with database.SessionLocal() as db:
+        found = answer_cache.lookup(db, "claude", prompt, key, similar=False)
+    return found[0] if found else None
+
+def _save_claude_answer(prompt: str, key: str, text: str) -> None:
+    with database.SessionLocal() as db:
+        answer_cache.store(db, "claude", prompt, key, text)
+
+def _claude_cache_key(prompt: str, data: Dict[str, Any]) -> str:
+    return hashlib.sha256(
+        (prompt + json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)).encode()
+    ).hexdigest()
+
+def _claude_request(api_key: str, prompt: str, data: Dict[str, Any]) -> tuple[dict, dict]:
+    """Headers and payload of a messages request"""
+    
     # Prepare the complete prompt with data
     full_prompt = f"""
 Eres un analista de negocio experto especializado en panaderías peruanas. Analiza los siguientes datos de negocio y proporciona insights útiles y accionables.
@@ -85,19 +160,86 @@ Responde en español con insights específicos, recomendaciones prácticas y obs
             }
         ]
     }
+    return headers, payload
+
+async def _request_claude(api_key: str, prompt: str, data: Dict[str, Any]) -> tuple[str, bool]:
+    """Send one messages request; returns (text, success)"""
     
+    headers, payload = _claude_request(api_key, prompt, data)
+    start = time.perf_counter()
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(CLAUDE_API_URL, headers=headers, json=payload)
+        response = await get_claude_client().post(CLAUDE_API_URL, headers=headers, json=payload)
+        
+        if response.status_code == 200:
+            result = response.json()
+            text, ok = result["content"][0]["text"], True
+        else:
+            text, ok = f"Error API Claude: {response.status_code} - {response.text}", False
             
-            if response.status_code == 200:
-                result = response.json()
-                return result["content"][0]["text"]
-            else:
-                return f"Error API Claude: {response.status_code} - {response.text}"
-                
     except Exception as e:
-        return f"Error conexión Claude API: {str(e)}"
+        text, ok = f"Error conexión Claude API: {str(e)}", False
+    
+    observe_ai_call("claude", "messages", time.perf_counter() - start, ok)
+    return text, ok
+
+async def stream_claude_api(prompt: str, data: Dict[str, Any]) -> AsyncIterator[str]:
+    """Yield Claude's answer in chunks as it is generated
+
+    Cached answers are yielded whole; a completed stream is cached like
+    call_claude_api. Errors are yielded as text, as call_claude_api returns them.
+    """
+    
+    api_key = get_claude_api_key()
+    if not api_key:
+        yield "Claude API key no configurada. Agrega CLAUDE_API_KEY como variable de entorno."
+        return
+    
+    key = _claude_cache_key(prompt, data)
+    cached = claude_response_cache.get(key)
+    if cached is None:
+        cached = await run_in_threadpool(_load_claude_answer, prompt, key)
+    if cached is not None:
+        claude_response_cache.set(key, cached)
+        yield cached
+        return
+    
+    headers, payload = _claude_request(api_key, prompt, data)
+    parts = []
+    ok = False
+    start = time.perf_counter()
+    try:
+        async with get_claude_client().stream(
+            "POST", CLAUDE_API_URL, headers=headers, json={**payload, "stream": True}
+        ) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode(errors="replace")
+                yield f"Error API Claude: {response.status_code} - {body}"
+                return
+            
+            # Anthropic SSE: text arrives in content_block_delta events
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:])
+                if event.get("type") == "content_block_delta":
+                    text = event["delta"].get("text", "")
+                    parts.append(text)
+                    yield text
+                elif event.get("type") == "error":
+                    yield f"Error API Claude: {event.get('error', {}).get('message', '')}"
+                    return
+            ok = True
+    except httpx.HTTPError as e:
+        yield f"Error conexión Claude API: {str(e)}"
+    except (ValueError, KeyError, AttributeError) as e:
+        # Malformed event line (bad JSON or missing fields)
+        yield f"Error API Claude: respuesta inválida ({str(e)})"
+    finally:
+        observe_ai_call("claude", "messages_stream", time.perf_counter() - start, ok)
+    
+    if ok:
+        claude_response_cache.set(key, "".join(parts))
+        await run_in_threadpool(_save_claude_answer, prompt, key, "".join(parts))
 
 def get_business_summary_data(db: Session, days_back: int = 7) -> Dict[str, Any]:
     """Get comprehensive business data for AI analysis"""
@@ -106,53 +248,27 @@ def get_business_summary_data(db: Session, days_back: int = 7) -> Dict[str, Any]
     start_date = datetime.now() - timedelta(days=days_back)
     
     # 1. Sales summary
-    sales_movements = db.query(models.Movimiento).filter(
-        models.Movimiento.tipo == "venta",
-        models.Movimiento.fecha >= start_date
-    ).all()
-    
-    total_sales = sum(mov.Cantidad * mov.Precio for mov in sales_movements)
-    total_transactions = len(sales_movements)
+    total_sales, total_transactions, _ = aggregations.sales_totals(db, start_date)
     
-    # 2. Top products by sales
-    product_sales = {}
-    for mov in sales_movements:
-        if mov.producto_id not in product_sales:
-            product_sales[mov.producto_id] = {"quantity": 0, "revenue": 0}
-        product_sales[mov.producto_id]["quantity"] += mov.Cantidad
-        product_sales[mov.producto_id]["revenue"] += mov.Cantidad * mov.Precio
-    
-    # Get product names
-    productos = db.query(models.Producto).all()
-    productos_map = {p.idProductos: {"nombre": p.Nombre, "precio": p.Precio, "stock": p.Stock, "categoria": p.Categoria} for p in productos}
-    
-    # Add product names to sales data
-    for prod_id, sales_data in product_sales.items():
-        if prod_id in productos_map:
-            sales_data["nombre"] = productos_map[prod_id]["nombre"]
-            sales_data["categoria"] = productos_map[prod_id]["categoria"]
-    
-    # Top 10 products by revenue
-    top_products = sorted(product_sales.items(), key=lambda x: x[1]["revenue"], reverse=True)[:10]
+    # 2. Top 10 products by revenue (names joined in SQL)
+    top_products = aggregations.product_sales(db, start_date, limit=10)
+    total_productos = db.query(func.count(models.Producto.idProductos)).scalar()
     
     # 3. Performance by sede
-    sedes = db.query(models.Sede).all()
-    sedes_map = {s.idSedes: s.Nombre for s in sedes}
-    
-    sede_performance = {}
-    for mov in sales_movements:
-        if mov.sede_id not in sede_performance:
-            sede_performance[mov.sede_id] = {"revenue": 0, "transactions": 0}
-        sede_performance[mov.sede_id]["revenue"] += mov.Cantidad * mov.Precio
-        sede_performance[mov.sede_id]["transactions"] += 1
-    
-    # Add sede names
-    for sede_id, perf_data in sede_performance.items():
-        if sede_id in sedes_map:
-            perf_data["nombre"] = sedes_map[sede_id]
+    sedes_map = dict(db.query(models.Sede.idSedes, models.Sede.Nombre).all())
+    sede_performance = aggregations.sede_sales(db, start_date)
+    # Same order as before: sedes by their first sale in the window
+    order = aggregations.first_sale_order(db, [row[0] for row in sede_performance], start_date)
+    sede_performance.sort(key=lambda row: order.index(row[0]))
     
     # 4. Low stock products with sede information
-    low_stock_products = db.query(models.Producto).filter(models.Producto.Stock < 10).all()
+    low_stock_products = db.query(
+        models.Producto.Nombre,
+        models.Producto.Stock,
+        models.Producto.Categoria,
+        models.Producto.Precio,
+        models.Producto.Sede_id
+    ).filter(models.Producto.Stock < 10).all()
     low_stock_info = []
     for p in low_stock_products:
         sede_name = sedes_map.get(p.Sede_id, f"Sede {p.Sede_id}")
@@ -173,12 +289,7 @@ def get_business_summary_data(db: Session, days_back: int = 7) -> Dict[str, Any]
     avg_humidity = sum(h.Humedad for h in recent_humidity) / len(recent_humidity) if recent_humidity else 0
     
     # 6. Movement patterns
-    movement_types = {}
-    all_movements = db.query(models.Movimiento).filter(models.Movimiento.fecha >= start_date).all()
-    for mov in all_movements:
-        if mov.tipo not in movement_types:
-            movement_types[mov.tipo] = 0
-        movement_types[mov.tipo] += 1
+    movement_types = aggregations.movement_type_counts(db, start_date)
     
     return {
         "periodo_analisis": f"Últimos {days_back} días",
@@ -190,20 +301,20 @@ def get_business_summary_data(db: Session, days_back: int = 7) -> Dict[str, Any]
         "productos_top": [
             {
                 "producto_id": prod_id,
-                "nombre": data.get("nombre", f"Producto {prod_id}"),
-                "categoria": data.get("categoria", "Sin categoría"),
-                "cantidad_vendida": round(data["quantity"], 2),
-                "ingresos": f"S/. {data['revenue']:,.2f}"
-            } for prod_id, data in top_products
+                "nombre": nombre if nombre is not None else f"Producto {prod_id}",
+                "categoria": categoria if categoria is not None else "Sin categoría",
+                "cantidad_vendida": round(quantity, 2),
+                "ingresos": f"S/. {revenue:,.2f}"
+            } for prod_id, nombre, categoria, quantity, revenue in top_products
         ],
         "performance_sedes": [
             {
                 "sede_id": sede_id,
-                "nombre": data.get("nombre", f"Sede {sede_id}"),
-                "ingresos": f"S/. {data['revenue']:,.2f}",
-                "transacciones": data["transactions"],
-                "ingreso_promedio": f"S/. {data['revenue'] / data['transactions'] if data['transactions'] > 0 else 0:,.2f}"
-            } for sede_id, data in sede_performance.items()
+                "nombre": nombre if nombre is not None else f"Sede {sede_id}",
+                "ingresos": f"S/. {revenue:,.2f}",
+                "transacciones": transactions,
+                "ingreso_promedio": f"S/. {revenue / transactions if transactions > 0 else 0:,.2f}"
+            } for sede_id, nombre, revenue, transactions in sede_performance
         ],
         "productos_stock_bajo": low_stock_info,
         "condiciones_ambientales": {
@@ -213,20 +324,84 @@ def get_business_summary_data(db: Session, days_back: int = 7) -> Dict[str, Any]
             "lecturas_humedad": len(recent_humidity)
         },
         "tipos_movimiento": movement_types,
-        "total_productos": len(productos),
-        "total_sedes": len(sedes)
+        "total_productos": total_productos,
+        "total_sedes": len(sedes_map)
     }
 
-@router.get("/business-insights")
-async def get_business_insights(days: int = 7, db: Session = Depends(get_db)):
-    """Get AI-powered business insights"""
+def get_product_data(db: Session, product_id: int, days: int = 30) -> Optional[Dict[str, Any]]:
+    """Product info, its 50 latest movements and period totals (None if missing)"""
+    product = db.query(models.Producto).filter(models.Producto.idProductos == product_id).first()
+    if not product:
+        return None
     
-    try:
-        # Get business data
-        business_data = get_business_summary_data(db, days)
-        
-        # Prepare AI prompt
-        prompt = """
+    # Get the 50 most recent product movements; period totals come from the rollup
+    start_date = datetime.now() - timedelta(days=days)
+    movements = db.query(models.Movimiento).filter(
+        models.Movimiento.producto_id == product_id,
+        models.Movimiento.fecha >= start_date
+    ).order_by(desc(models.Movimiento.fecha)).limit(50).all()
+    
+    ingresos_ventas, _, ventas_cantidad = aggregations.sales_totals(db, start_date, producto_id=product_id)
+    total_movimientos = sum(aggregations.movement_type_counts(db, start_date, producto_id=product_id).values())
+    
+    return {
+        "producto": {
+            "id": product.idProductos,
+            "nombre": product.Nombre,
+            "precio": product.Precio,
+            "stock_actual": product.Stock,
+            "categoria": product.Categoria,
+            "descripcion": product.Descripcion
+        },
+        "movimientos_recientes": [
+            {
+                "tipo": mov.tipo,
+                "cantidad": mov.Cantidad,
+                "precio": mov.Precio,
+                "fecha": mov.fecha.isoformat(),
+                "sede_id": mov.sede_id
+            } for mov in movements  # Last 50 movements
+        ],
+        "resumen_periodo": {
+            "total_movimientos": total_movimientos,
+            "ventas_cantidad": ventas_cantidad,
+            "ingresos_ventas": ingresos_ventas
+        }
+    }
+
+def get_daily_data(db: Session) -> Dict[str, Any]:
+    """Today's sales, activity by tipo and business size"""
+    today = datetime.now().date()
+    today_start = datetime.combine(today, datetime.min.time())
+    
+    # Today's totals (whole day, served from the daily rollup)
+    total_revenue, transactions, total_items_sold = aggregations.sales_totals(db, today_start)
+    movement_types = aggregations.movement_type_counts(db, today_start)
+    
+    # Get product and sede counts for context
+    productos_count = db.query(func.count(models.Producto.idProductos)).scalar()
+    sedes_count = db.query(func.count(models.Sede.idSedes)).scalar()
+    
+    return {
+        "fecha": today.isoformat(),
+        "resumen_ventas": {
+            "ingresos_totales": round(total_revenue, 2),
+            "productos_vendidos": round(total_items_sold, 2),
+            "transacciones": transactions
+        },
+        "actividad_por_tipo": {
+            mov_type: movement_types.get(mov_type, 0)
+            for mov_type in ["venta", "reabastecimiento", "ajuste", "agregado", "entrada"]
+        },
+        "productos_activos": productos_count,
+        "sedes_operando": sedes_count
+    }
+
+# The endpoints below are async (they await Claude), so their queries go
+# through database.run_db instead of blocking the event loop
+
+# Shared by /business-insights and its streaming variant
+BUSINESS_INSIGHTS_PROMPT = """
         Analiza estos datos de panadería y proporciona:
         
         1. INSIGHTS PRINCIPALES (3-4 puntos clave sobre el rendimiento)
@@ -241,9 +416,17 @@ async def get_business_insights(days: int = 7, db: Session = Depends(get_db)):
         
         Enfócate en aspectos prácticos como gestión de inventario, rendimiento por ubicación, productos populares, y condiciones de almacenamiento.
         """
+
+@router.get("/business-insights")
+async def get_business_insights(days: int = 7, db=Depends(database.get_read_db)):
+    """Get AI-powered business insights"""
+    
+    try:
+        # Get business data
+        business_data = await database.run_db(db, get_business_summary_data, days)
         
         # Call Claude API
-        ai_response = await call_claude_api(prompt, business_data)
+        ai_response = await call_claude_api(BUSINESS_INSIGHTS_PROMPT, business_data)
         
         # Fix currency to soles
         ai_response = fix_currency_to_soles(ai_response)
@@ -258,52 +441,49 @@ async def get_business_insights(days: int = 7, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando insights: {str(e)}")
 
+@router.get("/business-insights/stream")
+async def stream_business_insights(days: int = 7, db=Depends(database.get_read_db)):
+    """Business insights as Server-Sent Events
+
+    Events: "data" (the business data), "token" ({"text"}) while Claude
+    writes, then "done" with the full insights.
+    """
+    
+    try:
+        business_data = await database.run_db(db, get_business_summary_data, days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando insights: {str(e)}")
+    
+    async def events():
+        yield sse_event("data", business_data)
+        rewriter = StreamRewriter(fix_currency_to_soles)
+        async for chunk in stream_claude_api(BUSINESS_INSIGHTS_PROMPT, business_data):
+            text = rewriter.feed(chunk)
+            if text:
+                yield sse_event("token", {"text": text})
+        text = rewriter.flush()
+        if text:
+            yield sse_event("token", {"text": text})
+        yield sse_event("done", {
+            "success": True,
+            "ai_insights": rewriter.text(),
+            "generated_at": datetime.now().isoformat()
+        })
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.get("/product-analysis/{product_id}")
-async def get_product_analysis(product_id: int, days: int = 30, db: Session = Depends(get_db)):
+async def get_product_analysis(product_id: int, days: int = 30, db=Depends(database.get_read_db)):
     """Get AI analysis for a specific product"""
     
     try:
-        # Get product info
-        product = db.query(models.Producto).filter(models.Producto.idProductos == product_id).first()
-        if not product:
+        product_data = await database.run_db(db, get_product_data, product_id, days)
+        if product_data is None:
             raise HTTPException(status_code=404, detail="Producto no encontrado")
         
-        # Get product movements
-        start_date = datetime.now() - timedelta(days=days)
-        movements = db.query(models.Movimiento).filter(
-            models.Movimiento.producto_id == product_id,
-            models.Movimiento.fecha >= start_date
-        ).order_by(desc(models.Movimiento.fecha)).all()
-        
-        # Prepare product data
-        product_data = {
-            "producto": {
-                "id": product.idProductos,
-                "nombre": product.Nombre,
-                "precio": product.Precio,
-                "stock_actual": product.Stock,
-                "categoria": product.Categoria,
-                "descripcion": product.Descripcion
-            },
-            "movimientos_recientes": [
-                {
-                    "tipo": mov.tipo,
-                    "cantidad": mov.Cantidad,
-                    "precio": mov.Precio,
-                    "fecha": mov.fecha.isoformat(),
-                    "sede_id": mov.sede_id
-                } for mov in movements[:50]  # Last 50 movements
-            ],
-            "resumen_periodo": {
-                "total_movimientos": len(movements),
-                "ventas_cantidad": sum(mov.Cantidad for mov in movements if mov.tipo == "venta"),
-                "ingresos_ventas": sum(mov.Cantidad * mov.Precio for mov in movements if mov.tipo == "venta")
-            }
-        }
-        
         # AI prompt for product analysis
         prompt = f"""
-        Analiza el rendimiento del producto "{product.Nombre}" y proporciona:
+        Analiza el rendimiento del producto "{product_data['producto']['nombre']}" y proporciona:
         
         1. ANÁLISIS DE VENTAS (tendencias, velocidad de rotación)
         2. GESTIÓN DE INVENTARIO (recomendaciones de stock)
@@ -328,42 +508,12 @@ async def get_product_analysis(product_id: int, days: int = 30, db: Session = De
         raise HTTPException(status_code=500, detail=f"Error en análisis de producto: {str(e)}")
 
 @router.get("/daily-summary")
-async def get_daily_summary(db: Session = Depends(get_db)):
+async def get_daily_summary(db=Depends(database.get_read_db)):
     """Get AI-powered daily business summary"""
     
     try:
         # Get today's data
-        today = datetime.now().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        
-        # Today's movements
-        today_movements = db.query(models.Movimiento).filter(
-            models.Movimiento.fecha >= today_start
-        ).all()
-        
-        # Sales summary
-        today_sales = [mov for mov in today_movements if mov.tipo == "venta"]
-        total_revenue = sum(mov.Cantidad * mov.Precio for mov in today_sales)
-        total_items_sold = sum(mov.Cantidad for mov in today_sales)
-        
-        # Get product and sede names for context
-        productos = db.query(models.Producto).all()
-        sedes = db.query(models.Sede).all()
-        
-        daily_data = {
-            "fecha": today.isoformat(),
-            "resumen_ventas": {
-                "ingresos_totales": round(total_revenue, 2),
-                "productos_vendidos": round(total_items_sold, 2),
-                "transacciones": len(today_sales)
-            },
-            "actividad_por_tipo": {
-                mov_type: len([m for m in today_movements if m.tipo == mov_type])
-                for mov_type in ["venta", "reabastecimiento", "ajuste", "agregado", "entrada"]
-            },
-            "productos_activos": len(productos),
-            "sedes_operando": len(sedes)
-        }
+        daily_data = await database.run_db(db, get_daily_data)
         
         prompt = """
         Genera un resumen ejecutivo del día actual enfocándose en:
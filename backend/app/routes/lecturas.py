@@ -0,0 +1,185 @@
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Type
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .. import database, models, sensor_rollups
+from ..database import get_db
+from ..metrics import sensor_readings_ingested
+from ..pagination import paginate
+from ..scope import sensor_scope
+from ..sensor_rollups import parse_range, series_response
+
+# Generic sensor-reading engine. Each metric (temperatura, humedad, ...) is
+# a table with an id, a float value column, Sensor_id and fecha; mounting a
+# SensorMetric gives it the full CRUD + batch + time-range router and
+# registers it for rollup compaction. New metrics need a model, two
+# schemas and a mount() call instead of a copied routes file.
+
+@dataclass
+class SensorMetric:
+    name: str  # URL prefix and LecturasAgregadas.metrica, e.g. "temperatura"
+    model: Type[models.Base]
+    value_field: str  # Value column on the model and in the schemas
+    id_field: str
+    list_key: str  # Key of the listing in GET responses, e.g. "temperatures"
+    create_schema: Type[BaseModel]
+    update_schema: Type[BaseModel]
+    tag: str
+    label: str  # Spanish noun for messages, e.g. "temperatura"
+
+def _parse_fecha(value: Optional[str]) -> Optional[datetime]:
+    # ESP32 sends fecha already in Lima time; unparsable values use the default
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+def mount(metric: SensorMetric) -> APIRouter:
+    """Build the router for a metric and register it for compaction"""
+    model = metric.model
+    value_col = getattr(model, metric.value_field)
+    id_col = getattr(model, metric.id_field)
+    sensor_rollups.METRICS[metric.name] = (model, value_col)
+    no_encontrada = f"Lectura de {metric.label} no encontrada"
+
+    router = APIRouter(prefix=f"/{metric.name}", tags=[metric.tag])
+
+    @router.post("/", name=f"crear_lectura_{metric.name}")
+    def crear_lectura(lectura: metric.create_schema, db: Session = Depends(get_db)):
+        data = lectura.dict()
+        nueva = model(**{metric.value_field: data[metric.value_field], "Sensor_id": data["Sensor_id"]})
+        fecha = _parse_fecha(data.get("fecha"))
+        if fecha:
+            nueva.fecha = fecha
+        db.add(nueva)
+        db.commit()
+        db.refresh(nueva)
+        sensor_readings_ingested.inc(metric.name, str(nueva.Sensor_id))
+        return nueva
+
+    @router.post("/batch", name=f"crear_lecturas_{metric.name}_batch")
+    def crear_lecturas_batch(lecturas: list[metric.create_schema], db: Session = Depends(get_db)):
+        """Insert many readings (any mix of sensors) in one executemany and one commit"""
+        if not lecturas:
+            return {"inserted": 0}
+        rows = [
+            {
+                metric.value_field: getattr(lectura, metric.value_field),
+                "Sensor_id": lectura.Sensor_id,
+                # Every row must carry the same keys for a single executemany
+                "fecha": _parse_fecha(lectura.fecha) or models.get_lima_time()
+            }
+            for lectura in lecturas
+        ]
+        db.execute(insert(model), rows)
+        db.commit()
+        for sensor_id, count in Counter(row["Sensor_id"] for row in rows).items():
+            sensor_readings_ingested.inc(metric.name, str(sensor_id), amount=count)
+        return {"inserted": len(rows)}
+
+    def listar(
+        db: Session,
+        user_id: Optional[int],
+        sensor_id: Optional[int],
+        limit: int,
+        offset: int,
+        cursor: Optional[str],
+        include_total: Optional[bool],
+        desde: Optional[str],
+        hasta: Optional[str],
+        horas: int,
+        bucket: Optional[str],
+        resolution: Optional[str],
+        puntos: Optional[int]
+    ) -> dict:
+        scope = sensor_scope(db, user_id, sensor_id)
+
+        # Bucketed aggregates for charts: desde/hasta (or the last `horas`),
+        # bucket=5m|1h|auto or resolution=auto|1m|1h|1d, puntos= caps with LTTB
+        if resolution != "raw" and (resolution or bucket or desde or hasta or puntos):
+            return series_response(db, metric.name, scope, desde, hasta, horas, bucket, resolution, puntos)
+
+        query = db.query(model)
+        if scope is not None:
+            query = query.filter(model.Sensor_id.in_(scope))
+        if resolution == "raw" and (desde or hasta):
+            start, end = parse_range(desde, hasta, horas)
+            query = query.filter(model.fecha >= start, model.fecha < end)
+
+        # Newest first; pass next_cursor back as cursor for constant-time deep pages
+        page = paginate(
+            query,
+            model.fecha,
+            id_col,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            include_total=include_total
+        )
+        return {
+            metric.list_key: page["items"],
+            "total": page["total"],
+            "limit": limit,
+            "offset": offset,
+            "has_more": page["has_more"],
+            "next_cursor": page["next_cursor"]
+        }
+
+    @router.get("/", name=f"obtener_lecturas_{metric.name}")
+    async def obtener_lecturas(
+        user_id: int = None,
+        sensor_id: int = None,
+        limit: int = 50,
+        offset: int = 0,
+        cursor: str = None,
+        include_total: bool = None,
+        desde: str = None,
+        hasta: str = None,
+        horas: int = 24,
+        bucket: str = None,
+        resolution: str = None,
+        puntos: int = None,
+        db=Depends(database.get_read_db)
+    ):
+        # Chart reads go through run_db: async engine when DB_ASYNC is on
+        return await database.run_db(
+            db, listar, user_id, sensor_id, limit, offset, cursor, include_total,
+            desde, hasta, horas, bucket, resolution, puntos
+        )
+
+    @router.get("/{lectura_id}", name=f"obtener_lectura_{metric.name}")
+    def obtener_lectura(lectura_id: int, db: Session = Depends(get_db)):
+        lectura = db.query(model).filter(id_col == lectura_id).first()
+        if not lectura:
+            raise HTTPException(status_code=404, detail=no_encontrada)
+        return lectura
+
+    @router.put("/{lectura_id}", name=f"actualizar_lectura_{metric.name}")
+    def actualizar_lectura(lectura_id: int, datos: metric.update_schema, db: Session = Depends(get_db)):
+        lectura = db.query(model).filter(id_col == lectura_id).first()
+        if not lectura:
+            raise HTTPException(status_code=404, detail=no_encontrada)
+        for key, value in datos.dict(exclude_unset=True).items():
+            setattr(lectura, key, value)
+        db.commit()
+        db.refresh(lectura)
+        return lectura
+
+    @router.delete("/{lectura_id}", name=f"eliminar_lectura_{metric.name}")
+    def eliminar_lectura(lectura_id: int, db: Session = Depends(get_db)):
+        lectura = db.query(model).filter(id_col == lectura_id).first()
+        if not lectura:
+            raise HTTPException(status_code=404, detail=no_encontrada)
+        db.delete(lectura)
+        db.commit()
+        return {"message": f"Lectura de {metric.label} eliminada correctamente"}
+
+    return router
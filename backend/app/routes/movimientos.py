@@ -1,29 +1,114 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from .. import database, models, schemas
+from sqlalchemy import insert
+from datetime import datetime
+import json
+from .. import models, schemas
+from ..database import get_db
+from ..cache import invalidate_business_data
+from ..stock import apply_movement, apply_movements
+from ..rollups import add_movements, remove_movements, movement_row
+from ..pagination import paginate
+from ..scope import user_sede_ids
 
-router = APIRouter(prefix="/movimientos", tags=["Movimientos"])
+# Rows per transaction for /movimientos/bulk
+BULK_CHUNK_SIZE = 1000
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+router = APIRouter(prefix="/movimientos", tags=["Movimientos"])
 
 @router.post("/")
 def crear_movimiento(mov: schemas.MovimientoCreate, db: Session = Depends(get_db)):
     nuevo = models.Movimiento(**mov.dict())
     db.add(nuevo)
+    db.flush()  # assigns the default fecha needed for the daily rollup
+    # Stock and the daily rollup move in the same transaction as the ledger row
+    apply_movement(db, nuevo.producto_id, nuevo.tipo, nuevo.Cantidad)
+    add_movements(db, [movement_row(nuevo)])
     db.commit()
+    invalidate_business_data()
     db.refresh(nuevo)
     return nuevo
 
+def _insert_movimientos(db: Session, rows: list[dict]) -> None:
+    """Insert one chunk of movements in a single transaction"""
+    db.execute(insert(models.Movimiento), rows)
+    apply_movements(db, rows)
+    add_movements(db, rows)
+    db.commit()
+    invalidate_business_data()
+
+def _bulk_row(obj: dict) -> dict:
+    mov = schemas.MovimientoBulk(**obj)
+    row = mov.dict(exclude={"fecha"})
+    row["fecha"] = datetime.fromisoformat(mov.fecha) if mov.fecha else models.get_lima_time()
+    return row
+
+async def _iter_bulk_body(request: Request):
+    """Yield movement objects from an NDJSON stream or a JSON array body"""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+        if buffer.strip():
+            yield json.loads(buffer)
+    else:
+        body = await request.json()
+        if not isinstance(body, list):
+            raise ValueError("Se esperaba un arreglo JSON de movimientos")
+        for obj in body:
+            yield obj
+
+@router.post("/bulk")
+async def importar_movimientos(request: Request, db: Session = Depends(get_db)):
+    """Bulk import movements from NDJSON (streamed) or a JSON array
+
+    Rows are validated and inserted in chunks of BULK_CHUNK_SIZE, each in
+    its own transaction. Optional "fecha" (ISO 8601) allows historical data.
+    On a bad row the chunks already committed are kept and the error
+    reports how many rows were inserted.
+    """
+    inserted = 0
+    chunks = 0
+    rows = []
+    line = 0
+    
+    try:
+        async for obj in _iter_bulk_body(request):
+            line += 1
+            rows.append(_bulk_row(obj))
+            if len(rows) >= BULK_CHUNK_SIZE:
+                await run_in_threadpool(_insert_movimientos, db, rows)
+                inserted += len(rows)
+                chunks += 1
+                rows = []
+        
+        if rows:
+            await run_in_threadpool(_insert_movimientos, db, rows)
+            inserted += len(rows)
+            chunks += 1
+    except (ValueError, ValidationError) as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail=f"Movimiento {line} inválido ({inserted} insertados): {str(e)}"
+        )
+    
+    return {"inserted": inserted, "chunks": chunks}
+
 @router.get("/")
 def listar_movimientos(
     user_id: int = None, 
     limit: int = 50, 
     offset: int = 0,
+    cursor: str = None,
+    include_total: bool = None,
     db: Session = Depends(get_db)
 ):
     query = db.query(models.Movimiento)
@@ -31,28 +116,33 @@ def listar_movimientos(
     # If user_id is provided, filter by user's assigned sedes
     if user_id:
         # Get user's assigned sedes
-        user_sedes = db.query(models.UsuarioSede).filter(models.UsuarioSede.usuario_id == user_id).all()
-        sede_ids = [us.sede_id for us in user_sedes]
+        sede_ids = user_sede_ids(db, user_id)
         
         if sede_ids:
             query = query.filter(models.Movimiento.sede_id.in_(sede_ids))
         else:
             # User has no assigned sedes, return empty list
-            return {"movements": [], "total": 0, "has_more": False}
-    
-    # Count total for pagination info
-    total_count = query.count()
+            return {"movements": [], "total": 0, "has_more": False, "next_cursor": None}
     
-    # Order by most recent first and apply pagination
-    movements = query.order_by(models.Movimiento.fecha.desc()).offset(offset).limit(limit).all()
+    # Newest first; pass next_cursor back as cursor for constant-time deep pages
+    page = paginate(
+        query,
+        models.Movimiento.fecha,
+        models.Movimiento.idMovimientos,
+        limit=limit,
+        offset=offset,
+        cursor=cursor,
+        include_total=include_total
+    )
     
     # Return paginated response
     return {
-        "movements": movements,
-        "total": total_count,
+        "movements": page["items"],
+        "total": page["total"],
         "limit": limit,
         "offset": offset,
-        "has_more": (offset + limit) < total_count
+        "has_more": page["has_more"],
+        "next_cursor": page["next_cursor"]
     }
 
 @router.put("/{movimiento_id}")
@@ -61,10 +151,16 @@ def actualizar_movimiento(movimiento_id: int, datos: schemas.MovimientoCreate, d
     if not movimiento:
         raise HTTPException(status_code=404, detail="Movimiento no encontrado")
     
+    # Undo the old effect on stock and rollup, then apply the edited movement
+    apply_movement(db, movimiento.producto_id, movimiento.tipo, movimiento.Cantidad, reverse=True)
+    remove_movements(db, [movement_row(movimiento)])
     for key, value in datos.dict().items():
         setattr(movimiento, key, value)
+    apply_movement(db, movimiento.producto_id, movimiento.tipo, movimiento.Cantidad)
+    add_movements(db, [movement_row(movimiento)])
     
     db.commit()
+    invalidate_business_data()
     db.refresh(movimiento)
     return movimiento
 
@@ -74,6 +170,9 @@ def eliminar_movimiento(movimiento_id: int, db: Session = Depends(get_db)):
     if not movimiento:
         raise HTTPException(status_code=404, detail="Movimiento no encontrado")
     
+    apply_movement(db, movimiento.producto_id, movimiento.tipo, movimiento.Cantidad, reverse=True)
+    remove_movements(db, [movement_row(movimiento)])
     db.delete(movimiento)
     db.commit()
+    invalidate_business_data()
     return {"message": "Movimiento eliminado"}
\ No newline at end of file
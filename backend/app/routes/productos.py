@@ -1,21 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from .. import database, models, schemas
+from .. import models, schemas
+from ..database import get_db
+from ..cache import invalidate_business_data
+from ..stock import reconcile_stock
+from ..scope import user_sede_ids
 
 router = APIRouter(prefix="/productos", tags=["Productos"])
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/")
 def crear_producto(producto: schemas.ProductoCreate, db: Session = Depends(get_db)):
     nuevo = models.Producto(**producto.dict())
+    nuevo.Stock_Inicial = nuevo.Stock
     db.add(nuevo)
     db.commit()
+    invalidate_business_data()
     db.refresh(nuevo)
     return nuevo
 
@@ -31,8 +30,7 @@ def listar_productos(
     # If user_id is provided, filter by user's assigned sedes
     if user_id:
         # Get user's assigned sedes
-        user_sedes = db.query(models.UsuarioSede).filter(models.UsuarioSede.usuario_id == user_id).all()
-        sede_ids = [us.sede_id for us in user_sedes]
+        sede_ids = user_sede_ids(db, user_id)
         
         if sede_ids:
             query = query.filter(models.Producto.Sede_id.in_(sede_ids))
@@ -55,16 +53,28 @@ def listar_productos(
         "has_more": (offset + limit) < total_count
     }
 
+@router.post("/reconciliar-stock")
+def reconciliar_stock(aplicar: bool = False, db: Session = Depends(get_db)):
+    """Audit Stock against the movement ledger; aplicar=true fixes differences"""
+    resultado = reconcile_stock(db, apply=aplicar)
+    if aplicar:
+        invalidate_business_data()
+    return resultado
+
 @router.put("/{producto_id}")
 def actualizar_producto(producto_id: int, datos: schemas.ProductoCreate, db: Session = Depends(get_db)):
     producto = db.query(models.Producto).filter(models.Producto.idProductos == producto_id).first()
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
+    # A manual stock edit moves the ledger base so reconciliation keeps it
+    stock_anterior = producto.Stock or 0
     for key, value in datos.dict().items():
         setattr(producto, key, value)
+    producto.Stock_Inicial = (producto.Stock_Inicial or 0) + (datos.Stock - stock_anterior)
     
     db.commit()
+    invalidate_business_data()
     db.refresh(producto)
     return producto
 
@@ -76,4 +86,5 @@ def eliminar_producto(producto_id: int, db: Session = Depends(get_db)):
     
     db.delete(producto)
     db.commit()
+    invalidate_business_data()
     return {"message": "Producto eliminado"}
\ No newline at end of file
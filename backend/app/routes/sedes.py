@@ -1,21 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from .. import database, models, schemas
+from .. import models, schemas
+from ..database import get_db
+from ..cache import invalidate_user_scope
 
 router = APIRouter(prefix="/sedes", tags=["Sedes"])
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/")
 def crear_sede(sede: schemas.SedeCreate, db: Session = Depends(get_db)):
     nueva = models.Sede(**sede.dict())
     db.add(nueva)
     db.commit()
+    invalidate_user_scope()
     db.refresh(nueva)
     return nueva
 
@@ -33,6 +29,7 @@ def actualizar_sede(sede_id: int, datos: schemas.SedeCreate, db: Session = Depen
         setattr(sede, key, value)
     
     db.commit()
+    invalidate_user_scope()
     db.refresh(sede)
     return sede
 
@@ -44,4 +41,5 @@ def eliminar_sede(sede_id: int, db: Session = Depends(get_db)):
     
     db.delete(sede)
     db.commit()
+    invalidate_user_scope()
     return {"message": "Sede eliminada"}
\ No newline at end of file
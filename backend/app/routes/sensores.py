@@ -1,21 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from .. import database, models, schemas
+from .. import models, schemas
+from ..database import get_db
+from ..cache import invalidate_user_scope
+from ..scope import user_sensor_ids
 
 router = APIRouter(prefix="/sensores", tags=["Sensores"])
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/")
 def crear_sensor(sensor: schemas.SensorCreate, db: Session = Depends(get_db)):
     nuevo = models.Sensor(**sensor.dict())
     db.add(nuevo)
     db.commit()
+    invalidate_user_scope()
     db.refresh(nuevo)
     return nuevo
 
@@ -23,9 +20,8 @@ def crear_sensor(sensor: schemas.SensorCreate, db: Session = Depends(get_db)):
 def obtener_sensores(user_id: int = None, db: Session = Depends(get_db)):
     if user_id:
         # Filtrar sensores por sedes del usuario
-        user_sedes = db.query(models.UsuarioSede).filter(models.UsuarioSede.usuario_id == user_id).all()
-        sede_ids = [us.sede_id for us in user_sedes]
-        sensores = db.query(models.Sensor).filter(models.Sensor.sede_id.in_(sede_ids)).all()
+        sensor_ids = user_sensor_ids(db, user_id)
+        sensores = db.query(models.Sensor).filter(models.Sensor.idSensores.in_(sensor_ids)).all()
     else:
         sensores = db.query(models.Sensor).all()
     return sensores
@@ -47,6 +43,7 @@ def actualizar_sensor(sensor_id: int, sensor: schemas.SensorUpdate, db: Session
         setattr(db_sensor, key, value)
     
     db.commit()
+    invalidate_user_scope()
     db.refresh(db_sensor)
     return db_sensor
 
@@ -58,4 +55,5 @@ def eliminar_sensor(sensor_id: int, db: Session = Depends(get_db)):
     
     db.delete(sensor)
     db.commit()
+    invalidate_user_scope()
     return {"message": "Sensor eliminado correctamente"}
\ No newline at end of file
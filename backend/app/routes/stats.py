@@ -0,0 +1,145 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import datetime, timedelta
+from typing import Optional
+
+from .. import answer_cache, database, models, aggregations
+from ..cache import business_context_cache, claude_response_cache, scope_cache
+from ..scope import user_sede_ids
+
+router = APIRouter(prefix="/stats", tags=["Estadísticas"])
+
+def _user_sede_ids(db: Session, user_id: Optional[int]) -> Optional[list[int]]:
+    """Sede scope for a user: None means no filtering (no user_id given)"""
+    if not user_id:
+        return None
+    return user_sede_ids(db, user_id)
+
+def _today_range() -> tuple[datetime, datetime]:
+    """Start/end of today in Lima, naive like the stored fecha values"""
+    today_start = models.get_lima_time().replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    return today_start, today_start + timedelta(days=1)
+
+def _stats_today(db: Session, user_id: Optional[int]) -> dict:
+    sede_ids = _user_sede_ids(db, user_id)
+    start, end = _today_range()
+
+    revenue, transactions, quantity = aggregations.sales_totals(db, start, end, sede_ids)
+
+    low_stock = db.query(func.count(models.Producto.idProductos)).filter(models.Producto.Stock < 10)
+    if sede_ids is not None:
+        low_stock = low_stock.filter(models.Producto.Sede_id.in_(sede_ids))
+
+    # Average of the 10 most recent temperature readings
+    recent_temps = db.query(models.Temperatura.Temperatura)
+    if sede_ids is not None:
+        recent_temps = recent_temps.join(
+            models.Sensor, models.Sensor.idSensores == models.Temperatura.Sensor_id
+        ).filter(models.Sensor.sede_id.in_(sede_ids))
+    recent_temps = recent_temps.order_by(models.Temperatura.fecha.desc()).limit(10).all()
+    avg_temp = sum(t for (t,) in recent_temps) / len(recent_temps) if recent_temps else None
+
+    return {
+        "fecha": start.date().isoformat(),
+        "ventas_total": round(revenue, 2),
+        "transacciones": transactions,
+        "productos_vendidos": round(quantity, 2),
+        "stock_bajo": low_stock.scalar(),
+        "temperatura_promedio": round(avg_temp, 1) if avg_temp is not None else None,
+        "lecturas_temperatura": len(recent_temps)
+    }
+
+def _stats_top_products(db: Session, user_id: Optional[int], limit: int) -> list:
+    sede_ids = _user_sede_ids(db, user_id)
+    start, end = _today_range()
+    rows = aggregations.product_sede_sales(db, start, limit=limit, end_date=end, sede_ids=sede_ids)
+    return [
+        {
+            "producto_id": producto_id,
+            "nombre": nombre if nombre is not None else f"Producto {producto_id}",
+            "sede_id": sede_id,
+            "sede_nombre": sede_nombre if sede_nombre is not None else f"Sede {sede_id}",
+            "cantidad": round(quantity, 2),
+            "ingresos": round(revenue, 2)
+        } for producto_id, nombre, sede_id, sede_nombre, quantity, revenue in rows
+    ]
+
+def _stats_sede_performance(db: Session, user_id: Optional[int], days: Optional[int], limit: int) -> list:
+    sede_ids = _user_sede_ids(db, user_id)
+    start = datetime.now() - timedelta(days=days) if days else None
+    rows = aggregations.sede_sales(db, start, sede_ids=sede_ids)
+    rows = sorted(rows, key=lambda r: r[2], reverse=True)[:limit]
+    return [
+        {
+            "sede_id": sede_id,
+            "nombre": nombre if nombre is not None else f"Sede {sede_id}",
+            "ingresos": round(revenue, 2),
+            "transacciones": transactions
+        } for sede_id, nombre, revenue, transactions in rows
+    ]
+
+def _stats_recent_activity(db: Session, user_id: Optional[int], limit: int) -> list:
+    sede_ids = _user_sede_ids(db, user_id)
+    query = db.query(
+        models.Movimiento.idMovimientos,
+        models.Movimiento.tipo,
+        models.Movimiento.Cantidad,
+        models.Movimiento.fecha,
+        models.Movimiento.producto_id,
+        models.Producto.Nombre,
+        models.Movimiento.sede_id,
+        models.Sede.Nombre
+    ).outerjoin(
+        models.Producto, models.Producto.idProductos == models.Movimiento.producto_id
+    ).outerjoin(
+        models.Sede, models.Sede.idSedes == models.Movimiento.sede_id
+    )
+    if sede_ids is not None:
+        query = query.filter(models.Movimiento.sede_id.in_(sede_ids))
+    rows = query.order_by(models.Movimiento.fecha.desc(), models.Movimiento.idMovimientos.desc()).limit(limit).all()
+    return [
+        {
+            "idMovimientos": mov_id,
+            "tipo": tipo,
+            "Cantidad": cantidad,
+            "fecha": fecha,
+            "producto_id": producto_id,
+            "producto_nombre": producto_nombre if producto_nombre is not None else f"Producto {producto_id}",
+            "sede_id": sede_id,
+            "sede_nombre": sede_nombre if sede_nombre is not None else f"Sede {sede_id}"
+        } for mov_id, tipo, cantidad, fecha, producto_id, producto_nombre, sede_id, sede_nombre in rows
+    ]
+
+# Dashboard endpoints poll often, so they read through run_db (async engine
+# when DB_ASYNC is on) instead of holding a worker thread each
+
+@router.get("/today")
+async def stats_today(user_id: int = None, db=Depends(database.get_read_db)):
+    """Dashboard KPIs for today: sales, units sold, low stock and temperature"""
+    return await database.run_db(db, _stats_today, user_id)
+
+@router.get("/top-products")
+async def stats_top_products(user_id: int = None, limit: int = 5, db=Depends(database.get_read_db)):
+    """Today's best sellers by units, per product and sede"""
+    return await database.run_db(db, _stats_top_products, user_id, limit)
+
+@router.get("/sede-performance")
+async def stats_sede_performance(user_id: int = None, days: int = None, limit: int = 5, db=Depends(database.get_read_db)):
+    """Sales revenue per sede, best first; days=None covers all history"""
+    return await database.run_db(db, _stats_sede_performance, user_id, days, limit)
+
+@router.get("/recent-activity")
+async def stats_recent_activity(user_id: int = None, limit: int = 5, db=Depends(database.get_read_db)):
+    """Latest movements with product and sede names already resolved"""
+    return await database.run_db(db, _stats_recent_activity, user_id, limit)
+
+@router.get("/cache")
+def stats_cache(db: Session = Depends(database.get_db)):
+    """Hit rates of the in-process caches and size of the answer cache"""
+    return {
+        "scope": scope_cache.stats(),
+        "business_context": business_context_cache.stats(),
+        "claude_response": claude_response_cache.stats(),
+        "answer_cache": answer_cache.stats(db)
+    }
@@ -1,17 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from .. import database, models, schemas
+from .. import models, schemas
+from ..database import get_db
+from ..cache import invalidate_user_scope
 import hashlib
 
 router = APIRouter(prefix="/usuarios", tags=["Usuarios"])
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def hash_password(password: str) -> str:
     """Simple password hashing using SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -20,6 +15,27 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return hash_password(plain_password) == hashed_password
 
+def sede_ids_by_user(db: Session, user_ids: list[int]) -> dict[int, list[int]]:
+    """Assigned sede ids for many users with a single query"""
+    result = {user_id: [] for user_id in user_ids}
+    if not user_ids:
+        return result
+    rows = db.query(models.UsuarioSede.usuario_id, models.UsuarioSede.sede_id).filter(
+        models.UsuarioSede.usuario_id.in_(user_ids)
+    ).order_by(models.UsuarioSede.id).all()
+    for usuario_id, sede_id in rows:
+        result[usuario_id].append(sede_id)
+    return result
+
+def usuario_response(usuario: models.Usuario, sede_ids: list[int]) -> dict:
+    # Users are returned without password
+    return {
+        "idUsuarios": usuario.idUsuarios,
+        "username": usuario.username,
+        "rol": usuario.rol,
+        "sede_ids": sede_ids
+    }
+
 @router.post("/")
 def crear_usuario(usuario: schemas.UsuarioCreate, db: Session = Depends(get_db)):
     # Check if username already exists
@@ -47,36 +63,18 @@ def crear_usuario(usuario: schemas.UsuarioCreate, db: Session = Depends(get_db))
             )
             db.add(usuario_sede)
         db.commit()
+        invalidate_user_scope(nuevo_usuario.idUsuarios)
     
     # Get assigned sedes
-    user_sedes = db.query(models.UsuarioSede).filter(models.UsuarioSede.usuario_id == nuevo_usuario.idUsuarios).all()
-    sede_ids = [us.sede_id for us in user_sedes]
-    
-    # Return user without password
-    return {
-        "idUsuarios": nuevo_usuario.idUsuarios,
-        "username": nuevo_usuario.username,
-        "rol": nuevo_usuario.rol,
-        "sede_ids": sede_ids
-    }
+    sede_ids = sede_ids_by_user(db, [nuevo_usuario.idUsuarios])[nuevo_usuario.idUsuarios]
+    return usuario_response(nuevo_usuario, sede_ids)
 
 @router.get("/")
 def listar_usuarios(db: Session = Depends(get_db)):
     usuarios = db.query(models.Usuario).all()
-    # Return users without passwords but with their assigned sedes
-    result = []
-    for usuario in usuarios:
-        user_sedes = db.query(models.UsuarioSede).filter(models.UsuarioSede.usuario_id == usuario.idUsuarios).all()
-        sede_ids = [us.sede_id for us in user_sedes]
-        
-        result.append({
-            "idUsuarios": usuario.idUsuarios,
-            "username": usuario.username,
-            "rol": usuario.rol,
-            "sede_ids": sede_ids
-        })
-    
-    return result
+    # Two queries in total, whatever the number of users
+    sedes = sede_ids_by_user(db, [usuario.idUsuarios for usuario in usuarios])
+    return [usuario_response(usuario, sedes[usuario.idUsuarios]) for usuario in usuarios]
 
 @router.get("/{usuario_id}")
 def obtener_usuario(usuario_id: int, db: Session = Depends(get_db)):
@@ -84,16 +82,7 @@ def obtener_usuario(usuario_id: int, db: Session = Depends(get_db)):
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    # Get assigned sedes
-    user_sedes = db.query(models.UsuarioSede).filter(models.UsuarioSede.usuario_id == usuario_id).all()
-    sede_ids = [us.sede_id for us in user_sedes]
-    
-    return {
-        "idUsuarios": usuario.idUsuarios,
-        "username": usuario.username,
-        "rol": usuario.rol,
-        "sede_ids": sede_ids
-    }
+    return usuario_response(usuario, sede_ids_by_user(db, [usuario_id])[usuario_id])
 
 @router.put("/{usuario_id}")
 def actualizar_usuario(usuario_id: int, datos: schemas.UsuarioUpdate, db: Session = Depends(get_db)):
@@ -126,18 +115,11 @@ def actualizar_usuario(usuario_id: int, datos: schemas.UsuarioUpdate, db: Sessio
             db.add(usuario_sede)
     
     db.commit()
+    invalidate_user_scope(usuario_id)
     db.refresh(usuario)
     
     # Get updated assigned sedes
-    user_sedes = db.query(models.UsuarioSede).filter(models.UsuarioSede.usuario_id == usuario_id).all()
-    sede_ids = [us.sede_id for us in user_sedes]
-    
-    return {
-        "idUsuarios": usuario.idUsuarios,
-        "username": usuario.username,
-        "rol": usuario.rol,
-        "sede_ids": sede_ids
-    }
+    return usuario_response(usuario, sede_ids_by_user(db, [usuario_id])[usuario_id])
 
 @router.delete("/{usuario_id}")
 def eliminar_usuario(usuario_id: int, db: Session = Depends(get_db)):
@@ -147,6 +129,7 @@ def eliminar_usuario(usuario_id: int, db: Session = Depends(get_db)):
     
     db.delete(usuario)
     db.commit()
+    invalidate_user_scope(usuario_id)
     return {"message": "Usuario eliminado"}
 
 @router.post("/login")
@@ -156,20 +139,17 @@ def login_usuario(login_data: schemas.UsuarioLogin, db: Session = Depends(get_db
     if not usuario or usuario.password != login_data.password:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
     
-    # Get user's assigned sedes with sede names
-    user_sedes = db.query(models.UsuarioSede).filter(models.UsuarioSede.usuario_id == usuario.idUsuarios).all()
-    sede_ids = [us.sede_id for us in user_sedes]
-    
-    # Get sede names
-    sedes_info = []
-    if sede_ids:
-        sedes = db.query(models.Sede).filter(models.Sede.idSedes.in_(sede_ids)).all()
-        sedes_info = [{"idSedes": sede.idSedes, "Nombre": sede.Nombre} for sede in sedes]
-    
-    return {
-        "idUsuarios": usuario.idUsuarios,
-        "username": usuario.username,
-        "rol": usuario.rol,
-        "sede_ids": sede_ids,
-        "sedes": sedes_info
-    }
\ No newline at end of file
+    # Assigned sede ids and names in one joined query
+    rows = db.query(models.UsuarioSede.sede_id, models.Sede.Nombre).outerjoin(
+        models.Sede, models.Sede.idSedes == models.UsuarioSede.sede_id
+    ).filter(models.UsuarioSede.usuario_id == usuario.idUsuarios).order_by(models.UsuarioSede.id).all()
+    
+    response = usuario_response(usuario, [sede_id for sede_id, _ in rows])
+    # Sedes that no longer exist keep their id but are left out of "sedes"
+    seen = set()
+    response["sedes"] = []
+    for sede_id, nombre in rows:
+        if nombre is not None and sede_id not in seen:
+            seen.add(sede_id)
+            response["sedes"].append({"idSedes": sede_id, "Nombre": nombre})
+    return response
\ No newline at end of file
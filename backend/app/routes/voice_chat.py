@@ -1,34 +1,211 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, func
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Dict, Any, Optional
+import importlib.util
 import json
+import multiprocessing
 import os
-import tempfile
 import time
 import re
-from openai import OpenAI
+import asyncio
+import httpx
+from openai import AsyncOpenAI
 
-from .. import database, models
+from .. import answer_cache, database, intents, local_stt, models
+from ..audio import audio_duration, file_size
+from ..database import get_db
+from ..cache import business_context_cache
+from ..config import Config
+from ..intents import time_ago
+from ..metrics import track_ai_call
 from ..routes.ai_analytics import get_business_summary_data
+from ..streaming import SSE_HEADERS, StreamRewriter, sse_event
 
 router = APIRouter(prefix="/voice", tags=["Voice Chat"])
 
-def get_db():
-    db = database.SessionLocal()
+# OpenAI configuration
+# One async client (and connection pool) per process, created on first use
+_openai_client: Optional[AsyncOpenAI] = None
+_openai_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_openai_client() -> AsyncOpenAI:
+    """Get the shared async OpenAI client with API key from environment"""
+    global _openai_client
+    if _openai_client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise HTTPException(status_code=500, detail="OpenAI API key no configurada")
+        _openai_client = AsyncOpenAI(
+            api_key=api_key,
+            timeout=Config.OPENAI_TIMEOUT,
+            max_retries=Config.OPENAI_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                timeout=Config.OPENAI_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=Config.OPENAI_MAX_CONCURRENCY,
+                    max_keepalive_connections=Config.OPENAI_MAX_CONCURRENCY
+                )
+            )
+        )
+    return _openai_client
+
+def get_openai_semaphore() -> asyncio.Semaphore:
+    """Limit concurrent Whisper/GPT calls per worker"""
+    global _openai_semaphore
+    if _openai_semaphore is None:
+        _openai_semaphore = asyncio.Semaphore(Config.OPENAI_MAX_CONCURRENCY)
+    return _openai_semaphore
+
+async def close_openai_client():
+    """Close the shared OpenAI client on application shutdown"""
+    global _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
+# Speech-to-text backends, picked by STT_BACKEND. "openai" sends the clip to
+# whisper-1; "local" runs a quantized Whisper on this machine's CPU so sites
+# with poor connectivity keep transcribing. Latency is exported per backend
+# as ai_call_duration_seconds{service=<backend>}.
+class TranscriptionBackend(ABC):
+    name = ""
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def transcribe(self, audio: BinaryIO, filename: str, content_type: str) -> str:
+        """Spanish text of the clip in audio"""
+
+class OpenAITranscription(TranscriptionBackend):
+    name = "openai"
+
+    async def transcribe(self, audio: BinaryIO, filename: str, content_type: str) -> str:
+        client = get_openai_client()
+        async with get_openai_semaphore():
+            transcript = await client.audio.transcriptions.create(
+                model="whisper-1",
+                file=(filename, audio, content_type),
+                language="es"  # Spanish
+            )
+        return transcript.text
+
+class LocalTranscription(TranscriptionBackend):
+    name = "local"
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def start(self) -> None:
+        # Spawned workers (not forked from the running event loop) that load
+        # the model once; wait for one so the first query doesn't pay for it
+        if self._pool is None:
+            try:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=Config.LOCAL_STT_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=local_stt.load_model,
+                    initargs=(Config.LOCAL_STT_MODEL, Config.LOCAL_STT_COMPUTE_TYPE, Config.LOCAL_STT_THREADS)
+                )
+                await asyncio.get_running_loop().run_in_executor(self._pool, local_stt.ready)
+            except LOCAL_STT_ERRORS:
+                # load_model failed in the worker (model not downloaded, bad name...)
+                self._drop_pool()
+                raise
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await asyncio.to_thread(self._pool.shutdown, wait=True, cancel_futures=True)
+            self._pool = None
+
+    def _drop_pool(self) -> None:
+        """Forget a broken pool so the next start() spawns a fresh one"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def transcribe(self, audio: BinaryIO, filename: str, content_type: str) -> str:
+        await self.start()
+        # The upload may be spooled to disk: read it off the event loop
+        data = await asyncio.to_thread(audio.read)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool, local_stt.transcribe, data, "es"
+            )
+        except BrokenProcessPool:
+            self._drop_pool()
+            raise
+
+# A worker that died (initializer error, crash) breaks the whole pool;
+# OSError covers failing to spawn the workers at all
+LOCAL_STT_ERRORS = (BrokenProcessPool, OSError)
+
+_transcription_backend: Optional[TranscriptionBackend] = None
+
+def get_transcription_backend() -> TranscriptionBackend:
+    """Backend selected by STT_BACKEND; local falls back to OpenAI without faster-whisper"""
+    global _transcription_backend
+    if _transcription_backend is None:
+        if Config.STT_BACKEND == "local":
+            if importlib.util.find_spec("faster_whisper") is not None:
+                _transcription_backend = LocalTranscription()
+            else:
+                print("STT_BACKEND=local desactivado, falta faster-whisper; se usa OpenAI")
+        if _transcription_backend is None:
+            _transcription_backend = OpenAITranscription()
+    return _transcription_backend
+
+async def fall_back_to_openai(error: Exception) -> TranscriptionBackend:
+    """Replace a failed local backend with OpenAI for the rest of the process"""
+    global _transcription_backend
+    print(f"STT local no disponible ({error!r}); se usa OpenAI")
+    if _transcription_backend is not None:
+        await _transcription_backend.close()
+    _transcription_backend = OpenAITranscription()
+    return _transcription_backend
+
+async def transcribe_with_fallback(audio: BinaryIO, filename: str, content_type: str) -> tuple[str, str]:
+    """Transcribe with the current backend: (text, backend name)
+
+    If the local model can't run, the clip is retried with OpenAI and
+    OpenAI serves every later request too.
+    """
+    backend = get_transcription_backend()
     try:
-        yield db
-    finally:
-        db.close()
+        with track_ai_call(backend.name, "transcription"):
+            return await backend.transcribe(audio, filename, content_type), backend.name
+    except LOCAL_STT_ERRORS as e:
+        if not isinstance(backend, LocalTranscription):
+            raise
+        backend = await fall_back_to_openai(e)
+    audio.seek(0)
+    with track_ai_call(backend.name, "transcription"):
+        return await backend.transcribe(audio, filename, content_type), backend.name
 
-# OpenAI configuration
-def get_openai_client():
-    """Get OpenAI client with API key from environment"""
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="OpenAI API key no configurada")
-    return OpenAI(api_key=api_key)
+async def start_transcription_backend():
+    """Load the local model at startup instead of on the first voice query"""
+    backend = get_transcription_backend()
+    try:
+        await backend.start()
+    except LOCAL_STT_ERRORS as e:
+        if not isinstance(backend, LocalTranscription):
+            raise
+        await fall_back_to_openai(e)
+
+async def close_transcription_backend():
+    global _transcription_backend
+    if _transcription_backend is not None:
+        await _transcription_backend.close()
+        _transcription_backend = None
 
 def fix_currency_to_soles(text: str) -> str:
     """Convert any dollar symbols to Peruvian soles"""
@@ -82,8 +259,8 @@ PRODUCTOS CON STOCK BAJO (menos de 10 unidades):
 {', '.join([f"{p['nombre']}: {p['stock_actual']} unidades en {p.get('sede_nombre', 'Sede no especificada')}" for p in low_stock_with_sede]) if low_stock_with_sede else "Todos los productos tienen stock adecuado"}
 
 CONDICIONES AMBIENTALES ACTUALES:
-- Temperatura: {f"{recent_temp.Temperatura:.1f}°C (hace {_get_time_ago(recent_temp.fecha)})" if recent_temp else "Sin datos de temperatura"}
-- Humedad: {f"{recent_humidity.Humedad:.1f}% (hace {_get_time_ago(recent_humidity.fecha)})" if recent_humidity else "Sin datos de humedad"}
+- Temperatura: {f"{recent_temp.Temperatura:.1f}°C (hace {time_ago(recent_temp.fecha)})" if recent_temp else "Sin datos de temperatura"}
+- Humedad: {f"{recent_humidity.Humedad:.1f}% (hace {time_ago(recent_humidity.fecha)})" if recent_humidity else "Sin datos de humedad"}
 
 SEDES OPERATIVAS: {business_data['total_sedes']}
 PRODUCTOS TOTALES: {business_data['total_productos']}
@@ -97,24 +274,53 @@ RENDIMIENTO POR SEDE:
     
     return context
 
-def _get_time_ago(date_time: datetime) -> str:
-    """Helper function to get human-readable time difference"""
-    if not date_time:
-        return "fecha desconocida"
-    
-    now = datetime.now(date_time.tzinfo) if date_time.tzinfo else datetime.now()
-    diff = now - date_time
-    
-    if diff.days > 0:
-        return f"{diff.days} día{'s' if diff.days > 1 else ''}"
-    elif diff.seconds > 3600:
-        hours = diff.seconds // 3600
-        return f"{hours} hora{'s' if hours > 1 else ''}"
-    elif diff.seconds > 60:
-        minutes = diff.seconds // 60
-        return f"{minutes} minuto{'s' if minutes > 1 else ''}"
+def get_database_context(db: Session, user_id: int, days_back: int = 7) -> tuple[str, Dict[str, Any]]:
+    """Cached build_database_context; returns (context, cache metadata)
+
+    Entries expire after CONTEXT_CACHE_TTL and are dropped whenever
+    movements or products are written, so consecutive questions in a
+    session reuse one context without serving stale numbers.
+    """
+    key = (days_back, user_id)
+    cached = business_context_cache.lookup(key)
+    if cached is not None:
+        context, age = cached
+        hit = True
     else:
-        return "ahora mismo"
+        context = build_database_context(db, user_id)
+        business_context_cache.set(key, context)
+        age = 0.0
+        hit = False
+    
+    stats = business_context_cache.stats()
+    return context, {
+        "hit": hit,
+        "age_seconds": round(age, 1),
+        "hits": stats["hits"],
+        "misses": stats["misses"]
+    }
+
+def quick_answer(db: Session, query: str, query_type: str, user_id: int) -> tuple[Optional[tuple[str, str, str]], Optional[str]]:
+    """Answer without calling the LLM when possible
+
+    Returns ((response, query_type, served_by) or None, huella): templated
+    questions are answered by intents.py, repeated ones from answer_cache.
+    huella is the data fingerprint a new LLM answer is stored under (None
+    when the answer cache is off or an intent answered).
+    """
+    if Config.VOICE_FAST_PATH:
+        matched = intents.answer(db, query)
+        if matched is not None:
+            intent, response = matched
+            return (response, intent.query_type, f"intent:{intent.name}"), None
+    if Config.ANSWER_CACHE_MAX_ENTRIES <= 0:
+        return None, None
+    huella = answer_cache.data_fingerprint(db, query_type, user_id)
+    cached = answer_cache.lookup(db, "voz", query, huella)
+    if cached is not None:
+        response, cached_type = cached
+        return (response, cached_type or query_type, "cache"), huella
+    return None, huella
 
 def classify_query_type(query: str) -> str:
     """Classify the type of query for analytics"""
@@ -133,59 +339,112 @@ def classify_query_type(query: str) -> str:
     else:
         return "general"
 
+# Database steps of the async endpoints, run through database.run_db so
+# they never block the event loop
+
+def user_exists(db: Session, user_id: int) -> bool:
+    return db.query(models.Usuario.idUsuarios).filter(models.Usuario.idUsuarios == user_id).first() is not None
+
+def open_chat_session(db: Session, user_id: int, session_id: Optional[int]) -> int:
+    """Id of the user's active session session_id, or of a new one"""
+    if session_id:
+        chat_session_id = db.query(models.ChatSession.idChatSession).filter(
+            models.ChatSession.idChatSession == session_id,
+            models.ChatSession.Usuario_id == user_id,
+            models.ChatSession.session_active == True
+        ).scalar()
+        if chat_session_id:
+            return chat_session_id
+    
+    chat_session = models.ChatSession(
+        Usuario_id=user_id,
+        session_start=datetime.now(),
+        total_queries=0,
+        session_active=True
+    )
+    db.add(chat_session)
+    db.commit()
+    return chat_session.idChatSession
+
+def log_voice_query(
+    db: Session,
+    chat_session_id: Optional[int],
+    user_id: int,
+    query: str,
+    ai_response: str,
+    query_type: str,
+    execution_time: int,
+    success: bool = True,
+    error_message: Optional[str] = None,
+    served_by: Optional[str] = None
+) -> None:
+    db.add(models.VoiceQuery(
+        ChatSession_id=chat_session_id,
+        Usuario_id=user_id,
+        audio_transcription=query,  # In this case, it's already transcribed
+        user_query=query,
+        ai_response=ai_response,
+        query_type=query_type,
+        execution_time_ms=execution_time,
+        success=success,
+        error_message=error_message,
+        served_by=served_by
+    ))
+    if success and chat_session_id:
+        db.query(models.ChatSession).filter(
+            models.ChatSession.idChatSession == chat_session_id
+        ).update(
+            {models.ChatSession.total_queries: models.ChatSession.total_queries + 1},
+            synchronize_session=False
+        )
+    db.commit()
+
 @router.post("/transcribe")
 async def transcribe_audio(
     audio_file: UploadFile = File(...),
     user_id: int = Form(...),
-    db: Session = Depends(get_db)
+    db=Depends(database.get_read_db)
 ):
-    """Transcribe audio to Spanish text using Whisper API"""
+    """Transcribe audio to Spanish text with the configured Whisper backend"""
     
     start_time = time.time()
     
     try:
         # Validate user
-        user = db.query(models.Usuario).filter(models.Usuario.idUsuarios == user_id).first()
-        if not user:
+        if not await database.run_db(db, user_exists, user_id):
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
         # Validate audio file
         if not audio_file.content_type.startswith('audio/'):
             raise HTTPException(status_code=400, detail="Archivo debe ser de audio")
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-            content = await audio_file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        # Starlette already buffers the upload (in memory for short clips,
+        # spooled past 1 MB); hand that file to the client as-is, it is
+        # streamed in chunks instead of copied to another temp file
+        size = audio_file.size if audio_file.size is not None else file_size(audio_file.file)
+        if size > Config.VOICE_MAX_UPLOAD_MB * 1024 * 1024:
+            raise HTTPException(status_code=413, detail=f"Audio supera el máximo de {Config.VOICE_MAX_UPLOAD_MB:g} MB")
         
-        try:
-            # Initialize OpenAI client
-            client = get_openai_client()
-            
-            # Transcribe audio using Whisper
-            with open(temp_file_path, 'rb') as audio_data:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_data,
-                    language="es"  # Spanish
-                )
-            
-            transcribed_text = transcript.text
-            execution_time = int((time.time() - start_time) * 1000)
-            
-            return {
-                "success": True,
-                "transcription": transcribed_text,
-                "language": "es",
-                "execution_time_ms": execution_time,
-                "audio_duration": len(content) // 16000,  # Approximate duration estimation
-            }
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
+        duration = await asyncio.to_thread(audio_duration, audio_file.file)
+        
+        # Transcribe with the configured backend (OpenAI Whisper or local model)
+        transcribed_text, backend_name = await transcribe_with_fallback(
+            audio_file.file, audio_file.filename or "audio.webm", audio_file.content_type
+        )
+        
+        execution_time = int((time.time() - start_time) * 1000)
+        
+        return {
+            "success": True,
+            "transcription": transcribed_text,
+            "language": "es",
+            "backend": backend_name,
+            "execution_time_ms": execution_time,
+            "audio_duration": duration,  # Seconds, from the container header
+        }
             
+    except HTTPException:
+        raise
     except Exception as e:
         execution_time = int((time.time() - start_time) * 1000)
         return {
@@ -194,53 +453,10 @@ async def transcribe_audio(
             "execution_time_ms": execution_time
         }
 
-@router.post("/query")
-async def process_voice_query(
-    query: str = Form(...),
-    user_id: int = Form(...),
-    session_id: Optional[int] = Form(None),
-    db: Session = Depends(get_db)
-):
-    """Process transcribed text query and generate intelligent response"""
+def build_voice_prompt(context: str, query: str, query_type: str) -> tuple[str, str]:
+    """System prompt and user message for a voice query"""
     
-    start_time = time.time()
-    query_type = classify_query_type(query)
-    
-    try:
-        # Validate user
-        user = db.query(models.Usuario).filter(models.Usuario.idUsuarios == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        
-        # Get or create chat session
-        if session_id:
-            chat_session = db.query(models.ChatSession).filter(
-                models.ChatSession.idChatSession == session_id,
-                models.ChatSession.Usuario_id == user_id,
-                models.ChatSession.session_active == True
-            ).first()
-        else:
-            chat_session = None
-        
-        if not chat_session:
-            chat_session = models.ChatSession(
-                Usuario_id=user_id,
-                session_start=datetime.now(),
-                total_queries=0,
-                session_active=True
-            )
-            db.add(chat_session)
-            db.commit()
-            db.refresh(chat_session)
-        
-        # Build database context
-        context = build_database_context(db, user_id)
-        
-        # Initialize OpenAI client
-        client = get_openai_client()
-        
-        # Create comprehensive prompt
-        system_prompt = f"""
+    system_prompt = f"""
 Eres un asistente inteligente especializado en gestión de panaderías peruanas. Tu trabajo es responder preguntas sobre el negocio usando los datos proporcionados.
 
 CONTEXTO DE LA BASE DE DATOS:
@@ -275,22 +491,75 @@ TIPOS DE CONSULTAS QUE PUEDES MANEJAR:
 
 Responde en español de manera natural y conversacional.
 """
+    
+    # Enhance query for inventory questions
+    enhanced_query = query
+    if query_type == "inventory" and any(word in query.lower() for word in ['stock', 'inventario', 'poco stock', 'low stock']):
+        enhanced_query = f"{query} - Recuerda incluir la sede (ubicación) para cada producto con stock bajo."
+    
+    return system_prompt, enhanced_query
+
+@router.post("/query")
+async def process_voice_query(
+    query: str = Form(...),
+    user_id: int = Form(...),
+    session_id: Optional[int] = Form(None),
+    db=Depends(database.get_read_db)
+):
+    """Process transcribed text query and generate intelligent response"""
+    
+    start_time = time.time()
+    query_type = classify_query_type(query)
+    
+    try:
+        # Validate user
+        if not await database.run_db(db, user_exists, user_id):
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        
+        # Get or create chat session
+        chat_session_id = await database.run_db(db, open_chat_session, user_id, session_id)
+        
+        # Templated questions are answered from SQL and repeated ones from
+        # the answer cache, without an LLM call
+        quick, huella = await database.run_db(db, quick_answer, query, query_type, user_id)
+        if quick is not None:
+            ai_response, query_type, served_by = quick
+            execution_time = int((time.time() - start_time) * 1000)
+            await database.run_db(
+                db, log_voice_query, chat_session_id, user_id, query, ai_response,
+                query_type, execution_time, success=True, served_by=served_by
+            )
+            return {
+                "success": True,
+                "query": query,
+                "response": ai_response,
+                "query_type": query_type,
+                "session_id": chat_session_id,
+                "execution_time_ms": execution_time,
+                "served_by": served_by
+            }
         
-        # Enhance query for inventory questions
-        enhanced_query = query
-        if query_type == "inventory" and any(word in query.lower() for word in ['stock', 'inventario', 'poco stock', 'low stock']):
-            enhanced_query = f"{query} - Recuerda incluir la sede (ubicación) para cada producto con stock bajo."
+        # Build database context (cached per user for a short TTL)
+        context, context_cache = await database.run_db(db, get_database_context, user_id)
+        
+        # Initialize OpenAI client
+        client = get_openai_client()
+        
+        # Create comprehensive prompt
+        system_prompt, enhanced_query = build_voice_prompt(context, query, query_type)
         
         # Generate AI response
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": enhanced_query}
-            ],
-            max_tokens=300,
-            temperature=0.7
-        )
+        async with get_openai_semaphore():
+            with track_ai_call("openai", "chat"):
+                response = await client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": enhanced_query}
+                    ],
+                    max_tokens=300,
+                    temperature=0.7
+                )
         
         ai_response = response.choices[0].message.content
         
@@ -299,30 +568,23 @@ Responde en español de manera natural y conversacional.
         
         execution_time = int((time.time() - start_time) * 1000)
         
-        # Log the voice query
-        voice_query = models.VoiceQuery(
-            ChatSession_id=chat_session.idChatSession,
-            Usuario_id=user_id,
-            audio_transcription=query,  # In this case, it's already transcribed
-            user_query=query,
-            ai_response=ai_response,
-            query_type=query_type,
-            execution_time_ms=execution_time,
-            success=True
+        # Log the voice query and count it on the chat session
+        await database.run_db(
+            db, log_voice_query, chat_session_id, user_id, query, ai_response,
+            query_type, execution_time, success=True, served_by="llm"
         )
-        db.add(voice_query)
-        
-        # Update chat session
-        chat_session.total_queries += 1
-        db.commit()
+        if huella:
+            await database.run_db(db, answer_cache.store, "voz", query, huella, ai_response, query_type)
         
         return {
             "success": True,
             "query": query,
             "response": ai_response,
             "query_type": query_type,
-            "session_id": chat_session.idChatSession,
-            "execution_time_ms": execution_time
+            "session_id": chat_session_id,
+            "execution_time_ms": execution_time,
+            "served_by": "llm",
+            "context_cache": context_cache
         }
         
     except Exception as e:
@@ -330,30 +592,146 @@ Responde en español de manera natural y conversacional.
         
         # Log failed query
         try:
-            voice_query = models.VoiceQuery(
-                ChatSession_id=session_id,
-                Usuario_id=user_id,
-                audio_transcription=query,
-                user_query=query,
-                ai_response="",
-                query_type=query_type,
-                execution_time_ms=execution_time,
-                success=False,
-                error_message=str(e)
+            await database.run_db(
+                db, log_voice_query, session_id, user_id, query, "",
+                query_type, execution_time, success=False, error_message=str(e), served_by="llm"
             )
-            db.add(voice_query)
-            db.commit()
         except:
             pass  # Don't fail on logging failure
         
         raise HTTPException(status_code=500, detail=f"Error procesando consulta: {str(e)}")
 
+@router.post("/query/stream")
+async def stream_voice_query(
+    query: str = Form(...),
+    user_id: int = Form(...),
+    session_id: Optional[int] = Form(None),
+    db=Depends(database.get_read_db)
+):
+    """Same as /query, sent as Server-Sent Events while the model writes
+
+    Events: "meta" (session and query type), "token" ({"text"}) for each
+    chunk, then "done" with the full response or "error". The VoiceQuery
+    row is saved once the stream completes.
+    """
+    
+    start_time = time.time()
+    query_type = classify_query_type(query)
+    
+    # Validation and context happen before the stream opens, so errors
+    # here are regular HTTP responses
+    if not await database.run_db(db, user_exists, user_id):
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    chat_session_id = await database.run_db(db, open_chat_session, user_id, session_id)
+    
+    quick, huella = await database.run_db(db, quick_answer, query, query_type, user_id)
+    if quick is not None:
+        ai_response, query_type, served_by = quick
+        execution_time = int((time.time() - start_time) * 1000)
+        await database.run_db(
+            db, log_voice_query, chat_session_id, user_id, query, ai_response,
+            query_type, execution_time, success=True, served_by=served_by
+        )
+        
+        async def fast_events():
+            yield sse_event("meta", {
+                "query": query,
+                "query_type": query_type,
+                "session_id": chat_session_id,
+                "served_by": served_by
+            })
+            yield sse_event("token", {"text": ai_response})
+            yield sse_event("done", {
+                "success": True,
+                "response": ai_response,
+                "execution_time_ms": execution_time,
+                "first_token_ms": execution_time
+            })
+        
+        return StreamingResponse(fast_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+    
+    context, context_cache = await database.run_db(db, get_database_context, user_id)
+    system_prompt, enhanced_query = build_voice_prompt(context, query, query_type)
+    client = get_openai_client()
+    
+    async def events():
+        yield sse_event("meta", {
+            "query": query,
+            "query_type": query_type,
+            "session_id": chat_session_id,
+            "served_by": "llm",
+            "context_cache": context_cache
+        })
+        rewriter = StreamRewriter(fix_currency_to_soles)
+        first_token_ms = None
+        try:
+            async with get_openai_semaphore():
+                with track_ai_call("openai", "chat_stream"):
+                    stream = await client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": enhanced_query}
+                        ],
+                        max_tokens=300,
+                        temperature=0.7,
+                        stream=True
+                    )
+                    async with stream:
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            text = rewriter.feed(chunk.choices[0].delta.content)
+                            if text:
+                                if first_token_ms is None:
+                                    first_token_ms = int((time.time() - start_time) * 1000)
+                                yield sse_event("token", {"text": text})
+            text = rewriter.flush()
+            if text:
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            execution_time = int((time.time() - start_time) * 1000)
+            await _run_with_session(
+                log_voice_query, chat_session_id, user_id, query, rewriter.text(), query_type,
+                execution_time, success=False, error_message=str(e), served_by="llm"
+            )
+            yield sse_event("error", {"detail": f"Error procesando consulta: {str(e)}"})
+            return
+        
+        ai_response = rewriter.text()
+        execution_time = int((time.time() - start_time) * 1000)
+        await _run_with_session(
+            log_voice_query, chat_session_id, user_id, query, ai_response, query_type,
+            execution_time, served_by="llm"
+        )
+        if huella:
+            await _run_with_session(answer_cache.store, "voz", query, huella, ai_response, query_type)
+        yield sse_event("done", {
+            "success": True,
+            "response": ai_response,
+            "execution_time_ms": execution_time,
+            "first_token_ms": first_token_ms
+        })
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def _run_with_session(fn, *args, **kwargs):
+    # The request's session is closed once the streaming response starts,
+    # so writes made after the stream get their own
+    db = database.SessionLocal()
+    try:
+        await database.run_db(db, fn, *args, **kwargs)
+    except Exception as e:
+        print(f"Error guardando consulta de voz: {e}")
+    finally:
+        db.close()
+
 @router.post("/chat")
 async def voice_chat_complete(
     audio_file: UploadFile = File(...),
     user_id: int = Form(...),
     session_id: Optional[int] = Form(None),
-    db: Session = Depends(get_db)
+    db=Depends(database.get_read_db)
 ):
     """Complete voice chat workflow: audio → transcription → AI response"""
     
@@ -377,15 +755,18 @@ async def voice_chat_complete(
             "query": transcribed_text,
             "response": query_result["response"],
             "query_type": query_result["query_type"],
+            "served_by": query_result["served_by"],
             "session_id": query_result["session_id"],
             "total_time_ms": transcription_result["execution_time_ms"] + query_result["execution_time_ms"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en chat por voz: {str(e)}")
 
 @router.get("/history/{session_id}")
-async def get_chat_history(
+def get_chat_history(
     session_id: int,
     user_id: int,
     limit: int = 20,
@@ -425,6 +806,7 @@ async def get_chat_history(
                     "query_type": q.query_type,
                     "timestamp": q.fecha.isoformat(),
                     "execution_time_ms": q.execution_time_ms,
+                    "served_by": q.served_by,
                     "success": q.success
                 } for q in reversed(queries)  # Show oldest first
             ]
@@ -436,7 +818,7 @@ async def get_chat_history(
         raise HTTPException(status_code=500, detail=f"Error obteniendo historial: {str(e)}")
 
 @router.get("/sessions/{user_id}")
-async def get_user_sessions(
+def get_user_sessions(
     user_id: int,
     active_only: bool = False,
     limit: int = 10,
@@ -470,7 +852,7 @@ async def get_user_sessions(
         raise HTTPException(status_code=500, detail=f"Error obteniendo sesiones: {str(e)}")
 
 @router.post("/sessions/{session_id}/close")
-async def close_chat_session(
+def close_chat_session(
     session_id: int,
     user_id: int,
     db: Session = Depends(get_db)
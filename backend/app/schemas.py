@@ -24,6 +24,9 @@ class MovimientoCreate(BaseModel):
     Usuario_id: int
     sede_id: int
 
+class MovimientoBulk(MovimientoCreate):
+    fecha: Optional[str] = None
+
 class UsuarioCreate(BaseModel):
     username: str
     password: str
@@ -0,0 +1,37 @@
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from . import models
+from .cache import scope_cache
+
+# Sedes and sensors a user may see, shared by every router that takes
+# user_id. Both lists come from one UsuarioSede/Sensor join and are kept in
+# scope_cache until the user, a sede or a sensor changes.
+
+def _user_scope(db: Session, user_id: int) -> dict:
+    scope = scope_cache.get(user_id)
+    if scope is None:
+        rows = db.query(models.UsuarioSede.sede_id, models.Sensor.idSensores).outerjoin(
+            models.Sensor, models.Sensor.sede_id == models.UsuarioSede.sede_id
+        ).filter(models.UsuarioSede.usuario_id == user_id).all()
+        scope = {
+            "sede_ids": sorted({sede_id for sede_id, _ in rows if sede_id is not None}),
+            "sensor_ids": sorted({sensor_id for _, sensor_id in rows if sensor_id is not None}),
+        }
+        scope_cache.set(user_id, scope)
+    return scope
+
+def user_sede_ids(db: Session, user_id: int) -> List[int]:
+    return list(_user_scope(db, user_id)["sede_ids"])
+
+def user_sensor_ids(db: Session, user_id: int) -> List[int]:
+    return list(_user_scope(db, user_id)["sensor_ids"])
+
+def sensor_scope(db: Session, user_id: Optional[int] = None, sensor_id: Optional[int] = None) -> Optional[List[int]]:
+    """Sensor ids visible for the filters, or None for every sensor"""
+    if not user_id:
+        return [sensor_id] if sensor_id else None
+    sensor_ids = user_sensor_ids(db, user_id)
+    if sensor_id:
+        return [sensor_id] if sensor_id in sensor_ids else []
+    return sensor_ids
@@ -0,0 +1,463 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import BigInteger, Integer, cast, func, literal_column
+from sqlalchemy.orm import Session
+
+from . import database, models
+from .config import Config
+
+# Downsampled sensor readings in LecturasAgregadas.
+# Raw Temperatura/Humedad rows are compacted into 1-minute buckets, those
+# into 1-hour buckets and those into 1-day buckets, each keeping
+# min/max/sum/count per Sensor_id. Once a minute is rolled up its raw rows
+# may be pruned after SENSOR_RAW_RETENTION_DAYS; 1-minute buckets are
+# pruned after SENSOR_MINUTE_RETENTION_DAYS; hours and days are kept.
+
+# metrica -> (model, value column), filled by routes.lecturas.mount()
+METRICS = {}
+
+# Finest first; each tier is built from the one before it
+RESOLUTIONS = {
+    "1m": timedelta(minutes=1),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+}
+TIERS = list(RESOLUTIONS)
+
+# resolution=auto picks the coarsest tier that still gives this many buckets
+MIN_POINTS = 48
+
+# Time-range queries: default buckets per series and the hard cap
+DEFAULT_POINTS = 300
+MAX_BUCKETS = 1000
+STANDARD_BUCKETS = [
+    15, 30, 60, 120, 300, 600, 900, 1800,
+    3600, 7200, 10800, 21600, 43200, 86400, 2 * 86400, 7 * 86400,
+]
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_EPOCH = datetime(1970, 1, 1)
+
+_SQLITE_FORMATS = {"1m": "%Y-%m-%d %H:%M:00", "1h": "%Y-%m-%d %H:00:00", "1d": "%Y-%m-%d 00:00:00"}
+_MYSQL_FORMATS = {"1m": "%Y-%m-%d %H:%i:00", "1h": "%Y-%m-%d %H:00:00", "1d": "%Y-%m-%d 00:00:00"}
+_POSTGRES_UNITS = {"1m": "minute", "1h": "hour", "1d": "day"}
+
+def _now() -> datetime:
+    # Readings are stored as naive Lima time
+    return models.get_lima_time().replace(tzinfo=None)
+
+def floor_bucket(value: datetime, resolucion: str) -> datetime:
+    if resolucion == "1d":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolucion == "1h":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(second=0, microsecond=0)
+
+def _bucket_expr(db: Session, column, resolucion: str):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return func.date_trunc(_POSTGRES_UNITS[resolucion], column)
+    if dialect == "mysql":
+        return func.date_format(column, _MYSQL_FORMATS[resolucion])
+    return func.strftime(_SQLITE_FORMATS[resolucion], column)
+
+def _as_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+def _source_rows(
+    db: Session,
+    metrica: str,
+    source: str,
+    resolucion: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    sensor_ids: Optional[List[int]] = None
+) -> List[dict]:
+    """Aggregate raw readings (source="raw") or a finer tier into resolucion buckets"""
+    if source == "raw":
+        model, value = METRICS[metrica]
+        time_col, sensor_col = model.fecha, model.Sensor_id
+        aggregates = (func.min(value), func.max(value), func.sum(value), func.count(value))
+        filters = []
+    else:
+        agg = models.LecturaAgregada
+        time_col, sensor_col = agg.bucket, agg.Sensor_id
+        aggregates = (func.min(agg.minimo), func.max(agg.maximo), func.sum(agg.suma), func.sum(agg.conteo))
+        filters = [agg.metrica == metrica, agg.resolucion == source]
+
+    bucket = _bucket_expr(db, time_col, resolucion)
+    query = db.query(bucket, sensor_col, *aggregates).filter(*filters)
+    if start is not None:
+        query = query.filter(time_col >= start)
+    if end is not None:
+        query = query.filter(time_col < end)
+    if sensor_ids is not None:
+        query = query.filter(sensor_col.in_(sensor_ids))
+
+    return [
+        {
+            "metrica": metrica,
+            "resolucion": resolucion,
+            "Sensor_id": sensor_id,
+            "bucket": _as_datetime(bucket_value),
+            "minimo": minimo,
+            "maximo": maximo,
+            "suma": suma,
+            "conteo": int(conteo or 0),
+        }
+        for bucket_value, sensor_id, minimo, maximo, suma, conteo in query.group_by(bucket, sensor_col).all()
+        if conteo
+    ]
+
+def _latest_bucket(db: Session, metrica: str, resolucion: str) -> Optional[datetime]:
+    agg = models.LecturaAgregada
+    latest = db.query(func.max(agg.bucket)).filter(
+        agg.metrica == metrica, agg.resolucion == resolucion
+    ).scalar()
+    return _as_datetime(latest) if latest is not None else None
+
+def compact_metric(db: Session, metrica: str, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Rebuild the completed buckets that may have changed, for every tier
+
+    Each tier re-reads its source from its own watermark (or from where the
+    finer tier changed) up to the start of the current bucket, then replaces
+    that window, so running it again is harmless.
+    """
+    now = now or _now()
+    agg = models.LecturaAgregada
+    written = {}
+    source, changed_from = "raw", None
+
+    for resolucion in TIERS:
+        step = RESOLUTIONS[resolucion]
+        latest = _latest_bucket(db, metrica, resolucion)
+        if latest is None:
+            start = None
+        elif source == "raw":
+            # Re-read a little history so late ESP32 uploads are picked up
+            lookback = timedelta(minutes=Config.SENSOR_COMPACTION_LOOKBACK_MINUTES)
+            start = floor_bucket(min(latest + step, now) - lookback, resolucion)
+        elif changed_from is None:
+            # Never rebuild a coarse tier from scratch: its finer source may be pruned
+            start = latest + step
+        else:
+            start = min(floor_bucket(changed_from, resolucion), latest + step)
+        end = floor_bucket(now, resolucion)
+
+        rows = _source_rows(db, metrica, source, resolucion, start, end)
+        replaced = db.query(agg).filter(agg.metrica == metrica, agg.resolucion == resolucion, agg.bucket < end)
+        if start is not None:
+            replaced = replaced.filter(agg.bucket >= start)
+        replaced.delete(synchronize_session=False)
+        if rows:
+            db.bulk_insert_mappings(agg, rows)
+        db.commit()
+
+        written[resolucion] = len(rows)
+        source, changed_from = resolucion, start
+
+    return written
+
+def apply_retention(db: Session, metrica: str, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Prune raw readings and 1-minute buckets that are old and already rolled up"""
+    now = now or _now()
+    agg = models.LecturaAgregada
+    model, _ = METRICS[metrica]
+    deleted = {"raw": 0, "1m": 0}
+
+    minute_done = _latest_bucket(db, metrica, "1m")
+    if Config.SENSOR_RAW_RETENTION_DAYS > 0 and minute_done is not None:
+        limit = min(now - timedelta(days=Config.SENSOR_RAW_RETENTION_DAYS), minute_done + RESOLUTIONS["1m"])
+        deleted["raw"] = db.query(model).filter(model.fecha < limit).delete(synchronize_session=False)
+
+    hour_done = _latest_bucket(db, metrica, "1h")
+    if Config.SENSOR_MINUTE_RETENTION_DAYS > 0 and hour_done is not None:
+        limit = min(now - timedelta(days=Config.SENSOR_MINUTE_RETENTION_DAYS), hour_done + RESOLUTIONS["1h"])
+        deleted["1m"] = db.query(agg).filter(
+            agg.metrica == metrica, agg.resolucion == "1m", agg.bucket < limit
+        ).delete(synchronize_session=False)
+
+    db.commit()
+    return deleted
+
+def run_compaction() -> Dict[str, dict]:
+    """One compaction + retention pass over every metric"""
+    db = database.SessionLocal()
+    try:
+        now = _now()
+        return {
+            metrica: {
+                "compactadas": compact_metric(db, metrica, now),
+                "eliminadas": apply_retention(db, metrica, now),
+            }
+            for metrica in METRICS
+        }
+    finally:
+        db.close()
+
+async def compaction_loop() -> None:
+    """Background task started by main.py; runs every SENSOR_COMPACTION_INTERVAL seconds"""
+    while True:
+        try:
+            await run_in_threadpool(run_compaction)
+        except Exception as e:
+            print(f"Error compactando lecturas de sensores: {e}")
+        await asyncio.sleep(Config.SENSOR_COMPACTION_INTERVAL)
+
+def pick_resolution(span: timedelta, requested: str = "auto") -> str:
+    """Validate resolution=, resolving "auto" to the coarsest adequate tier"""
+    if requested in RESOLUTIONS:
+        return requested
+    if requested != "auto":
+        raise ValueError(f"Resolución inválida: {requested}")
+    for resolucion in reversed(TIERS):
+        if span / RESOLUTIONS[resolucion] >= MIN_POINTS:
+            return resolucion
+    return TIERS[0]
+
+def parse_bucket(value: str) -> int:
+    """Bucket size in seconds from "30s", "5m", "1h", "1d" or plain seconds"""
+    match = re.fullmatch(r"\s*(\d+)\s*([smhd]?)\s*", value or "")
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Bucket inválido: {value}")
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2) or "s"]
+
+def format_bucket(seconds: int) -> str:
+    for unit in ("d", "h", "m"):
+        if seconds % _UNIT_SECONDS[unit] == 0:
+            return f"{seconds // _UNIT_SECONDS[unit]}{unit}"
+    return f"{seconds}s"
+
+def choose_bucket(span: timedelta, requested: Optional[str] = None, target: int = DEFAULT_POINTS) -> int:
+    """Bucket seconds for the span, never producing more than MAX_BUCKETS per series
+
+    Without an explicit size the smallest standard size giving at most
+    `target` buckets is used; a too-fine explicit size is coarsened.
+    """
+    if requested and requested != "auto":
+        seconds = parse_bucket(requested)
+        limit = MAX_BUCKETS
+    else:
+        seconds = 1
+        limit = max(1, min(target, MAX_BUCKETS))
+    needed = span.total_seconds() / limit
+    if seconds >= needed:
+        return seconds
+    for size in STANDARD_BUCKETS:
+        if size >= needed:
+            return size
+    return int(-(-needed // 86400)) * 86400
+
+def _epoch_expr(db: Session, column):
+    """Seconds since 1970-01-01 of a naive stored datetime, as an integer"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return cast(func.floor(func.extract("epoch", column)), BigInteger)
+    if dialect == "mysql":
+        return func.timestampdiff(literal_column("SECOND"), "1970-01-01 00:00:00", column)
+    return cast(func.strftime("%s", column), Integer)
+
+def _epoch(value: datetime) -> int:
+    return int((value - _EPOCH).total_seconds() // 1)
+
+def _bucketed(
+    db: Session,
+    metrica: str,
+    source: str,
+    seconds: int,
+    start: datetime,
+    end: datetime,
+    sensor_ids: Optional[List[int]]
+) -> List[tuple]:
+    """(bucket index, Sensor_id, min, max, sum, count) from raw rows or a stored tier"""
+    if source == "raw":
+        model, value = METRICS[metrica]
+        time_col, sensor_col = model.fecha, model.Sensor_id
+        aggregates = (func.min(value), func.max(value), func.sum(value), func.count(value))
+        filters = []
+    else:
+        agg = models.LecturaAgregada
+        time_col, sensor_col = agg.bucket, agg.Sensor_id
+        aggregates = (func.min(agg.minimo), func.max(agg.maximo), func.sum(agg.suma), func.sum(agg.conteo))
+        filters = [agg.metrica == metrica, agg.resolucion == source]
+
+    index = _epoch_expr(db, time_col) // seconds
+    query = db.query(index, sensor_col, *aggregates).filter(
+        *filters, time_col >= start, time_col < end
+    )
+    if sensor_ids is not None:
+        query = query.filter(sensor_col.in_(sensor_ids))
+    return query.group_by(index, sensor_col).all()
+
+def read_series(
+    db: Session,
+    metrica: str,
+    desde: datetime,
+    hasta: datetime,
+    seconds: int,
+    sensor_ids: Optional[List[int]] = None
+) -> tuple:
+    """Buckets of `seconds` in [desde, hasta), ordered by sensor and time
+
+    Buckets are aligned to multiples of their size, so any stored tier that
+    divides the size nests exactly: the coarsest such tier serves the range
+    it covers and raw readings fill in the part newer than its last
+    compaction. When desde is older than that tier's retention the buckets
+    are widened to the finest tier still holding it. Returns (buckets,
+    source tier used, bucket seconds).
+    """
+    tier = next(
+        (t for t in reversed(TIERS) if seconds % int(RESOLUTIONS[t].total_seconds()) == 0),
+        None
+    )
+    if not _retained(tier or "raw", desde):
+        tier = next(t for t in TIERS if _retained(t, desde))
+        step = int(RESOLUTIONS[tier].total_seconds())
+        seconds = -(-seconds // step) * step
+    desde = _EPOCH + timedelta(seconds=_epoch(desde) // seconds * seconds)
+    stored_until = desde
+    if tier is not None:
+        latest = _latest_bucket(db, metrica, tier)
+        if latest is not None:
+            stored_until = min(max(latest + RESOLUTIONS[tier], desde), hasta)
+
+    parts = []
+    if stored_until > desde:
+        parts += _bucketed(db, metrica, tier, seconds, desde, stored_until, sensor_ids)
+    if stored_until < hasta:
+        parts += _bucketed(db, metrica, "raw", seconds, stored_until, hasta, sensor_ids)
+
+    # A bucket straddling the end of the tier gets rows from both sources
+    merged: Dict[tuple, list] = {}
+    for index, sensor_id, minimo, maximo, suma, conteo in parts:
+        if not conteo:
+            continue
+        acc = merged.get((sensor_id, index))
+        if acc is None:
+            merged[(sensor_id, index)] = [minimo, maximo, suma or 0, conteo]
+        else:
+            acc[0] = min(acc[0], minimo)
+            acc[1] = max(acc[1], maximo)
+            acc[2] += suma or 0
+            acc[3] += conteo
+
+    buckets = [
+        {
+            "Sensor_id": sensor_id,
+            "bucket": _EPOCH + timedelta(seconds=int(index) * seconds),
+            "min": minimo,
+            "max": maximo,
+            "avg": round(suma / conteo, 2),
+            "count": int(conteo),
+        }
+        for (sensor_id, index), (minimo, maximo, suma, conteo) in sorted(
+            merged.items(), key=lambda item: (item[0][0] or 0, item[0][1])
+        )
+    ]
+    return buckets, tier if stored_until > desde else "raw", seconds
+
+def _retained(resolucion: str, desde: datetime) -> bool:
+    """Whether apply_retention keeps this resolution back to desde"""
+    days = {
+        "raw": Config.SENSOR_RAW_RETENTION_DAYS,
+        "1m": Config.SENSOR_MINUTE_RETENTION_DAYS,
+    }.get(resolucion, 0)
+    return days <= 0 or desde >= _now() - timedelta(days=days)
+
+def lttb(points: List[dict], threshold: int, y: str = "avg") -> List[dict]:
+    """Largest-Triangle-Three-Buckets: keep `threshold` points that preserve the shape"""
+    if threshold >= len(points) or threshold < 3:
+        return points
+    xs = [_epoch(p["bucket"]) for p in points]
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(p[y] for p in points[next_start:next_end]) / (next_end - next_start)
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs(
+                (xs[a] - avg_x) * (points[j][y] - points[a][y])
+                - (xs[a] - xs[j]) * (avg_y - points[a][y])
+            )
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+def _parse_fecha(value: str) -> datetime:
+    fecha = datetime.fromisoformat(value)
+    if fecha.tzinfo is not None:
+        # Stored readings are naive Lima time
+        fecha = fecha.astimezone(models.get_lima_time().tzinfo).replace(tzinfo=None)
+    return fecha
+
+def parse_range(desde: Optional[str], hasta: Optional[str], horas: int) -> tuple:
+    """[desde, hasta) from ISO strings; missing ends default to now and `horas` back"""
+    try:
+        end = _parse_fecha(hasta) if hasta else _now()
+        start = _parse_fecha(desde) if desde else end - timedelta(hours=horas)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida, use formato ISO 8601")
+    if start >= end:
+        raise HTTPException(status_code=400, detail="desde debe ser anterior a hasta")
+    return start, end
+
+def series_response(
+    db: Session,
+    metrica: str,
+    sensor_ids: Optional[List[int]] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    horas: int = 24,
+    bucket: Optional[str] = None,
+    resolution: Optional[str] = None,
+    puntos: Optional[int] = None
+) -> dict:
+    """Body for GET /temperatura|/humedad in time-range mode
+
+    At most MAX_BUCKETS buckets per sensor whatever the range; puntos= caps
+    each series further with LTTB.
+    """
+    start, end = parse_range(desde, hasta, horas)
+    try:
+        if resolution and not bucket:
+            bucket = pick_resolution(end - start, resolution)
+        seconds = choose_bucket(end - start, bucket, target=puntos * 4 if puntos else DEFAULT_POINTS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    buckets, fuente, seconds = read_series(db, metrica, start, end, seconds, sensor_ids)
+
+    downsample = None
+    if puntos:
+        puntos = max(3, min(puntos, MAX_BUCKETS))
+        series: Dict[Optional[int], List[dict]] = {}
+        for row in buckets:
+            series.setdefault(row["Sensor_id"], []).append(row)
+        if any(len(rows) > puntos for rows in series.values()):
+            downsample = "lttb"
+            buckets = [row for rows in series.values() for row in lttb(rows, puntos)]
+
+    return {
+        "desde": start,
+        "hasta": end,
+        "bucket": format_bucket(seconds),
+        "bucket_segundos": seconds,
+        "fuente": fuente,
+        "downsample": downsample,
+        "buckets": buckets
+    }
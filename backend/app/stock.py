@@ -0,0 +1,110 @@
+from sqlalchemy import bindparam, case, func, update
+from sqlalchemy.orm import Session
+from typing import Iterable
+
+from . import models
+
+# Stock ledger: every Movimiento moves Producto.Stock by a signed delta.
+# venta takes units out; reabastecimiento, entrada and agregado put units
+# in; ajuste is a signed correction (negative Cantidad for shrinkage).
+# Producto.Stock_Inicial is the base the ledger is applied on, so
+# Stock == Stock_Inicial + sum(deltas) at all times.
+STOCK_SIGN = {
+    "venta": -1,
+    "reabastecimiento": 1,
+    "entrada": 1,
+    "agregado": 1,
+    "ajuste": 1,
+}
+
+def stock_delta(tipo: str, cantidad: float) -> float:
+    return STOCK_SIGN.get(tipo, 0) * (cantidad or 0)
+
+def apply_movement(db: Session, producto_id: int, tipo: str, cantidad: float, reverse: bool = False) -> None:
+    """Move one product's stock inside the caller's transaction
+
+    A single UPDATE ... SET Stock = Stock + delta, so concurrent movements
+    never overwrite each other the way a read-modify-write would.
+    """
+    delta = stock_delta(tipo, cantidad)
+    if reverse:
+        delta = -delta
+    if not delta or producto_id is None:
+        return
+    db.execute(
+        update(models.Producto)
+        .where(models.Producto.idProductos == producto_id)
+        .values(Stock=func.coalesce(models.Producto.Stock, 0) + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+def apply_movements(db: Session, rows: Iterable[dict]) -> None:
+    """Apply many movements with one executemany, one row per product"""
+    deltas = {}
+    for row in rows:
+        delta = stock_delta(row["tipo"], row["Cantidad"])
+        if delta and row["producto_id"] is not None:
+            deltas[row["producto_id"]] = deltas.get(row["producto_id"], 0) + delta
+    if not deltas:
+        return
+
+    productos = models.Producto.__table__
+    db.execute(
+        productos.update()
+        .where(productos.c.idProductos == bindparam("pid"))
+        .values(Stock=func.coalesce(productos.c.Stock, 0) + bindparam("delta")),
+        [{"pid": pid, "delta": delta} for pid, delta in deltas.items()]
+    )
+
+def signed_cantidad():
+    """SQL expression of a Movimiento's stock delta, mirroring stock_delta()"""
+    sign = case(
+        *[(models.Movimiento.tipo == tipo, s) for tipo, s in STOCK_SIGN.items()],
+        else_=0
+    )
+    return sign * models.Movimiento.Cantidad
+
+def reconcile_stock(db: Session, apply: bool = False) -> dict:
+    """Rebuild stock from the ledger in one grouped pass over Movimientos
+
+    Returns the products whose stored Stock disagrees with
+    Stock_Inicial + sum(deltas). With apply=True they are corrected.
+    """
+    ledger = dict(db.query(
+        models.Movimiento.producto_id,
+        func.sum(signed_cantidad())
+    ).group_by(models.Movimiento.producto_id).all())
+
+    productos = db.query(
+        models.Producto.idProductos,
+        models.Producto.Nombre,
+        models.Producto.Stock,
+        models.Producto.Stock_Inicial
+    ).all()
+
+    diferencias = []
+    for producto_id, nombre, stock, stock_inicial in productos:
+        expected = (stock_inicial or 0) + (ledger.get(producto_id) or 0)
+        if abs((stock or 0) - expected) > 1e-6:
+            diferencias.append({
+                "producto_id": producto_id,
+                "nombre": nombre,
+                "stock_actual": stock,
+                "stock_ledger": round(expected, 4)
+            })
+
+    if apply and diferencias:
+        productos_table = models.Producto.__table__
+        db.execute(
+            productos_table.update()
+            .where(productos_table.c.idProductos == bindparam("pid"))
+            .values(Stock=bindparam("new_stock")),
+            [{"pid": d["producto_id"], "new_stock": d["stock_ledger"]} for d in diferencias]
+        )
+        db.commit()
+
+    return {
+        "productos_revisados": len(productos),
+        "diferencias": diferencias,
+        "aplicado": apply
+    }
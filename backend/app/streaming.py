@@ -0,0 +1,55 @@
+import json
+import re
+from typing import Any, Callable
+
+# Server-Sent Events helpers for the streaming variants of /voice/query and
+# /ai/business-insights. Tokens are sent as they arrive from the model, so the
+# client sees the first words in hundreds of milliseconds instead of waiting
+# for the whole completion.
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # nginx: flush each event instead of buffering
+}
+
+def sse_event(event: str, data: Any) -> str:
+    """One SSE frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+# Text after the last non-word character: a word the next token may continue
+_PARTIAL_WORD = re.compile(r"\w*\Z")
+
+class StreamRewriter:
+    """Apply a word-based text fix (e.g. fix_currency_to_soles) to a token stream
+
+    Tokens split words anywhere ("dól" + "ares"), so the trailing partial
+    word is held back until a later token ends it. Every piece passed to the
+    fix starts and ends on a word boundary, which keeps its \\b patterns
+    matching exactly as they would on the whole text.
+    """
+
+    def __init__(self, fix: Callable[[str], str]):
+        self.fix = fix
+        self.pending = ""
+        self.parts = []
+
+    def feed(self, token: str) -> str:
+        self.pending += token or ""
+        cut = _PARTIAL_WORD.search(self.pending).start()
+        ready, self.pending = self.pending[:cut], self.pending[cut:]
+        return self._emit(ready)
+
+    def flush(self) -> str:
+        ready, self.pending = self.pending, ""
+        return self._emit(ready)
+
+    def text(self) -> str:
+        """Everything emitted so far"""
+        return "".join(self.parts)
+
+    def _emit(self, ready: str) -> str:
+        if not ready:
+            return ""
+        fixed = self.fix(ready)
+        self.parts.append(fixed)
+        return fixed
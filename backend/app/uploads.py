@@ -0,0 +1,43 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# Request body limit for upload routes, enforced while the body arrives.
+# Form parsing spools the whole upload before the endpoint runs, so a size
+# check in the endpoint only happens after an oversized file was already
+# read to disk; this stops it at the Content-Length header or, for chunked
+# uploads, as soon as the running total passes the limit.
+
+# Multipart boundaries and the other form fields around the file
+FORM_OVERHEAD = 64 * 1024
+
+class UploadLimitMiddleware:
+    def __init__(self, app, paths: set[str], max_bytes: int, detail: str):
+        self.app = app
+        self.paths = paths
+        self.max_bytes = max_bytes
+        self.detail = detail
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse({"detail": self.detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside form parsing, which re-raises HTTPException
+                    raise HTTPException(status_code=413, detail=self.detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -4,19 +4,6 @@ const AI_CONFIG = {
     SHOW_MODE_INDICATOR: false  // Hide mode indicator since only real AI is used
 };
 
-// Timezone utility function for Lima, Peru
-function getTodayInLimaTimezone() {
-    // Create a date in Lima timezone using Intl.DateTimeFormat
-    const now = new Date();
-    const limaTime = new Intl.DateTimeFormat('en-CA', {
-        timeZone: 'America/Lima',
-        year: 'numeric',
-        month: '2-digit',
-        day: '2-digit'
-    }).format(now);
-    return limaTime; // Returns YYYY-MM-DD format
-}
-
 document.addEventListener('DOMContentLoaded', function() {
     const userData = checkAuth();
     setupUserInterface(userData);
@@ -57,34 +44,41 @@ async function loadAnalytics() {
     }
 }
 
+// Query string scoping stats to the user's sedes (admins see everything)
+function statsScope(extra = '') {
+    const userData = checkAuth();
+    const params = new URLSearchParams(extra);
+    if (userData && userData.rol !== 'admin' && userData.userId) {
+        params.append('user_id', userData.userId);
+    }
+    const query = params.toString();
+    return query ? `?${query}` : '';
+}
+
+// Today's KPIs come from a single /stats/today request shared by the cards
+let todayStatsPromise = null;
+function getTodayStats() {
+    if (!todayStatsPromise) {
+        todayStatsPromise = fetch(`${API_URL}/stats/today${statsScope()}`).then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+            return response.json();
+        });
+    }
+    return todayStatsPromise;
+}
+
 async function loadSalesToday() {
     try {
-        const response = await fetch(`${API_URL}/movimientos/?limit=1000`);
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-        }
-        
-        const data = await response.json();
-        
-        // Get today's date in Lima timezone (Peru) in YYYY-MM-DD format
-        const today = getTodayInLimaTimezone();
-        console.log('📅 Today\'s date (Lima timezone):', today);
-        
-        // Filter sales from today
-        const todaySales = data.movements.filter(mov => {
-            const movDate = mov.fecha.split('T')[0];
-            return movDate === today && mov.tipo === 'venta';
-        });
+        const stats = await getTodayStats();
         
-        const totalSales = todaySales.reduce((sum, mov) => sum + (mov.Cantidad * mov.Precio), 0);
-        const salesCount = todaySales.length;
-        
-        if (salesCount === 0) {
+        if (stats.transacciones === 0) {
             document.getElementById('salesTodayValue').textContent = 'S/.0.00';
             document.getElementById('salesTodayChange').textContent = 'Sin ventas hoy';
         } else {
-            document.getElementById('salesTodayValue').textContent = `S/.${totalSales.toFixed(2)}`;
-            document.getElementById('salesTodayChange').textContent = `${salesCount} transacciones hoy`;
+            document.getElementById('salesTodayValue').textContent = `S/.${stats.ventas_total.toFixed(2)}`;
+            document.getElementById('salesTodayChange').textContent = `${stats.transacciones} transacciones hoy`;
         }
         
     } catch (error) {
@@ -95,19 +89,8 @@ async function loadSalesToday() {
 
 async function loadProductsSold() {
     try {
-        const response = await fetch(`${API_URL}/movimientos/?limit=1000`);
-        const data = await response.json();
-        
-        // Get today's date in Lima timezone (Peru) in YYYY-MM-DD format
-        const today = getTodayInLimaTimezone();
-        
-        // Count products sold today
-        const todaySales = data.movements.filter(mov => {
-            const movDate = mov.fecha.split('T')[0];
-            return movDate === today && mov.tipo === 'venta';
-        });
-        
-        const totalProducts = todaySales.reduce((sum, mov) => sum + mov.Cantidad, 0);
+        const stats = await getTodayStats();
+        const totalProducts = stats.productos_vendidos;
         
         if (totalProducts === 0) {
             document.getElementById('productsSoldValue').textContent = '0';
@@ -125,18 +108,11 @@ async function loadProductsSold() {
 
 async function loadLowStock() {
     try {
-        const response = await fetch(`${API_URL}/productos/?limit=1000`);
-        const productosData = await response.json();
-        
-        // Handle both old format (array) and new format (object with pagination)
-        const productos = productosData.productos || productosData;
+        const stats = await getTodayStats();
         
-        // Filter products with low stock (less than 10)
-        const lowStockProducts = productos.filter(p => p.Stock < 10);
+        document.getElementById('lowStockValue').textContent = stats.stock_bajo;
         
-        document.getElementById('lowStockValue').textContent = lowStockProducts.length;
-        
-        if (lowStockProducts.length > 0) {
+        if (stats.stock_bajo > 0) {
             document.getElementById('lowStockChange').textContent = 'Requieren reabastecimiento';
             document.querySelector('.low-stock').classList.add('alert');
         } else {
@@ -151,17 +127,10 @@ async function loadLowStock() {
 
 async function loadTemperatureStatus() {
     try {
-        const response = await fetch(`${API_URL}/temperatura/?limit=20`);
-        const data = await response.json();
-        
-        // Handle both old format (array) and new format (object with pagination)
-        const temperaturas = data.temperatures || data;
+        const stats = await getTodayStats();
+        const avgTemp = stats.temperatura_promedio;
         
-        if (temperaturas.length > 0) {
-            // Get last 10 readings for average
-            const recentTemps = temperaturas.slice(0, 10);
-            const avgTemp = recentTemps.reduce((sum, t) => sum + t.Temperatura, 0) / recentTemps.length;
-            
+        if (avgTemp !== null) {
             document.getElementById('temperatureValue').textContent = `${avgTemp.toFixed(1)}°C`;
             
             // Status based on temperature
@@ -188,75 +157,19 @@ async function loadTemperatureStatus() {
 
 async function loadTopProducts() {
     try {
-        const [movimientosResponse, productosResponse, sedesResponse] = await Promise.all([
-            fetch(`${API_URL}/movimientos/?limit=1000`),
-            fetch(`${API_URL}/productos/?limit=1000`),
-            fetch(`${API_URL}/sedes/`)
-        ]);
-        
-        const movimientosData = await movimientosResponse.json();
-        const productosData = await productosResponse.json();
-        const sedes = await sedesResponse.json();
-        
-        // Handle both old and new API formats
-        const movimientos = { movements: movimientosData.movements || movimientosData };
-        const productos = productosData.productos || productosData;
-        
-        // Get today's date in Lima timezone (Peru) in YYYY-MM-DD format
-        const today = getTodayInLimaTimezone();
-        
-        // Filter today's sales
-        const todaySales = movimientos.movements.filter(mov => {
-            const movDate = mov.fecha.split('T')[0];
-            return movDate === today && mov.tipo === 'venta';
-        });
-        
-        // Count sales by product AND sede combination
-        const productSales = {};
-        todaySales.forEach(mov => {
-            const key = `${mov.producto_id}-${mov.sede_id}`;
-            if (!productSales[key]) {
-                productSales[key] = {
-                    producto_id: mov.producto_id,
-                    sede_id: mov.sede_id,
-                    cantidad: 0
-                };
-            }
-            productSales[key].cantidad += mov.Cantidad;
-        });
-        
-        // Get top 5 products
-        const sortedProducts = Object.values(productSales)
-            .sort((a, b) => b.cantidad - a.cantidad)
-            .slice(0, 5);
-        
-        // Create products and sedes maps
-        const productosMap = {};
-        productos.forEach(p => {
-            productosMap[p.idProductos] = { nombre: p.Nombre, sede_id: p.Sede_id };
-        });
-        
-        const sedesMap = {};
-        sedes.forEach(s => {
-            sedesMap[s.idSedes] = s.Nombre;
-        });
+        const response = await fetch(`${API_URL}/stats/top-products${statsScope('limit=5')}`);
+        const topProducts = await response.json();
         
         const container = document.getElementById('topProductsToday');
-        if (sortedProducts.length > 0) {
-            container.innerHTML = sortedProducts.map((product, index) => {
-                const productInfo = productosMap[product.producto_id];
-                const productName = productInfo ? productInfo.nombre : `Producto ${product.producto_id}`;
-                const sedeName = sedesMap[product.sede_id] || `Sede ${product.sede_id}`;
-                
-                return `
-                    <div class="top-product-item">
-                        <span class="rank">${index + 1}.</span>
-                        <span class="product-name">${productName}</span>
-                        <span class="sede-name">(${sedeName})</span>
-                        <span class="quantity">${Math.round(product.cantidad)} vendidos</span>
-                    </div>
-                `;
-            }).join('');
+        if (topProducts.length > 0) {
+            container.innerHTML = topProducts.map((product, index) => `
+                <div class="top-product-item">
+                    <span class="rank">${index + 1}.</span>
+                    <span class="product-name">${product.nombre}</span>
+                    <span class="sede-name">(${product.sede_nombre})</span>
+                    <span class="quantity">${Math.round(product.cantidad)} vendidos</span>
+                </div>
+            `).join('');
         } else {
             container.innerHTML = '<div class="no-data">Sin ventas registradas hoy</div>';
         }
@@ -269,45 +182,16 @@ async function loadTopProducts() {
 
 async function loadSedesPerformance() {
     try {
-        const [movimientosResponse, sedesResponse] = await Promise.all([
-            fetch(`${API_URL}/movimientos/?limit=1000`),
-            fetch(`${API_URL}/sedes/`)
-        ]);
-        
-        const movimientosData = await movimientosResponse.json();
-        const sedes = await sedesResponse.json();
-        
-        // Handle both old and new API formats
-        const movimientos = { movements: movimientosData.movements || movimientosData };
-        
-        // Calculate sales by sede
-        const sedesSales = {};
-        movimientos.movements.filter(mov => mov.tipo === 'venta').forEach(mov => {
-            if (!sedesSales[mov.sede_id]) {
-                sedesSales[mov.sede_id] = { total: 0, count: 0 };
-            }
-            sedesSales[mov.sede_id].total += mov.Cantidad * mov.Precio;
-            sedesSales[mov.sede_id].count += 1;
-        });
-        
-        // Create sedes map
-        const sedesMap = {};
-        sedes.forEach(s => {
-            sedesMap[s.idSedes] = s.Nombre;
-        });
-        
-        // Sort by performance
-        const sortedSedes = Object.entries(sedesSales)
-            .sort(([,a], [,b]) => b.total - a.total)
-            .slice(0, 5);
+        const response = await fetch(`${API_URL}/stats/sede-performance${statsScope('limit=5')}`);
+        const sedesPerformance = await response.json();
         
         const container = document.getElementById('sedesPerformance');
-        if (sortedSedes.length > 0) {
-            container.innerHTML = sortedSedes.map(([sedeId, data], index) => `
+        if (sedesPerformance.length > 0) {
+            container.innerHTML = sedesPerformance.map((sede, index) => `
                 <div class="sede-performance-item">
                     <span class="rank">${index + 1}.</span>
-                    <span class="sede-name">${sedesMap[sedeId] || `Sede ${sedeId}`}</span>
-                    <span class="performance">S/.${data.total.toFixed(0)} (${data.count} ventas)</span>
+                    <span class="sede-name">${sede.nombre}</span>
+                    <span class="performance">S/.${sede.ingresos.toFixed(0)} (${sede.transacciones} ventas)</span>
                 </div>
             `).join('');
         } else {
@@ -322,44 +206,18 @@ async function loadSedesPerformance() {
 
 async function loadRecentActivity() {
     try {
-        const response = await fetch(`${API_URL}/movimientos/?limit=5`);
-        const movimientosData = await response.json();
-        
-        // Get product and sede names
-        const [productosResponse, sedesResponse] = await Promise.all([
-            fetch(`${API_URL}/productos/?limit=1000`),
-            fetch(`${API_URL}/sedes/`)
-        ]);
-        
-        const productosData = await productosResponse.json();
-        const sedes = await sedesResponse.json();
-        
-        // Handle both old and new API formats
-        const data = { movements: movimientosData.movements || movimientosData };
-        const productos = productosData.productos || productosData;
-        
-        // Create lookup maps
-        const productosMap = {};
-        productos.forEach(p => {
-            productosMap[p.idProductos] = p.Nombre;
-        });
-        
-        const sedesMap = {};
-        sedes.forEach(s => {
-            sedesMap[s.idSedes] = s.Nombre;
-        });
+        const response = await fetch(`${API_URL}/stats/recent-activity${statsScope('limit=5')}`);
+        const movements = await response.json();
         
         const container = document.getElementById('recentActivity');
-        if (data.movements && data.movements.length > 0) {
-            container.innerHTML = data.movements.map(mov => {
+        if (movements.length > 0) {
+            container.innerHTML = movements.map(mov => {
                 const timeAgo = getTimeAgo(new Date(mov.fecha));
-                const productName = productosMap[mov.producto_id] || `Producto ${mov.producto_id}`;
-                const sedeName = sedesMap[mov.sede_id] || `Sede ${mov.sede_id}`;
                 
                 return `
                     <div class="activity-item">
                         <span class="activity-type ${mov.tipo}">${mov.tipo}</span>
-                        <span class="activity-desc">${productName} en ${sedeName}</span>
+                        <span class="activity-desc">${mov.producto_nombre} en ${mov.sede_nombre}</span>
                         <span class="activity-time">${timeAgo}</span>
                     </div>
                 `;
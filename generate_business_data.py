@@ -4,7 +4,9 @@ Business Data Generator for Panadería Management System
 Generates realistic bakery business data for AI analytics and visualization
 
 Usage:
-    python3 generate_business_data.py
+    python3 generate_business_data.py                 # one POST per movement
+    python3 generate_business_data.py --bulk          # NDJSON to /movimientos/bulk
+    python3 generate_business_data.py --db panaderias.db --dias 365
 
 This creates:
 - Multiple bakery locations (sedes) with different characteristics
@@ -13,15 +15,20 @@ This creates:
 - Realistic patterns: weekends, holidays, seasonal trends
 """
 
+import argparse
 import requests
 import random
 import json
+import sqlite3
 from datetime import datetime, timedelta
 import time
 
 # API Configuration
 API_URL = "http://127.0.0.1:8000"
 
+# Movements per /movimientos/bulk request or per direct-to-DB transaction
+BULK_BATCH_SIZE = 5000
+
 # Realistic bakery product data
 BAKERY_PRODUCTS = {
     "Panadería": [
@@ -206,13 +213,18 @@ def create_products(sedes):
     print(f"✅ Total: {len(created_products)} productos creados")
     return created_products
 
-def generate_historical_movements(products, days_back=180):
-    """Generate realistic historical sales and movement data"""
-    print(f"\n📊 Generando {days_back} días de movimientos históricos...")
-    
-    movements_created = 0
+def iter_historical_movements(products, days_back=180):
+    """Yield realistic historical sales and movement data, one dict per transaction"""
+    movements_yielded = 0
     start_date = datetime.now() - timedelta(days=days_back)
     
+    # Get unique sedes
+    sedes_procesadas = {}
+    for p in products:
+        sede_id = p["sede_info"]["idSedes"]
+        if sede_id not in sedes_procesadas:
+            sedes_procesadas[sede_id] = p["sede_info"]
+    
     for day_offset in range(days_back):
         current_date = start_date + timedelta(days=day_offset)
         
@@ -228,13 +240,6 @@ def generate_historical_movements(products, days_back=180):
         else:
             day_multiplier = 1.0
         
-        # Get unique sedes
-        sedes_procesadas = {}
-        for p in products:
-            sede_id = p["sede_info"]["idSedes"]
-            if sede_id not in sedes_procesadas:
-                sedes_procesadas[sede_id] = p["sede_info"]
-        
         # Generate movements for each sede
         for sede in sedes_procesadas.values():
             sede_products = [p for p in products if p["sede_info"]["idSedes"] == sede["idSedes"]]
@@ -253,26 +258,140 @@ def generate_historical_movements(products, days_back=180):
                         product, current_date, is_weekend, is_holiday
                     )
                     
-                    # Create movement
-                    try:
-                        response = requests.post(f"{API_URL}/movimientos/", json={
-                            "producto_id": product["idProductos"],
-                            "Cantidad": cantidad,
-                            "Precio": precio,
-                            "tipo": movement_type,
-                            "Usuario_id": 1,  # Admin user
-                            "sede_id": sede["idSedes"]
-                        })
-                        
-                        if response.status_code == 200:
-                            movements_created += 1
-                        
-                    except requests.exceptions.RequestException:
-                        pass  # Silent fail to keep generation moving
+                    # Opening hours 7:00 - 21:00
+                    fecha = current_date.replace(
+                        hour=random.randint(7, 20),
+                        minute=random.randint(0, 59),
+                        second=random.randint(0, 59),
+                        microsecond=0
+                    )
+                    
+                    movements_yielded += 1
+                    yield {
+                        "producto_id": product["idProductos"],
+                        "Cantidad": cantidad,
+                        "Precio": precio,
+                        "tipo": movement_type,
+                        "Usuario_id": 1,  # Admin user
+                        "sede_id": sede["idSedes"],
+                        "fecha": fecha.isoformat()
+                    }
         
         # Progress indicator
         if day_offset % 30 == 0:
-            print(f"  📅 Procesados {day_offset} días... ({movements_created} movimientos)")
+            print(f"  📅 Procesados {day_offset} días... ({movements_yielded} movimientos)")
+
+def generate_historical_movements(products, days_back=180):
+    """Create historical movements with one POST per transaction (slow, legacy mode)"""
+    print(f"\n📊 Generando {days_back} días de movimientos históricos...")
+    
+    movements_created = 0
+    for movement in iter_historical_movements(products, days_back):
+        try:
+            response = requests.post(f"{API_URL}/movimientos/", json=movement)
+            
+            if response.status_code == 200:
+                movements_created += 1
+            
+        except requests.exceptions.RequestException:
+            pass  # Silent fail to keep generation moving
+    
+    print(f"✅ {movements_created} movimientos históricos creados")
+    return movements_created
+
+def generate_historical_movements_bulk(products, days_back=180, batch_size=BULK_BATCH_SIZE):
+    """Stream historical movements as NDJSON to /movimientos/bulk"""
+    print(f"\n📊 Generando {days_back} días de movimientos históricos (modo bulk)...")
+    
+    movements_created = 0
+    batch = []
+    
+    def send(batch):
+        body = "".join(json.dumps(m) + "\n" for m in batch).encode()
+        response = requests.post(
+            f"{API_URL}/movimientos/bulk",
+            data=body,
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        if response.status_code != 200:
+            print(f"  ❌ Error en carga masiva: {response.status_code} - {response.text}")
+            return 0
+        return response.json()["inserted"]
+    
+    try:
+        for movement in iter_historical_movements(products, days_back):
+            batch.append(movement)
+            if len(batch) >= batch_size:
+                movements_created += send(batch)
+                batch = []
+        if batch:
+            movements_created += send(batch)
+    except requests.exceptions.RequestException as e:
+        print(f"  ❌ Error de conexión en carga masiva: {e}")
+    
+    print(f"✅ {movements_created} movimientos históricos creados")
+    return movements_created
+
+# Same signs as backend/app/stock.py: how each movement type moves Stock
+STOCK_SIGN = {"venta": -1, "reabastecimiento": 1, "entrada": 1, "agregado": 1, "ajuste": 1}
+
+ROLLUP_UPSERT_SQL = """
+INSERT INTO VentasDiarias (fecha_dia, sede_id, producto_id, tipo, cantidad, ingresos, transacciones)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (fecha_dia, sede_id, producto_id, tipo) DO UPDATE SET
+    cantidad = cantidad + excluded.cantidad,
+    ingresos = ingresos + excluded.ingresos,
+    transacciones = transacciones + excluded.transacciones
+"""
+STOCK_UPDATE_SQL = "UPDATE Productos SET Stock = COALESCE(Stock, 0) + ? WHERE idProductos = ?"
+
+def write_movements_batch(conn, sql, columns, batch):
+    """Insert a batch of movements and apply it to VentasDiarias and Stock
+
+    The API does this on every write; rows inserted here bypass it, so the
+    rollup and the stock ledger are updated in the same transaction.
+    """
+    rollup = {}
+    stock = {}
+    for m in batch:
+        key = (m["fecha"][:10], m["sede_id"], m["producto_id"], m["tipo"])
+        acc = rollup.setdefault(key, [0.0, 0.0, 0])
+        acc[0] += m["Cantidad"]
+        acc[1] += m["Cantidad"] * m["Precio"]
+        acc[2] += 1
+        delta = STOCK_SIGN.get(m["tipo"], 0) * m["Cantidad"]
+        if delta:
+            stock[m["producto_id"]] = stock.get(m["producto_id"], 0) + delta
+    
+    with conn:
+        conn.executemany(sql, [tuple(m[c] for c in columns) for m in batch])
+        conn.executemany(ROLLUP_UPSERT_SQL, [key + tuple(acc) for key, acc in rollup.items()])
+        conn.executemany(STOCK_UPDATE_SQL, [(delta, pid) for pid, delta in stock.items()])
+
+def generate_historical_movements_db(products, db_path, days_back=180, batch_size=BULK_BATCH_SIZE):
+    """Write historical movements straight into a SQLite database file"""
+    print(f"\n📊 Generando {days_back} días de movimientos históricos (directo a {db_path})...")
+    
+    columns = ["producto_id", "Cantidad", "Precio", "tipo", "Usuario_id", "sede_id", "fecha"]
+    sql = f"INSERT INTO Movimientos ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    
+    movements_created = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        batch = []
+        for movement in iter_historical_movements(products, days_back):
+            # Same text format SQLAlchemy uses for DateTime columns on SQLite
+            movement["fecha"] = datetime.fromisoformat(movement["fecha"]).strftime("%Y-%m-%d %H:%M:%S.%f")
+            batch.append(movement)
+            if len(batch) >= batch_size:
+                write_movements_batch(conn, sql, columns, batch)
+                movements_created += len(batch)
+                batch = []
+        if batch:
+            write_movements_batch(conn, sql, columns, batch)
+            movements_created += len(batch)
+    finally:
+        conn.close()
     
     print(f"✅ {movements_created} movimientos históricos creados")
     return movements_created
@@ -432,8 +551,17 @@ def create_users():
     
     return users_created
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generador de datos de negocio para la panadería")
+    parser.add_argument("--dias", type=int, default=180, help="Días de historial a generar (default: 180)")
+    parser.add_argument("--bulk", action="store_true", help="Enviar movimientos en lote a /movimientos/bulk")
+    parser.add_argument("--db", metavar="RUTA", help="Escribir movimientos directamente en esta base SQLite")
+    return parser.parse_args()
+
 def main():
     """Main data generation function"""
+    args = parse_args()
+
     print("🍞 Generador de Datos de Negocio - Sistema de Panadería")
     print("=" * 60)
     
@@ -464,7 +592,12 @@ def main():
             return
         
         # Step 3: Generate historical movements
-        movements_count = generate_historical_movements(products, days_back=180)
+        if args.db:
+            movements_count = generate_historical_movements_db(products, args.db, days_back=args.dias)
+        elif args.bulk:
+            movements_count = generate_historical_movements_bulk(products, days_back=args.dias)
+        else:
+            movements_count = generate_historical_movements(products, days_back=args.dias)
         
         # Summary
         end_time = time.time()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Check that a slow OpenAI call doesn't block the API's event loop
+
+Usage:
+    python3 test_async_responsiveness.py
+
+Starts a fake OpenAI server that takes SLOW_SECONDS to answer chat
+completions, sends a /voice/query to the app (in process, throwaway
+SQLite database) and meanwhile polls /health. With blocking model calls
+/health would wait for the whole completion; it must answer within
+HEALTH_BUDGET_SECONDS. Exits with code 1 if any check fails.
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+SLOW_SECONDS = 3.0
+HEALTH_BUDGET_SECONDS = 0.5
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+PORT = free_port()
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test_async_responsiveness.db")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{DB_PATH}",
+    "SENSOR_COMPACTION_INTERVAL": "0",
+    "OPENAI_BASE_URL": f"http://127.0.0.1:{PORT}/v1",
+    "OPENAI_API_KEY": "test",
+    "OPENAI_MAX_RETRIES": "0",
+    # Always reach the model: no templated answers, no answer cache
+    "VOICE_FAST_PATH": "false",
+    "ANSWER_CACHE_MAX_ENTRIES": "0",
+})
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+
+failures = []
+
+def check(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    if not ok:
+        failures.append(message)
+
+fake_openai = FastAPI()
+
+@fake_openai.post("/v1/chat/completions")
+async def slow_completion(body: dict):
+    await asyncio.sleep(SLOW_SECONDS)
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "Respuesta de prueba."},
+            "finish_reason": "stop",
+        }],
+    }
+
+def start_fake_openai():
+    server = uvicorn.Server(uvicorn.Config(fake_openai, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def create_user():
+    db = SessionLocal()
+    usuario = models.Usuario(username="test", password="test", rol="admin")
+    db.add(usuario)
+    db.commit()
+    user_id = usuario.idUsuarios
+    db.close()
+    return user_id
+
+async def run_checks(user_id):
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            start = time.perf_counter()
+            query = asyncio.create_task(client.post(
+                "/voice/query",
+                data={"query": "¿Qué estrategia me recomiendas para el fin de semana?", "user_id": user_id}
+            ))
+
+            # Poll /health while the model call is pending
+            latencies = []
+            await asyncio.sleep(0.3)
+            while not query.done() and time.perf_counter() - start < SLOW_SECONDS - 0.3:
+                sent = time.perf_counter()
+                health = await client.get("/health")
+                latencies.append(time.perf_counter() - sent)
+                if health.status_code != 200:
+                    check(False, f"/health respondió {health.status_code}")
+                await asyncio.sleep(0.2)
+
+            response = await query
+            total = time.perf_counter() - start
+
+    check(response.status_code == 200 and response.json().get("served_by") == "llm",
+          f"/voice/query responde desde el modelo ({response.status_code})")
+    check(total >= SLOW_SECONDS, f"/voice/query esperó al modelo lento ({total:.2f}s)")
+    check(len(latencies) >= 3, f"{len(latencies)} consultas a /health mientras el modelo respondía")
+    worst = max(latencies, default=float("inf"))
+    check(worst < HEALTH_BUDGET_SECONDS, f"/health más lento: {worst * 1000:.0f}ms < {HEALTH_BUDGET_SECONDS * 1000:.0f}ms")
+
+def main():
+    print("⏱️  Respuesta del API durante llamadas lentas a OpenAI")
+    print("=" * 50)
+    server = start_fake_openai()
+    try:
+        asyncio.run(run_checks(create_user()))
+    finally:
+        server.should_exit = True
+
+    print()
+    if failures:
+        print(f"❌ {len(failures)} verificaciones fallaron")
+        sys.exit(1)
+    print("✅ Todas las verificaciones pasaron")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Benchmark the AI business summary: per-row Python loop vs SQL aggregations
+
+Usage:
+    python3 test_business_summary.py
+    python3 test_business_summary.py --movimientos 200000 --dias 7 30
+
+Seeds a throwaway SQLite database with MOVIMIENTOS movements spread over
+the last HISTORIA_DIAS days (VentasDiarias rebuilt from them, like the
+startup migration does), then times the previous implementation of
+get_business_summary_data (loads every Movimiento as an ORM object) and
+the current one for each analysis window. Both run with the same frozen
+clock, so the windows match to the second. Exits with code 1 if any
+output differs from the previous implementation.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test_business_summary.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["SENSOR_COMPACTION_INTERVAL"] = "0"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from sqlalchemy import desc  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.routes import ai_analytics  # noqa: E402
+from app.rollups import backfill_ventas_diarias  # noqa: E402
+
+HISTORIA_DIAS = 180
+SEDES = ["Centro", "Miraflores", "San Isidro", "Surco", "Barranco"]
+TIPOS = ["venta"] * 8 + ["reabastecimiento", "ajuste", "entrada", "agregado"]
+
+NOW = datetime.now().replace(microsecond=0)
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+failures = []
+
+def check(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    if not ok:
+        failures.append(message)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark del resumen de negocio para IA")
+    parser.add_argument("--movimientos", type=int, default=1_000_000, help="Movimientos a generar (default: 1000000)")
+    parser.add_argument("--dias", type=int, nargs="+", default=[7, 30, HISTORIA_DIAS],
+                        help=f"Ventanas de análisis en días (default: 7 30 {HISTORIA_DIAS})")
+    return parser.parse_args()
+
+def seed(total):
+    """Sedes, 50 products (some low on stock) and `total` movements in fecha order"""
+    rng = random.Random(42)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(models.Usuario(idUsuarios=1, username="test", password="test", rol="admin"))
+    for i, nombre in enumerate(SEDES, start=1):
+        db.add(models.Sede(idSedes=i, Nombre=nombre, Direccion="-", Usuario_id=1))
+    prices = {}
+    for i in range(1, 51):
+        prices[i] = round(rng.uniform(1, 250), 2)
+        db.add(models.Producto(
+            idProductos=i, Nombre=f"Producto {i}", Precio=prices[i], Stock=rng.choice([3, 8, 50, 200]),
+            Stock_Inicial=0, Categoria=rng.choice(["Pan", "Pastelería", "Tortas", "Bebidas"]),
+            Sede_id=1 + i % len(SEDES)
+        ))
+    db.commit()
+    db.close()
+
+    # Sede order is shuffled so first-sale order differs from sede_id order
+    sede_weights = [1, 5, 2, 4, 3]
+    span = HISTORIA_DIAS * 86400
+    offsets = sorted((rng.randrange(span) for _ in range(total)), reverse=True)
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        batch = []
+        for offset in offsets:
+            producto_id = rng.randint(1, 50)
+            batch.append((
+                producto_id, rng.randint(1, 12), prices[producto_id], rng.choice(TIPOS),
+                (NOW - timedelta(seconds=offset)).isoformat(sep=" "), 1,
+                rng.choices(range(1, len(SEDES) + 1), weights=sede_weights)[0]
+            ))
+            if len(batch) == 50000:
+                cursor.executemany(
+                    'INSERT INTO "Movimientos" (producto_id, "Cantidad", "Precio", tipo, fecha, "Usuario_id", sede_id) '
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", batch
+                )
+                batch.clear()
+        if batch:
+            cursor.executemany(
+                'INSERT INTO "Movimientos" (producto_id, "Cantidad", "Precio", tipo, fecha, "Usuario_id", sede_id) '
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", batch
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    backfill_ventas_diarias(engine)
+
+def previous_summary(db, days_back=7):
+    """get_business_summary_data as it was before the SQL aggregations"""
+    start_date = FrozenDatetime.now() - timedelta(days=days_back)
+
+    sales_movements = db.query(models.Movimiento).filter(
+        models.Movimiento.tipo == "venta",
+        models.Movimiento.fecha >= start_date
+    ).all()
+
+    total_sales = sum(mov.Cantidad * mov.Precio for mov in sales_movements)
+    total_transactions = len(sales_movements)
+
+    product_sales = {}
+    for mov in sales_movements:
+        if mov.producto_id not in product_sales:
+            product_sales[mov.producto_id] = {"quantity": 0, "revenue": 0}
+        product_sales[mov.producto_id]["quantity"] += mov.Cantidad
+        product_sales[mov.producto_id]["revenue"] += mov.Cantidad * mov.Precio
+
+    productos = db.query(models.Producto).all()
+    productos_map = {p.idProductos: {"nombre": p.Nombre, "precio": p.Precio, "stock": p.Stock, "categoria": p.Categoria} for p in productos}
+
+    for prod_id, sales_data in product_sales.items():
+        if prod_id in productos_map:
+            sales_data["nombre"] = productos_map[prod_id]["nombre"]
+            sales_data["categoria"] = productos_map[prod_id]["categoria"]
+
+    top_products = sorted(product_sales.items(), key=lambda x: x[1]["revenue"], reverse=True)[:10]
+
+    sedes = db.query(models.Sede).all()
+    sedes_map = {s.idSedes: s.Nombre for s in sedes}
+
+    sede_performance = {}
+    for mov in sales_movements:
+        if mov.sede_id not in sede_performance:
+            sede_performance[mov.sede_id] = {"revenue": 0, "transactions": 0}
+        sede_performance[mov.sede_id]["revenue"] += mov.Cantidad * mov.Precio
+        sede_performance[mov.sede_id]["transactions"] += 1
+
+    for sede_id, perf_data in sede_performance.items():
+        if sede_id in sedes_map:
+            perf_data["nombre"] = sedes_map[sede_id]
+
+    low_stock_products = db.query(models.Producto).filter(models.Producto.Stock < 10).all()
+    low_stock_info = []
+    for p in low_stock_products:
+        sede_name = sedes_map.get(p.Sede_id, f"Sede {p.Sede_id}")
+        low_stock_info.append({
+            "nombre": p.Nombre,
+            "stock_actual": p.Stock,
+            "categoria": p.Categoria,
+            "precio": f"S/. {p.Precio:,.2f}",
+            "sede_id": p.Sede_id,
+            "sede_nombre": sede_name
+        })
+
+    recent_temps = db.query(models.Temperatura).order_by(desc(models.Temperatura.fecha)).limit(20).all()
+    recent_humidity = db.query(models.Humedad).order_by(desc(models.Humedad.fecha)).limit(20).all()
+
+    avg_temp = sum(t.Temperatura for t in recent_temps) / len(recent_temps) if recent_temps else 0
+    avg_humidity = sum(h.Humedad for h in recent_humidity) / len(recent_humidity) if recent_humidity else 0
+
+    movement_types = {}
+    all_movements = db.query(models.Movimiento).filter(models.Movimiento.fecha >= start_date).all()
+    for mov in all_movements:
+        if mov.tipo not in movement_types:
+            movement_types[mov.tipo] = 0
+        movement_types[mov.tipo] += 1
+
+    return {
+        "periodo_analisis": f"Últimos {days_back} días",
+        "resumen_ventas": {
+            "total_ingresos": f"S/. {total_sales:,.2f}",
+            "total_transacciones": total_transactions,
+            "ingreso_promedio_transaccion": f"S/. {total_sales / total_transactions if total_transactions > 0 else 0:,.2f}"
+        },
+        "productos_top": [
+            {
+                "producto_id": prod_id,
+                "nombre": data.get("nombre", f"Producto {prod_id}"),
+                "categoria": data.get("categoria", "Sin categoría"),
+                "cantidad_vendida": round(data["quantity"], 2),
+                "ingresos": f"S/. {data['revenue']:,.2f}"
+            } for prod_id, data in top_products
+        ],
+        "performance_sedes": [
+            {
+                "sede_id": sede_id,
+                "nombre": data.get("nombre", f"Sede {sede_id}"),
+                "ingresos": f"S/. {data['revenue']:,.2f}",
+                "transacciones": data["transactions"],
+                "ingreso_promedio": f"S/. {data['revenue'] / data['transactions'] if data['transactions'] > 0 else 0:,.2f}"
+            } for sede_id, data in sede_performance.items()
+        ],
+        "productos_stock_bajo": low_stock_info,
+        "condiciones_ambientales": {
+            "temperatura_promedio": round(avg_temp, 1),
+            "humedad_promedio": round(avg_humidity, 1),
+            "lecturas_temperatura": len(recent_temps),
+            "lecturas_humedad": len(recent_humidity)
+        },
+        "tipos_movimiento": movement_types,
+        "total_productos": len(productos),
+        "total_sedes": len(sedes)
+    }
+
+def timed(fn, days):
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        result = fn(db, days)
+        return result, time.perf_counter() - start
+    finally:
+        db.close()
+
+def main():
+    args = parse_args()
+    print("📊 Benchmark del resumen de negocio para IA")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    seed(args.movimientos)
+    print(f"   {args.movimientos:,} movimientos en {HISTORIA_DIAS} días generados en {time.perf_counter() - start:.1f}s\n")
+
+    ai_analytics.datetime = FrozenDatetime
+    for days in args.dias:
+        before, before_seconds = timed(previous_summary, days)
+        after, after_seconds = timed(ai_analytics.get_business_summary_data, days)
+        print(f"   {days} días: antes {before_seconds:.2f}s, ahora {after_seconds:.2f}s "
+              f"({before_seconds / max(after_seconds, 1e-6):.1f}x)")
+
+        differing = [key for key in before if before[key] != after.get(key)]
+        check(not differing and before.keys() == after.keys(),
+              f"{days} días: resultado idéntico" + (f" (difiere: {', '.join(differing)})" if differing else ""))
+
+    print()
+    if failures:
+        print(f"❌ {len(failures)} verificaciones fallaron")
+        sys.exit(1)
+    print("✅ Todas las verificaciones pasaron")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Check that identical Claude requests share one upstream call
+
+Usage:
+    python3 test_claude_coalescing.py
+
+Starts a local stub of the Claude messages API that counts hits (and can
+be switched to answer 500), points CLAUDE_API_URL at it and drives the
+app in process (throwaway SQLite database):
+- CONCURRENT identical /ai/business-insights?days=7 requests make exactly
+  one upstream call and all get its answer
+- Repeating the request is served from the cache (no new call)
+- An error response is not cached: the next request calls upstream again,
+  and once the API recovers its answer is cached
+Exits with code 1 if any check fails.
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+CONCURRENT = 10
+STUB_DELAY_SECONDS = 0.5
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+PORT = free_port()
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test_claude_coalescing.db")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{DB_PATH}",
+    "SENSOR_COMPACTION_INTERVAL": "0",
+    "CLAUDE_API_URL": f"http://127.0.0.1:{PORT}/v1/messages",
+    "CLAUDE_API_KEY": "test",
+})
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+failures = []
+
+def check(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    if not ok:
+        failures.append(message)
+
+stub = FastAPI()
+stub_state = {"calls": 0, "fail": False}
+
+@stub.post("/v1/messages")
+async def messages(body: dict):
+    stub_state["calls"] += 1
+    # Slow enough that the concurrent requests overlap
+    await asyncio.sleep(STUB_DELAY_SECONDS)
+    if stub_state["fail"]:
+        return JSONResponse(status_code=500, content={"type": "error", "error": {"type": "api_error", "message": "caído"}})
+    return {
+        "id": "msg_test",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model"),
+        "content": [{"type": "text", "text": f"Insights de prueba #{stub_state['calls']}"}],
+        "stop_reason": "end_turn",
+    }
+
+def start_stub():
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+async def insights(client, days):
+    response = await client.get("/ai/business-insights", params={"days": days})
+    return response.json().get("ai_insights") if response.status_code == 200 else f"HTTP {response.status_code}"
+
+async def run_checks():
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            answers = await asyncio.gather(*[insights(client, 7) for _ in range(CONCURRENT)])
+            check(stub_state["calls"] == 1, f"{CONCURRENT} solicitudes concurrentes: {stub_state['calls']} llamada(s) a Claude")
+            check(len(set(answers)) == 1 and answers[0].startswith("Insights de prueba"),
+                  f"Todas reciben la misma respuesta ({answers[0]!r})")
+
+            repeat = await insights(client, 7)
+            check(stub_state["calls"] == 1 and repeat == answers[0], "Repetir la solicitud usa la caché")
+
+            # Different window, different data: a new cache key
+            stub_state["fail"] = True
+            error = await insights(client, 30)
+            calls = stub_state["calls"]
+            check(calls == 2 and "Error API Claude: 500" in error, f"La API falla: {error[:40]!r}")
+            await insights(client, 30)
+            check(stub_state["calls"] == calls + 1, "El error no se guarda en caché")
+
+            stub_state["fail"] = False
+            recovered = await insights(client, 30)
+            calls = stub_state["calls"]
+            check(recovered.startswith("Insights de prueba"), "La API se recupera")
+            await insights(client, 30)
+            check(stub_state["calls"] == calls, "La respuesta recuperada sí se guarda en caché")
+
+def main():
+    print("🤖 Llamadas compartidas a Claude - /ai/business-insights")
+    print("=" * 50)
+    server = start_stub()
+    try:
+        asyncio.run(run_checks())
+    finally:
+        server.should_exit = True
+
+    print()
+    if failures:
+        print(f"❌ {len(failures)} verificaciones fallaron")
+        sys.exit(1)
+    print("✅ Todas las verificaciones pasaron")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Check that the time-series indexes exist and are used by the hot queries
+
+Usage:
+    python3 test_index_usage.py
+
+Works on a throwaway SQLite database (no running server needed):
+- The index migration creates every model index on a database built
+  without them, and a second run creates none
+- EXPLAIN QUERY PLAN of the listing/analytics filters uses those indexes
+Exits with code 1 if any check fails.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test_index_usage.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["SENSOR_COMPACTION_INTERVAL"] = "0"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from sqlalchemy import inspect, text  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.migrations import ensure_indexes  # noqa: E402
+
+failures = []
+
+def check(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    if not ok:
+        failures.append(message)
+
+def model_indexes():
+    return {index.name for table in Base.metadata.sorted_tables for index in table.indexes if index.name.startswith("ix_")}
+
+def check_migration():
+    """Old databases: tables exist, indexes don't"""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for name in model_indexes():
+            conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+    created = set(ensure_indexes(engine))
+    check(model_indexes() <= created, f"La migración crea los {len(model_indexes())} índices faltantes")
+    check(ensure_indexes(engine) == [], "Una segunda ejecución no crea ninguno")
+
+    existing = {ix["name"] for table in inspect(engine).get_table_names() for ix in inspect(engine).get_indexes(table)}
+    check(model_indexes() <= existing, "Todos los índices del modelo están en la base")
+
+def seed():
+    db = SessionLocal()
+    db.add(models.Usuario(idUsuarios=1, username="test", password="test", rol="admin"))
+    db.add(models.Sede(idSedes=1, Nombre="Centro", Direccion="-", Usuario_id=1))
+    db.add(models.Sensor(idSensores=1, nombre="Horno", descripcion="-", sede_id=1))
+    db.add(models.Producto(idProductos=1, Nombre="Pan", Precio=1, Stock=10, Sede_id=1))
+    db.add(models.UsuarioSede(usuario_id=1, sede_id=1))
+    now = datetime.now()
+    for i in range(200):
+        fecha = now - timedelta(hours=i)
+        db.add(models.Movimiento(producto_id=1, Cantidad=1, Precio=1, tipo="venta", Usuario_id=1, sede_id=1, fecha=fecha))
+        db.add(models.Temperatura(Temperatura=22, Sensor_id=1, fecha=fecha))
+        db.add(models.Humedad(Humedad=55, Sensor_id=1, fecha=fecha))
+    db.commit()
+    db.close()
+
+def plan(query):
+    """EXPLAIN QUERY PLAN of an ORM query, as one string"""
+    sql = str(query.statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return " | ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+def check_plans():
+    db = SessionLocal()
+    since = datetime.now() - timedelta(days=7)
+    mov, temp, hum = models.Movimiento, models.Temperatura, models.Humedad
+    cases = [
+        ("Movimientos por sede y fecha", "ix_movimientos_sede_fecha",
+         db.query(mov).filter(mov.sede_id == 1, mov.fecha >= since)),
+        ("Movimientos por producto y fecha", "ix_movimientos_producto_fecha",
+         db.query(mov).filter(mov.producto_id == 1, mov.fecha >= since)),
+        ("Ventas por fecha", "ix_movimientos_tipo_fecha",
+         db.query(mov).filter(mov.tipo == "venta", mov.fecha >= since)),
+        ("Movimientos recientes", "ix_movimientos_fecha",
+         db.query(mov).order_by(mov.fecha.desc()).limit(50)),
+        ("Temperatura por sensor y fecha", "ix_temperatura_sensor_fecha",
+         db.query(temp).filter(temp.Sensor_id == 1, temp.fecha >= since)),
+        ("Humedad por sensor y fecha", "ix_humedad_sensor_fecha",
+         db.query(hum).filter(hum.Sensor_id == 1, hum.fecha >= since)),
+        ("Sedes de usuarios", "ix_usuariosedes_usuario",
+         db.query(models.UsuarioSede).filter(models.UsuarioSede.usuario_id.in_([1, 2, 3]))),
+        ("Productos por sede", "ix_productos_sede",
+         db.query(models.Producto).filter(models.Producto.Sede_id == 1)),
+        ("Sensores por sede", "ix_sensores_sede",
+         db.query(models.Sensor).filter(models.Sensor.sede_id == 1)),
+    ]
+    for label, index, query in cases:
+        detail = plan(query)
+        check(index in detail, f"{label}: usa {index}" + ("" if index in detail else f" (plan: {detail})"))
+    db.close()
+
+def main():
+    print("🔎 Uso de índices - Sistema de Panadería")
+    print("=" * 50)
+    check_migration()
+    seed()
+    check_plans()
+    print()
+    if failures:
+        print(f"❌ {len(failures)} verificaciones fallaron")
+        sys.exit(1)
+    print("✅ Todas las verificaciones pasaron")
+
+if __name__ == "__main__":
+    main()
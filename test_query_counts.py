@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+SQL statement-count regression check for the user endpoints
+
+Usage:
+    python3 test_query_counts.py
+
+Works on a throwaway SQLite database (no running server needed). Counts
+the statements each request sends to the database and fails if:
+- GET /usuarios/ grows with the number of users (it used to run one
+  UsuarioSede query per user)
+- GET /usuarios/ or POST /usuarios/login take more statements than budgeted
+Exits with code 1 if any check fails.
+"""
+
+import os
+import sys
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test_query_counts.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["SENSOR_COMPACTION_INTERVAL"] = "0"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+# Statements per request: users + their sede assignments (listing), the
+# user + a UsuarioSede/Sede join (login)
+BUDGET = {
+    "GET /usuarios/": 2,
+    "POST /usuarios/login": 2,
+}
+
+failures = []
+statements = []
+
+def check(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    if not ok:
+        failures.append(message)
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+def count(client, method, url, **kwargs):
+    statements.clear()
+    response = client.request(method, url, **kwargs)
+    assert response.status_code == 200, f"{method} {url}: {response.status_code} {response.text}"
+    return len(statements)
+
+def add_users(total):
+    """Users up to `total`, each with two sede assignments"""
+    db = SessionLocal()
+    if not db.query(models.Sede).first():
+        db.add(models.Sede(idSedes=1, Nombre="Centro", Direccion="-", Usuario_id=None))
+        db.add(models.Sede(idSedes=2, Nombre="Miraflores", Direccion="-", Usuario_id=None))
+    existing = db.query(models.Usuario).count()
+    for i in range(existing, total):
+        usuario = models.Usuario(username=f"user{i}", password="clave", rol="usuario")
+        db.add(usuario)
+        db.flush()
+        db.add_all([
+            models.UsuarioSede(usuario_id=usuario.idUsuarios, sede_id=1),
+            models.UsuarioSede(usuario_id=usuario.idUsuarios, sede_id=2),
+        ])
+    db.commit()
+    db.close()
+
+def main():
+    print("🧮 Conteo de consultas SQL - Usuarios")
+    print("=" * 50)
+
+    with TestClient(app) as client:
+        counts = {}
+        for total in (10, 200):
+            add_users(total)
+            listing = count(client, "GET", "/usuarios/")
+            login = count(client, "POST", "/usuarios/login", json={"username": "user0", "password": "clave"})
+            counts[total] = listing
+            print(f"   {total} usuarios: listado {listing} consultas, login {login} consultas")
+
+            check(listing <= BUDGET["GET /usuarios/"], f"GET /usuarios/ con {total} usuarios: {listing} <= {BUDGET['GET /usuarios/']}")
+            check(login <= BUDGET["POST /usuarios/login"], f"POST /usuarios/login: {login} <= {BUDGET['POST /usuarios/login']}")
+
+        check(counts[10] == counts[200], "El listado no crece con el número de usuarios")
+
+    print()
+    if failures:
+        print(f"❌ {len(failures)} verificaciones fallaron")
+        sys.exit(1)
+    print("✅ Todas las verificaciones pasaron")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Concurrent read/write stress run: old SQLite settings vs the engine profile
+
+Usage:
+    python3 test_sqlite_profile.py
+    python3 test_sqlite_profile.py --escritores 4 --lectores 8 --segundos 5 --busy-timeout-ms 0
+
+Runs writer threads (one sensor reading per transaction, like the ESP32
+ingest) and reader threads (a dashboard aggregate over recent readings)
+against a throwaway SQLite file, twice:
+- antes: rollback journal, synchronous=FULL (what create_engine gave us)
+- perfil: the production profile from Config (WAL, synchronous=NORMAL, ...)
+Both use the same busy timeout. Prints writes, reads and "database is
+locked" errors for each, and exits with code 1 unless the profile
+completes more writes and more operations overall without more lock
+errors.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+DB_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DB_DIR, 'app.db')}"
+os.environ["SENSOR_COMPACTION_INTERVAL"] = "0"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from sqlalchemy import create_engine, event, func  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import models  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.database import Base, _set_sqlite_pragmas  # noqa: E402
+
+SENSORS = 10
+
+failures = []
+
+def check(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    if not ok:
+        failures.append(message)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Estrés de lectura/escritura concurrente en SQLite")
+    parser.add_argument("--escritores", type=int, default=4, help="Hilos escritores (default: 4)")
+    parser.add_argument("--lectores", type=int, default=8, help="Hilos lectores (default: 8)")
+    parser.add_argument("--segundos", type=float, default=5, help="Duración de cada corrida (default: 5)")
+    parser.add_argument(
+        "--busy-timeout-ms", type=int, default=Config.SQLITE_BUSY_TIMEOUT_MS,
+        help="Espera ante bloqueos en ambas corridas (default: SQLITE_BUSY_TIMEOUT_MS)"
+    )
+    return parser.parse_args()
+
+def old_engine(url, busy_timeout_ms):
+    engine = create_engine(url, connect_args={"timeout": busy_timeout_ms / 1000})
+
+    @event.listens_for(engine, "connect")
+    def rollback_journal(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=DELETE")
+        cursor.execute("PRAGMA synchronous=FULL")
+        cursor.close()
+
+    return engine
+
+def profile_engine(url, busy_timeout_ms):
+    Config.SQLITE_BUSY_TIMEOUT_MS = busy_timeout_ms
+    engine = create_engine(url, **Config.get_engine_options(url))
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+def prepare(engine):
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add(models.Sede(idSedes=1, Nombre="Centro", Direccion="-"))
+    db.add_all([models.Sensor(idSensores=i, nombre=f"Sensor {i}", descripcion="-", sede_id=1) for i in range(1, SENSORS + 1)])
+    now = datetime.now()
+    db.add_all([
+        models.Temperatura(Temperatura=20 + i % 8, Sensor_id=1 + i % SENSORS, fecha=now - timedelta(seconds=i))
+        for i in range(20000)
+    ])
+    db.commit()
+    db.close()
+    return Session
+
+def stress(engine, writers, readers, seconds):
+    Session = prepare(engine)
+    counts = {"escrituras": 0, "lecturas": 0, "bloqueos": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer(n):
+        db = Session()
+        i = 0
+        while not stop.is_set():
+            i += 1
+            try:
+                db.add(models.Temperatura(Temperatura=22.5, Sensor_id=1 + (n + i) % SENSORS, fecha=datetime.now()))
+                db.commit()
+                bump("escrituras")
+            except OperationalError as e:
+                db.rollback()
+                if "locked" not in str(e):
+                    raise
+                bump("bloqueos")
+        db.close()
+
+    def reader():
+        db = Session()
+        temp = models.Temperatura
+        while not stop.is_set():
+            try:
+                db.query(temp.Sensor_id, func.count(temp.idTemperatura), func.avg(temp.Temperatura)).filter(
+                    temp.fecha >= datetime.now() - timedelta(minutes=30)
+                ).group_by(temp.Sensor_id).all()
+                db.rollback()  # End the read transaction, like a request would
+                bump("lecturas")
+            except OperationalError as e:
+                db.rollback()
+                if "locked" not in str(e):
+                    raise
+                bump("bloqueos")
+        db.close()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return counts
+
+def main():
+    args = parse_args()
+    print("🗄️  Estrés SQLite: configuración anterior vs perfil de producción")
+    print("=" * 50)
+    print(f"   {args.escritores} escritores, {args.lectores} lectores, {args.segundos:g}s por corrida, "
+          f"busy_timeout={args.busy_timeout_ms}ms\n")
+
+    results = {}
+    for name, build in (("antes", old_engine), ("perfil", profile_engine)):
+        url = f"sqlite:///{os.path.join(DB_DIR, f'{name}.db')}"
+        results[name] = stress(build(url, args.busy_timeout_ms), args.escritores, args.lectores, args.segundos)
+        r = results[name]
+        print(f"   {name:7} escrituras={r['escrituras']:6}  lecturas={r['lecturas']:6}  "
+              f"'database is locked'={r['bloqueos']}")
+
+    old, new = results["antes"], results["perfil"]
+    print()
+    check(new["escrituras"] > old["escrituras"],
+          f"Escrituras: {new['escrituras']} con el perfil vs {old['escrituras']} antes")
+    check(new["escrituras"] + new["lecturas"] > old["escrituras"] + old["lecturas"],
+          f"Operaciones totales: {new['escrituras'] + new['lecturas']} vs {old['escrituras'] + old['lecturas']}")
+    check(new["bloqueos"] <= old["bloqueos"],
+          f"Errores de bloqueo: {new['bloqueos']} con el perfil vs {old['bloqueos']} antes")
+
+    print()
+    if failures:
+        print(f"❌ {len(failures)} verificaciones fallaron")
+        sys.exit(1)
+    print("✅ Todas las verificaciones pasaron")
+
+if __name__ == "__main__":
+    main()
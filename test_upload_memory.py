@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Check that concurrent audio uploads don't grow the server's memory
+
+Usage:
+    python3 test_upload_memory.py
+
+Starts the API with uvicorn (throwaway SQLite database) against a fake
+OpenAI transcription endpoint, then sends CONCURRENT uploads of UPLOAD_MB
+each to /voice/transcribe. Uploads are spooled to disk and streamed on to
+the transcription API, so the server's peak RSS (VmHWM) must grow by less
+than RSS_BUDGET_MB; buffering them in memory would add about
+CONCURRENT x UPLOAD_MB. Linux only (reads /proc). Exits with code 1 if
+any check fails.
+"""
+
+import asyncio
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+CONCURRENT = 20
+UPLOAD_MB = 10
+RSS_BUDGET_MB = 80
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+failures = []
+
+def check(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    if not ok:
+        failures.append(message)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+fake_openai = FastAPI()
+
+@fake_openai.post("/v1/audio/transcriptions")
+async def fake_transcription(request: Request):
+    # Count the bytes as they arrive instead of keeping them
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+    await asyncio.sleep(0.3)
+    return {"text": f"recibidos {received} bytes"}
+
+def start_fake_openai(port):
+    server = uvicorn.Server(uvicorn.Config(fake_openai, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def wav(megabytes, rate=16000):
+    """Silent 16-bit mono WAV of about `megabytes`"""
+    data = b"\0" * int(megabytes * 1024 * 1024)
+    fmt = struct.pack("<HHIIHH", 1, 1, rate, rate * 2, 2, 16)
+    return (
+        b"RIFF" + struct.pack("<I", 36 + len(data)) + b"WAVE"
+        + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+        + b"data" + struct.pack("<I", len(data)) + data
+    )
+
+def memory_kb(pid, field):
+    """VmRSS / VmHWM (peak) of a process, in KiB"""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise RuntimeError(f"{field} no disponible")
+
+def start_api(port, openai_port):
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test_upload_memory.db')}",
+        SENSOR_COMPACTION_INTERVAL="0",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{openai_port}/v1",
+        OPENAI_API_KEY="test",
+        OPENAI_MAX_CONCURRENCY=str(CONCURRENT),
+        STT_BACKEND="openai",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{url}/health", timeout=1)
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("El API no arrancó")
+
+async def upload(client, url, user_id, audio):
+    response = await client.post(
+        f"{url}/voice/transcribe",
+        data={"user_id": user_id},
+        files={"audio_file": ("audio.wav", audio, "audio/wav")}
+    )
+    return response
+
+async def run_checks(process, url):
+    async with httpx.AsyncClient(timeout=120) as client:
+        user = await client.post(f"{url}/usuarios/", json={"username": "test", "password": "test", "rol": "admin"})
+        user_id = user.json()["idUsuarios"]
+
+        # Warm up (imports, pools, first request) before taking the baseline
+        small = wav(0.1)
+        await upload(client, url, user_id, small)
+        baseline = memory_kb(process.pid, "VmRSS")
+
+        audio = wav(UPLOAD_MB)
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[upload(client, url, user_id, audio) for _ in range(CONCURRENT)])
+        elapsed = time.perf_counter() - start
+
+    peak = memory_kb(process.pid, "VmHWM")
+    ok = [r for r in responses if r.status_code == 200 and r.json().get("success")]
+    check(len(ok) == CONCURRENT, f"{len(ok)}/{CONCURRENT} subidas de {UPLOAD_MB} MB transcritas en {elapsed:.1f}s")
+    if ok:
+        # The multipart body forwarded to OpenAI holds the whole file
+        forwarded = min(int(r.json()["transcription"].split()[1]) for r in ok)
+        check(forwarded >= len(audio), f"Archivo completo reenviado a OpenAI ({forwarded} bytes)")
+        check(ok[0].json().get("audio_duration") is not None, f"Duración leída del encabezado: {ok[0].json().get('audio_duration')}s")
+    growth = (peak - baseline) / 1024
+    check(growth < RSS_BUDGET_MB, f"Pico de memoria: +{growth:.0f} MB sobre {baseline / 1024:.0f} MB (< {RSS_BUDGET_MB} MB)")
+
+def main():
+    print("🎙️  Memoria del servidor con subidas de audio concurrentes")
+    print("=" * 50)
+    if not os.path.exists("/proc/self/status"):
+        print("⚠️  Requiere Linux (/proc); verificación omitida")
+        return
+
+    openai_port = free_port()
+    fake = start_fake_openai(openai_port)
+    process, url = start_api(free_port(), openai_port)
+    try:
+        asyncio.run(run_checks(process, url))
+    finally:
+        process.terminate()
+        process.wait()
+        fake.should_exit = True
+
+    print()
+    if failures:
+        print(f"❌ {len(failures)} verificaciones fallaron")
+        sys.exit(1)
+    print("✅ Todas las verificaciones pasaron")
+
+if __name__ == "__main__":
+    main()